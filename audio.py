@@ -0,0 +1,142 @@
+"""
+Audio subsystem for Lily Unicorns
+Streams background music with pygame.mixer.music and plays short sound effects
+from a pool of reserved channels. All loading happens on a background thread so
+it never delays a frame; sounds requested before loading finishes are skipped.
+Works with SDL's dummy audio driver (SDL_AUDIODRIVER=dummy).
+"""
+import array
+import math
+import os
+import threading
+
+import pygame
+
+MUSIC_FILE = os.path.join("assets", "music", "old_city_theme.ogg")
+SOUNDS_DIR = os.path.join("assets", "sounds")
+
+# Sound effects: name -> list of (start_frequency, end_frequency, duration_seconds) notes
+SOUND_EFFECTS = {
+    "pickup": [(880, 880, 0.05), (1320, 1320, 0.08)],
+    "jump": [(300, 600, 0.15)],
+    "level_complete": [(523, 523, 0.12), (659, 659, 0.12), (784, 784, 0.12), (1047, 1047, 0.3)],
+}
+
+
+def synthesize_sound(notes, frequency, channels, volume=0.3):
+    """Build a Sound from a list of sine-wave notes, in the mixer's sample format"""
+    samples = array.array("h")
+    amplitude = int(32767 * volume)
+
+    for start_freq, end_freq, duration in notes:
+        sample_count = int(frequency * duration)
+        phase = 0.0
+        for i in range(sample_count):
+            progress = i / sample_count
+            # Slide the pitch from start to end frequency across the note
+            phase += 2 * math.pi * (start_freq + (end_freq - start_freq) * progress) / frequency
+            # Short attack and linear release so notes don't click
+            envelope = min(1.0, i / 200) * (1.0 - progress)
+            value = int(amplitude * envelope * math.sin(phase))
+            for _ in range(channels):
+                samples.append(value)
+
+    return pygame.mixer.Sound(buffer=samples.tobytes())
+
+
+class AudioSystem:
+    def __init__(self, music_file=MUSIC_FILE, sfx_channels=6, music_volume=0.5, sfx_volume=0.8):
+        self.music_file = music_file
+        self.sfx_channel_count = sfx_channels
+        self.music_volume = music_volume
+        self.sfx_volume = sfx_volume
+
+        self.sounds = {}
+        self.channels = []
+        # When each channel last started a sound (play order), to find the oldest
+        self.channel_started = []
+        self.sounds_played = 0
+        self.ready = threading.Event()
+        self.enabled = True
+        self._thread = None
+
+    def start(self):
+        """Initialize the mixer and load all audio on a background thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._load, name="AudioLoader", daemon=True)
+            self._thread.start()
+
+    def _load(self):
+        """Background loader: open the mixer, start streaming music, build the SFX pool"""
+        try:
+            if not pygame.mixer.get_init():
+                # Small buffer keeps sound effects responsive
+                pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=512)
+        except pygame.error as e:
+            print(f"Audio disabled: {e}")
+            self.enabled = False
+            return
+
+        # Stream music from disk instead of decoding the whole file into memory
+        if self.music_file and os.path.exists(self.music_file):
+            try:
+                pygame.mixer.music.load(self.music_file)
+                pygame.mixer.music.set_volume(self.music_volume)
+                pygame.mixer.music.play(loops=-1)
+            except pygame.error as e:
+                print(f"Error loading music {self.music_file}: {e}")
+
+        # Reserve channels for sound effects so they never steal each other's slot
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), self.sfx_channel_count))
+        pygame.mixer.set_reserved(self.sfx_channel_count)
+        self.channels = [pygame.mixer.Channel(i) for i in range(self.sfx_channel_count)]
+        self.channel_started = [0] * len(self.channels)
+
+        frequency, _, channels = pygame.mixer.get_init()
+        for name, notes in SOUND_EFFECTS.items():
+            sound = self._load_sound_file(name)
+            if sound is None:
+                sound = synthesize_sound(notes, frequency, channels)
+            sound.set_volume(self.sfx_volume)
+            self.sounds[name] = sound
+
+        self.ready.set()
+
+    def _load_sound_file(self, name):
+        """Load assets/sounds/<name>.ogg or .wav if present, so SFX can be replaced"""
+        for extension in (".ogg", ".wav"):
+            path = os.path.join(SOUNDS_DIR, name + extension)
+            if os.path.exists(path):
+                try:
+                    return pygame.mixer.Sound(path)
+                except pygame.error as e:
+                    print(f"Error loading sound {path}: {e}")
+        return None
+
+    def play_sound(self, name):
+        """Play a sound effect on a pooled channel (no-op until audio has loaded)"""
+        if not self.ready.is_set():
+            return
+        sound = self.sounds.get(name)
+        if sound is None:
+            return
+
+        # Prefer an idle channel, otherwise cut off the sound that started longest ago
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                break
+        else:
+            index = min(range(len(self.channels)), key=self.channel_started.__getitem__)
+        self.sounds_played += 1
+        self.channel_started[index] = self.sounds_played
+        self.channels[index].play(sound)
+
+    def stop(self):
+        """Stop playback and close the mixer"""
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self.enabled and pygame.mixer.get_init():
+            pygame.mixer.music.stop()
+            pygame.mixer.quit()
+        self.ready.clear()
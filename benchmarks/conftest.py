@@ -0,0 +1,99 @@
+"""
+pytest configuration for the hot-path benchmarks in this directory
+Runs headless under SDL's dummy drivers and adds options to store the median
+time of every benchmark as a baseline and to compare later runs with it.
+
+Usage:
+    pytest benchmarks                                  # run and show timings
+    pytest benchmarks --save-baseline                  # store a new baseline
+    pytest benchmarks --compare-baseline               # fail on regressions
+    pytest benchmarks --compare-baseline --max-regression 0.25
+"""
+import json
+import os
+import platform
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).resolve().parent / "hot_paths_baseline.json"
+
+# Headless, quiet, and with main.py's relative asset and level paths working
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+sys.path.insert(0, str(REPO_ROOT))
+os.chdir(REPO_ROOT)
+
+# Median time in ms of every benchmark that ran, keyed by test name
+results = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("hot path baseline")
+    group.addoption("--save-baseline", action="store_true",
+                    help=f"store the results as the new baseline ({BASELINE_FILE.name})")
+    group.addoption("--compare-baseline", action="store_true",
+                    help="fail if a benchmark regressed too far from the baseline")
+    group.addoption("--max-regression", type=float, default=0.5,
+                    help="fail if a benchmark is this fraction slower than the baseline (default: 0.5)")
+
+
+@pytest.fixture(scope="session")
+def display():
+    """Initialize pygame and the (dummy) display once for all benchmarks"""
+    import pygame
+    import main
+
+    pygame.init()
+    main.init_display()
+    yield main.screen
+    pygame.quit()
+
+
+@pytest.fixture(autouse=True)
+def record_result(request, benchmark):
+    """Remember each benchmark's median time for --save-baseline / --compare-baseline"""
+    yield
+    if benchmark.stats is not None:
+        results[request.node.name] = round(benchmark.stats["median"] * 1000.0, 4)
+
+
+def compare(baseline, max_regression, write_line):
+    """Print results next to the baseline; return False if a benchmark regressed too far"""
+    ok = True
+    for name, current in sorted(results.items()):
+        previous = baseline.get(name)
+        if previous is None:
+            write_line(f"{name}: {current:.3f} ms (no baseline)")
+            continue
+        change = (current - previous) / previous
+        status = "ok"
+        if change > max_regression:
+            status = "REGRESSION"
+            ok = False
+        write_line(f"{name}: {current:.3f} ms (baseline {previous:.3f} ms, {change:+.0%}) {status}")
+    return ok
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not results or not (config.getoption("--save-baseline") or config.getoption("--compare-baseline")):
+        return
+    reporter = config.pluginmanager.get_plugin("terminalreporter")
+    write_line = reporter.write_line if reporter is not None else print
+    write_line("")
+
+    if config.getoption("--save-baseline"):
+        BASELINE_FILE.write_text(json.dumps({
+            "median_ms": dict(sorted(results.items())),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        }, indent=2) + "\n")
+        write_line(f"Baseline saved to {BASELINE_FILE}")
+    elif config.getoption("--compare-baseline"):
+        baseline = json.loads(BASELINE_FILE.read_text())["median_ms"] if BASELINE_FILE.exists() else {}
+        if not compare(baseline, config.getoption("--max-regression"), write_line) and exitstatus == 0:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
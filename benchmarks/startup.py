@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for Lily Unicorns
+Measures how long `import main` takes (python -X importtime), with and without
+pygame's own import (which varies a lot between machines and runs), and the time
+from launching `python main.py` until the first menu frame is presented, then
+compares the results with the baseline stored next to this script. Bytecode is
+written and warmed up first, so the numbers are those of a player's second launch.
+
+Usage:
+    python benchmarks/startup.py            # run and compare with the baseline
+    python benchmarks/startup.py --save     # run and store a new baseline
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_FILE = Path(__file__).resolve().parent / "startup_baseline.json"
+METRICS = ("import_main_ms", "import_main_without_pygame_ms", "first_frame_ms")
+
+
+def benchmark_env():
+    """Environment for child processes: headless SDL and no pygame banner"""
+    env = dict(os.environ)
+    env.setdefault("SDL_VIDEODRIVER", "dummy")
+    env.setdefault("SDL_AUDIODRIVER", "dummy")
+    env["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    # Stale .pyc files would make every run compile main.py again
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def measure_import_time(runs):
+    """Return (median ms to import main, median ms without pygame, {top-level import: median ms})"""
+    totals = []
+    per_module = {}
+
+    # Unmeasured run that writes the bytecode of every module
+    subprocess.run([sys.executable, "-c", "import main"], cwd=REPO_ROOT, env=benchmark_env(), check=True)
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=REPO_ROOT, env=benchmark_env(), capture_output=True, text=True, check=True,
+        )
+        # Nested imports are listed before the module that imported them
+        children = []
+        for line in result.stderr.splitlines():
+            # Format: "import time: self [us] | cumulative | imported package"
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            cumulative_ms = int(cumulative) / 1000.0
+            if not name.startswith("   "):
+                # Top-level import: keep its direct children only if it is main
+                if name.strip() == "main":
+                    totals.append(cumulative_ms)
+                    for child, child_ms in children:
+                        per_module.setdefault(child, []).append(child_ms)
+                children = []
+            elif not name.startswith("     "):
+                children.append((name.strip(), cumulative_ms))
+
+    without_pygame = [total - pygame_ms for total, pygame_ms in zip(totals, per_module.get("pygame", [0.0] * runs))]
+    modules = {name: round(statistics.median(times), 2) for name, times in per_module.items()}
+    return (
+        statistics.median(totals),
+        statistics.median(without_pygame),
+        dict(sorted(modules.items(), key=lambda item: -item[1])),
+    )
+
+
+def measure_first_frame(runs):
+    """Return the median ms from process launch until the first menu frame is presented"""
+    times = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "main.py", "--exit-after-first-frame"],
+            cwd=REPO_ROOT, env=benchmark_env(), stdout=subprocess.PIPE, text=True,
+        )
+        for line in process.stdout:
+            if line.startswith("first frame presented"):
+                times.append((time.perf_counter() - start) * 1000.0)
+                break
+        process.stdout.close()
+        if process.wait() != 0:
+            raise RuntimeError("main.py exited with an error")
+
+    if not times:
+        raise RuntimeError("main.py never reported its first frame")
+    return statistics.median(times)
+
+
+def run_benchmark(runs):
+    """Run both measurements and return the results as a dict"""
+    import_ms, own_import_ms, modules = measure_import_time(runs)
+    first_frame_ms = measure_first_frame(runs)
+    return {
+        "import_main_ms": round(import_ms, 2),
+        "import_main_without_pygame_ms": round(own_import_ms, 2),
+        "first_frame_ms": round(first_frame_ms, 2),
+        "main_imports_ms": modules,
+        "runs": runs,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Print results next to the baseline; return False if a metric regressed too far"""
+    ok = True
+    for metric in METRICS:
+        current = results[metric]
+        previous = baseline.get(metric)
+        if previous is None:
+            print(f"{metric}: {current:.1f} ms (no baseline)")
+            continue
+        change = (current - previous) / previous
+        status = "ok"
+        if change > max_regression:
+            status = "REGRESSION"
+            ok = False
+        print(f"{metric}: {current:.1f} ms (baseline {previous:.1f} ms, {change:+.0%}) {status}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure Lily Unicorns startup time")
+    parser.add_argument("--runs", type=int, default=5, help="number of runs per measurement (median is used)")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument(
+        "--max-regression", type=float, default=0.5,
+        help="fail if a metric is this fraction slower than the baseline (default: 0.5)",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmark(args.runs)
+
+    print("Slowest imports in main.py:")
+    for name, ms in list(results["main_imports_ms"].items())[:5]:
+        print(f"  {name}: {ms:.1f} ms")
+
+    if args.save:
+        BASELINE_FILE.write_text(json.dumps(results, indent=2) + "\n")
+        for metric in METRICS:
+            print(f"{metric}: {results[metric]:.1f} ms")
+        print(f"Baseline saved to {BASELINE_FILE}")
+        return 0
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    return 0 if compare(results, baseline, args.max_regression) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Benchmarks for the hot paths in main.py
+Run with `pytest benchmarks` (needs pytest-benchmark); see conftest.py for the
+baseline options.
+"""
+import random
+from pathlib import Path
+
+import pygame
+import pytest
+
+import main
+from level_geometry import GeometryLayer
+
+LEVELS_DIR = Path(__file__).resolve().parent.parent / "levels"
+LEVEL_FILES = sorted(LEVELS_DIR.glob("level*.yml")) + sorted(LEVELS_DIR.glob("level*.json"))
+
+# Slow paths (hundreds of ms per call) run a fixed number of rounds instead of calibrating
+SLOW_ROUNDS = 3
+
+
+@pytest.mark.parametrize("size", [(80, 40), (160, 80), (320, 160)], ids=lambda size: f"{size[0]}x{size[1]}")
+def test_cloud_generation(benchmark, display, size):
+    random.seed(0)
+    benchmark.pedantic(main.Cloud, args=(0, 0, *size), rounds=SLOW_ROUNDS, iterations=1)
+
+
+def test_invert_surface_colors(benchmark, display):
+    sprite_sheet = pygame.image.load("assets/sprites/kaitlyn_unicorn.png").convert_alpha()
+    benchmark(main.invert_surface_colors, sprite_sheet)
+
+
+@pytest.mark.parametrize("size", [(60, 120), (150, 300)], ids=lambda size: f"{size[0]}x{size[1]}")
+def test_tree_construction(benchmark, display, size):
+    benchmark(main.Tree, 0, 0, *size)
+
+
+@pytest.mark.parametrize("level_file", LEVEL_FILES, ids=lambda path: path.name)
+def test_create_level_objects(benchmark, display, level_file):
+    level_data = main.load_level(str(level_file))
+    random.seed(0)
+    benchmark.pedantic(
+        main.create_level_objects,
+        args=(level_data, main.screen_width, main.screen_height),
+        rounds=SLOW_ROUNDS, iterations=1,
+    )
+
+
+def create_dense_level(platform_count, seed=0):
+    """Random platforms and trees packed over the play area, as GeometryLayers"""
+    rng = random.Random(seed)
+    platforms = []
+    for _ in range(platform_count):
+        x, y = rng.randrange(0, 1180), rng.randrange(100, 600)
+        width, height = rng.randrange(40, 160), rng.randrange(10, 30)
+        platforms.append((x, y, width, height, (200, 100, 50), 255, 0, y, height))
+
+    trees = []
+    for _ in range(platform_count // 10):
+        x, y = rng.randrange(0, 1180), rng.randrange(300, 500)
+        width, height = rng.randrange(60, 120), rng.randrange(120, 240)
+        top_offset, top_height = main.Tree.get_top_geometry(width, height)
+        trees.append((x, y, width, height, main.Tree.CROWN_COLOR, 255, 0, y + top_offset, top_height))
+
+    return GeometryLayer(platforms), GeometryLayer(trees)
+
+
+@pytest.mark.parametrize("platform_count", [50, 500, 5000])
+def test_check_collisions(benchmark, display, platform_count):
+    platforms, trees = create_dense_level(platform_count)
+    unicorn = main.Unicorn()
+
+    # Moves in every direction, including fast falls, all over the level
+    rng = random.Random(1)
+    moves = []
+    for _ in range(64):
+        rect = pygame.Rect(rng.randrange(0, 1216), rng.randrange(0, 556), unicorn.size, unicorn.size)
+        vel_x, vel_y = rng.choice((-5, 0, 5)), rng.uniform(-12, 24)
+        moves.append((rect, rect.move(-vel_x, -vel_y), vel_x, vel_y))
+
+    def check_all_moves():
+        for rect, previous_rect, vel_x, vel_y in moves:
+            unicorn.rect = rect.copy()
+            unicorn.previous_rect = previous_rect.copy()
+            unicorn.vel_x, unicorn.vel_y = vel_x, vel_y
+            unicorn.check_collisions(platforms, trees)
+
+    benchmark(check_all_moves)
+
+
+def test_glitter_update(benchmark, display):
+    random.seed(0)
+    # The level complete burst keeps up to 200 glitters alive
+    glitters = [main.Glitter(random.randint(0, 1280), random.randint(0, 720)) for _ in range(200)]
+
+    def restart_glitters():
+        for glitter in glitters:
+            glitter.age = 0
+
+    def update_glitters():
+        return [glitter for glitter in glitters if glitter.update()]
+
+    benchmark.pedantic(update_glitters, setup=restart_glitters, rounds=2000, iterations=1)
+
+
+# One generated image of every sprite type (the unicorn is scaled to its play size)
+SPRITE_IMAGES = {
+    "platform": lambda: main.Platform(0, 0, 300, 30, (200, 100, 50)).image,
+    "translucent_platform": lambda: main.Platform(0, 0, 300, 30, (200, 100, 50), 128).image,
+    "tree": lambda: main.Tree(0, 0, 150, 300).image,
+    "cloud": lambda: main.Cloud(0, 0, 160, 80).image,
+    "item": lambda: main.Item(0, 0, (255, 255, 255)).image,
+    "triangle": lambda: main.Triangle(0, 0, 60, (255, 0, 0)).image,
+    "swamp": lambda: main.Swamp(0, 0, 200, 60, (139, 69, 19)).image,
+    "text": lambda: main.Text(0, 40, "Sample Text", 40, (0, 0, 0)).image,
+    "rainbow": lambda: main.Rainbow(0, 0, 200, 200).image,
+    "unicorn": lambda: main.finalize_surface(pygame.transform.scale(main.load_unicorn_frames()[0], (64, 64))),
+}
+
+
+@pytest.mark.parametrize("finalized", [False, True], ids=["raw", "finalized"])
+@pytest.mark.parametrize("sprite", list(SPRITE_IMAGES))
+def test_sprite_blit(benchmark, display, monkeypatch, sprite, finalized):
+    """Blits of a sprite as generated versus after finalize_surface (compare the raw/finalized pairs)"""
+    if not finalized:
+        monkeypatch.setattr(main, "finalize_surface", lambda surface: surface)
+    random.seed(0)
+    image = SPRITE_IMAGES[sprite]()
+    blits = [(image, (x, y)) for x in range(0, 1280, 160) for y in (100, 400)]
+    benchmark(main.screen.blits, blits, doreturn=False)
+
+
+@pytest.mark.parametrize("level_file", ["level1.yml", "level17.json"])
+def test_rendered_frame(benchmark, display, level_file):
+    main.level_data = main.reset_level(str(LEVELS_DIR / level_file))
+
+    def render_frame():
+        main.draw_playing(main.screen)
+        main.present_frame()
+
+    benchmark(render_frame)
@@ -0,0 +1,287 @@
+"""
+Screenshots, gameplay recording and instant replay for Lily Unicorns
+Presented frames are copied into a ring of surfaces allocated up front; a
+background thread encodes and writes them, so the main loop never waits for the
+disk or for compression. When the writer falls behind, frames are dropped (and
+counted) instead.
+
+The writer encodes PNGs with NumPy and zlib rather than pygame.image.save:
+pygame holds the GIL while it converts and compresses (9-15 ms for a 640x360
+frame, which the main loop would wait out), while NumPy copies, zlib and file
+writes release it.
+
+Recordings and replays are written as PNG sequences, or as one raw RGB24 file
+per clip with a .json file next to it holding the ffmpeg command that encodes it.
+"""
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import pygame
+
+CAPTURE_FORMATS = ("png", "raw")
+CAPTURE_DIR = "captures"
+
+# Fast zlib levels keep a 30 fps recording within one core
+PNG_COMPRESS_LEVEL = 2
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# A recording buffers this much while the writer catches up
+RECORD_BUFFER_SECONDS = 1.0
+
+
+def png_chunk(kind, data):
+    """One PNG chunk: length, type, data and the CRC of type and data"""
+    return struct.pack("!I", len(data)) + kind + data + struct.pack("!I", zlib.crc32(data, zlib.crc32(kind)))
+
+
+def encode_png(rows, width, height):
+    """PNG file contents from RGB rows, each starting with a filter byte (0: none)"""
+    header = struct.pack("!IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        PNG_SIGNATURE
+        + png_chunk(b"IHDR", header)
+        + png_chunk(b"IDAT", zlib.compress(rows, PNG_COMPRESS_LEVEL))
+        + png_chunk(b"IEND", b"")
+    )
+
+
+def get_timestamp():
+    """Local time for file names, to the millisecond"""
+    now = time.time()
+    return time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+
+
+class FrameCapture:
+    """Copies presented frames into a ring of preallocated surfaces for a writer thread
+
+    With record=True every captured frame is written. With replay_seconds, the
+    ring keeps the last seconds of play and save_replay() writes them. Frames are
+    captured at `fps` and scaled by `scale`; screenshots are always full size.
+    """
+
+    def __init__(self, source, output_dir=CAPTURE_DIR, fps=30, scale=0.5, image_format="png",
+                 record=False, replay_seconds=0):
+        self.output_dir = output_dir
+        self.fps = fps
+        self.image_format = image_format
+        self.record = record
+        width, height = source.get_size()
+        self.size = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+        if record:
+            slot_count = max(2, round(fps * RECORD_BUFFER_SECONDS))
+        else:
+            slot_count = max(0, round(fps * replay_seconds))
+        # Slots the writer is saving are pending; the main loop skips them
+        self.slots = [pygame.Surface(self.size, 0, source) for _ in range(slot_count)]
+        self.pending = [False] * slot_count
+        self.next_slot = 0
+        self.filled = 0
+        self.next_time = None
+
+        self.screenshot = None
+        self.screenshot_pending = False
+
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.recording_name = f"recording-{get_timestamp()}" if record else None
+        self.recording_file = None
+
+        self.jobs = queue.SimpleQueue()
+        self._thread = None
+        # Writer-side pixel buffers by size: filter byte + RGB per row
+        self._rows = {}
+
+    @property
+    def memory_bytes(self):
+        """Pixel memory held by the ring"""
+        return sum(slot.get_pitch() * slot.get_height() for slot in self.slots)
+
+    def capture(self, surface):
+        """Copy surface into the ring if a frame is due (call after presenting each frame)"""
+        if not self.slots:
+            return
+        now = time.perf_counter()
+        if self.next_time is not None and now < self.next_time:
+            return
+        # Keep the capture rate steady, but don't catch up after a stall
+        interval = 1.0 / self.fps
+        if self.next_time is None or now - self.next_time > interval:
+            self.next_time = now
+        self.next_time += interval
+
+        slot = self.next_slot
+        if self.pending[slot]:
+            self.dropped += 1
+            return
+        if surface.get_size() == self.size:
+            self.slots[slot].blit(surface, (0, 0))
+        else:
+            pygame.transform.scale(surface, self.size, self.slots[slot])
+        self.next_slot = (slot + 1) % len(self.slots)
+        self.filled = min(self.filled + 1, len(self.slots))
+
+        if self.record:
+            self.pending[slot] = True
+            self._submit(("frame", slot, self.captured))
+        self.captured += 1
+
+    def save_screenshot(self, surface):
+        """Write a full-size copy of surface; return its path, or None if one is still being saved"""
+        if self.screenshot_pending:
+            return None
+        if self.screenshot is None or self.screenshot.get_size() != surface.get_size():
+            self.screenshot = pygame.Surface(surface.get_size(), 0, surface)
+        self.screenshot.blit(surface, (0, 0))
+        self.screenshot_pending = True
+        path = os.path.join(self.output_dir, f"screenshot-{get_timestamp()}.png")
+        self._submit(("screenshot", path))
+        return path
+
+    def save_replay(self):
+        """Write the frames in the ring, oldest first; return the clip's path, or None if there is nothing to save"""
+        if self.record or not self.filled:
+            return None
+        count = len(self.slots)
+        order = [(self.next_slot - self.filled + index) % count for index in range(self.filled)]
+        if any(self.pending[slot] for slot in order):
+            # The previous replay is still being written
+            return None
+        for slot in order:
+            self.pending[slot] = True
+        # Frames after the replay start from an empty ring
+        self.filled = 0
+        name = f"replay-{get_timestamp()}"
+        self._submit(("replay", order, name))
+        return self.get_clip_path(name)
+
+    def stop(self):
+        """Write what is queued, finish the recording and stop the writer thread"""
+        if self._thread is None:
+            return
+        self.jobs.put(None)
+        self._thread.join()
+        self._thread = None
+        if self.record:
+            print(f"Recorded {self.written} frames to {self.get_clip_path(self.recording_name)}"
+                  f" ({self.dropped} dropped while the writer was busy)")
+
+    def get_clip_path(self, name):
+        """Where a recording or replay called name is written"""
+        if self.image_format == "raw":
+            return os.path.join(self.output_dir, name + ".rgb")
+        return os.path.join(self.output_dir, name)
+
+    def _submit(self, job):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write_loop, name="FrameCapture", daemon=True)
+            self._thread.start()
+        self.jobs.put(job)
+
+    def _write_loop(self):
+        """Save queued frames until stop() (runs on the writer thread)"""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            try:
+                if job[0] == "frame":
+                    _, slot, index = job
+                    try:
+                        self._write_recording_frame(slot, index)
+                    finally:
+                        self.pending[slot] = False
+                elif job[0] == "replay":
+                    _, order, name = job
+                    self._write_clip(order, name)
+                else:
+                    _, path = job
+                    try:
+                        os.makedirs(self.output_dir, exist_ok=True)
+                        with open(path, "wb") as f:
+                            f.write(self._encode(self.screenshot))
+                        print(f"Saved screenshot {path}")
+                    finally:
+                        self.screenshot_pending = False
+            except OSError as e:
+                print(f"Could not save capture: {e}")
+        if self.recording_file is not None:
+            self.recording_file.close()
+            self._write_clip_info(self.recording_name, self.written)
+
+    def _write_recording_frame(self, slot, index):
+        if self.image_format == "raw":
+            if self.recording_file is None:
+                os.makedirs(self.output_dir, exist_ok=True)
+                self.recording_file = open(self.get_clip_path(self.recording_name), "wb")
+            self.recording_file.write(self._read_rgb(self.slots[slot]))
+        else:
+            folder = self.get_clip_path(self.recording_name)
+            os.makedirs(folder, exist_ok=True)
+            with open(os.path.join(folder, f"frame_{index:06d}.png"), "wb") as f:
+                f.write(self._encode(self.slots[slot]))
+        self.written += 1
+
+    def _write_clip(self, order, name):
+        """Write the replay frames in order, handing each slot back to the ring once saved"""
+        path = self.get_clip_path(name)
+        try:
+            if self.image_format == "raw":
+                os.makedirs(self.output_dir, exist_ok=True)
+                with open(path, "wb") as f:
+                    for slot in order:
+                        f.write(self._read_rgb(self.slots[slot]))
+                        self.pending[slot] = False
+                self._write_clip_info(name, len(order))
+            else:
+                os.makedirs(path, exist_ok=True)
+                for index, slot in enumerate(order):
+                    with open(os.path.join(path, f"frame_{index:06d}.png"), "wb") as f:
+                        f.write(self._encode(self.slots[slot]))
+                    self.pending[slot] = False
+            print(f"Saved the last {len(order) / self.fps:.1f} s to {path}")
+        finally:
+            for slot in order:
+                self.pending[slot] = False
+
+    def _write_clip_info(self, name, frames):
+        """Describe a raw clip next to it, with the command that turns it into a video"""
+        width, height = self.size
+        raw_path = self.get_clip_path(name)
+        info = {
+            "width": width,
+            "height": height,
+            "fps": self.fps,
+            "pixel_format": "rgb24",
+            "frames": frames,
+            "ffmpeg": f"ffmpeg -f rawvideo -pixel_format rgb24 -video_size {width}x{height} -framerate {self.fps} "
+                      f"-i {raw_path} -pix_fmt yuv420p {os.path.splitext(raw_path)[0]}.mp4",
+        }
+        with open(os.path.splitext(raw_path)[0] + ".json", "w") as f:
+            json.dump(info, f, indent=2)
+            f.write("\n")
+
+    def _get_rows(self, surface):
+        """Pixels of surface as rows of a filter byte (0) and RGB, in a reused buffer"""
+        width, height = surface.get_size()
+        rows = self._rows.get((width, height))
+        if rows is None:
+            rows = self._rows[(width, height)] = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+        pixels = pygame.surfarray.pixels3d(surface)
+        rows[:, 1:].reshape(height, width, 3)[...] = pixels.transpose(1, 0, 2)
+        del pixels
+        return rows
+
+    def _read_rgb(self, surface):
+        return np.ascontiguousarray(self._get_rows(surface)[:, 1:])
+
+    def _encode(self, surface):
+        width, height = surface.get_size()
+        return encode_png(self._get_rows(surface), width, height)
@@ -0,0 +1,114 @@
+"""
+Frame pacing for Lily Unicorns
+Selectable ways to hold the frame rate, plus frame-time statistics so the real
+headroom of a machine can be measured (see `python main.py --benchmark`).
+"""
+import statistics
+import time
+
+import pygame
+
+# sleep:    pygame's Clock.tick (coarse OS sleep, the original behaviour)
+# vsync:    the display flip waits for the monitor's refresh (needs vsync=1 at set_mode)
+# hybrid:   sleep most of the frame, then busy-wait the last moment for precision
+# uncapped: no limit at all, for benchmarks
+PACING_MODES = ("sleep", "vsync", "hybrid", "uncapped")
+
+
+def get_percentiles(times):
+    """Mean, p50, p95, p99 and max of a non-empty list of times"""
+    if len(times) > 1:
+        percentiles = statistics.quantiles(times, n=100, method="inclusive")
+    else:
+        percentiles = times * 99
+    return {
+        "mean": sum(times) / len(times),
+        "p50": percentiles[49],
+        "p95": percentiles[94],
+        "p99": percentiles[98],
+        "max": max(times),
+    }
+
+
+class FramePacer:
+    def __init__(self, mode="sleep", fps=60, record=False):
+        if mode not in PACING_MODES:
+            raise ValueError(f"Unknown pacing mode: {mode}")
+        self.mode = mode
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+
+        # Hybrid mode: how long before the deadline we stop sleeping and start spinning.
+        # Adapts to how much the OS oversleeps on this machine.
+        self.spin_margin = 0.002
+        self.frame_start = time.perf_counter()
+
+        # Frame times in milliseconds (only kept when recording)
+        self.record = record
+        self.frame_times = []
+
+    def reset(self):
+        """Start timing from now and drop recorded frames (e.g. after a level load)"""
+        self.frame_start = time.perf_counter()
+        self.frame_times = []
+
+    def wait(self):
+        """End the current frame: hold the frame rate for this mode and return dt in ms"""
+        if self.mode == "sleep":
+            self.clock.tick(self.fps)
+        elif self.mode == "hybrid":
+            self._hybrid_wait()
+        else:
+            # vsync already waited in display.flip(); uncapped doesn't wait at all
+            self.clock.tick()
+
+        now = time.perf_counter()
+        frame_time = (now - self.frame_start) * 1000.0
+        self.frame_start = now
+        if self.record:
+            self.frame_times.append(frame_time)
+        return frame_time
+
+    def _hybrid_wait(self):
+        """Sleep until just before the deadline, then spin the rest precisely"""
+        deadline = self.frame_start + 1.0 / self.fps
+        sleep_time = deadline - time.perf_counter() - self.spin_margin
+        if sleep_time > 0:
+            sleep_start = time.perf_counter()
+            time.sleep(sleep_time)
+            oversleep = (time.perf_counter() - sleep_start) - sleep_time
+            # Track the oversleep (fast up, slow down) so spinning covers it next time
+            if oversleep > self.spin_margin:
+                self.spin_margin = min(oversleep, 0.5 / self.fps)
+            else:
+                self.spin_margin = max(0.0005, self.spin_margin * 0.95 + oversleep * 0.05)
+
+        # Spin on perf_counter: Clock.tick_busy_loop only has millisecond resolution
+        while time.perf_counter() < deadline:
+            pass
+        self.clock.tick()
+
+    def get_stats(self):
+        """Return FPS and frame-time percentiles (ms) for the recorded frames"""
+        times = self.frame_times
+        if not times:
+            return None
+        total = sum(times)
+        return {
+            "frames": len(times),
+            "fps": len(times) * 1000.0 / total if total else 0.0,
+            **get_percentiles(times),
+        }
+
+    def print_report(self, title):
+        """Print the recorded frame statistics"""
+        stats = self.get_stats()
+        if stats is None:
+            print(f"{title}: no frames recorded")
+            return
+        print(f"{title}: {stats['frames']} frames, pacing {self.mode}")
+        print(f"  FPS: {stats['fps']:.1f}")
+        print(
+            f"  Frame time (ms): mean {stats['mean']:.2f}  p50 {stats['p50']:.2f}  "
+            f"p95 {stats['p95']:.2f}  p99 {stats['p99']:.2f}  max {stats['max']:.2f}"
+        )
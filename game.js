@@ -131,6 +131,7 @@ class Game {
     
     async init() {
         this.setupInput();
+        this.setupLiveReload();
         this.loadSprite();
         this.loadMusic();
         await this.detectMaxLevels();
@@ -271,6 +272,25 @@ class Game {
         }
     }
     
+    setupLiveReload() {
+        if (typeof LiveReload === 'undefined') return;
+        
+        LiveReload.connect((change) => {
+            if (change.path === `levels/level${this.currentLevel}.json`) {
+                // Same as F5: load the saved level again (test mode plays the editor's copy)
+                const isTestMode = new URLSearchParams(window.location.search).get('test') === 'true';
+                if (this.gameState === 'PLAYING' && !isTestMode && !change.deleted) {
+                    console.log(`${change.path} changed, reloading the level`);
+                    this.loadLevel();
+                }
+                return true;
+            }
+            // Other levels are fetched when they're played, and the embedded copies aren't used with the server
+            return change.path.startsWith('levels/') || change.path.startsWith('thumbnails/') ||
+                change.path === 'levels-data.js';
+        });
+    }
+    
     loadSprite() {
         this.unicornSprite = new Image();
         this.unicornSprite.onload = () => {
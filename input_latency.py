@@ -0,0 +1,143 @@
+"""
+Input-to-display latency measurement for Lily Unicorns
+Every key event is timestamped when the main loop takes it from SDL's queue,
+and the latency is the time until the first frame that uses it has been
+presented (display.flip() returned). The game applies input in the frame that
+samples it (step_game moves the unicorns and the frame is drawn right after; the
+menu reacts to its events at once), so that is the next presented frame, or
+`effect_delay` frames later when online play delays local input.
+
+pygame doesn't expose when SDL received an event, so the time an event waited
+in the queue before it was sampled is unknown: it arrived somewhere after the
+previous sample. The report gives both the measured sample-to-screen time and
+the worst case counted from the previous sample.
+
+Late input sampling: with vsync, display.flip() blocks until the refresh, so
+input sampled right after it waits a whole refresh before its frame is shown.
+With late=True, poll() first sleeps until just before the next refresh, leaving
+the time the frame is expected to take (tracked per frame, fast up and slow
+down) plus a safety margin that grows whenever a refresh is missed. With sleep
+or hybrid pacing the wait already happens right before sampling, so late
+sampling changes nothing there.
+"""
+import time
+
+import pygame
+
+from frame_pacing import get_percentiles
+
+INPUT_EVENTS = (pygame.KEYDOWN, pygame.KEYUP)
+
+
+class InputLatency:
+    """Measures input-to-display latency, and optionally samples input late
+
+    Call poll() instead of pygame.event.get() at the start of the frame,
+    frame_ready() once the frame is drawn and frame_presented() after the
+    display flip.
+    """
+
+    def __init__(self, fps=60, late=False, record=False):
+        self.period = 1.0 / fps
+        self.late = late
+        self.record = record
+        # Frames between sampling local input and simulating it (online play's input delay)
+        self.effect_delay = 0
+
+        self.last_poll = None
+        self.last_present = None
+        self.poll_time = None
+        self.ready_time = None
+        # Late sampling: expected poll-to-ready time and how early to sample on top of it
+        self.work_estimate = 0.0
+        self.margin = 0.002
+        self.missed = 0
+
+        # Sampled events waiting for their frame: [frames left, event count, sample time, previous sample time]
+        self.pending = []
+        self.latencies = []
+        self.worst_latencies = []
+        self.frames = 0
+
+    def poll(self):
+        """Return the queued events, timestamping key events (sleeping first in late mode)"""
+        if self.late and self.last_present is not None:
+            sample_time = self.last_present + self.period - self.work_estimate - self.margin
+            delay = sample_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        now = time.perf_counter()
+        events = pygame.event.get()
+        if self.record:
+            count = sum(1 for event in events if event.type in INPUT_EVENTS)
+            if count:
+                previous = self.last_poll if self.last_poll is not None else now
+                self.pending.append([self.effect_delay, count, now, previous])
+        self.last_poll = self.poll_time = now
+        return events
+
+    def frame_ready(self):
+        """Mark the frame as drawn, just before it is presented"""
+        self.ready_time = time.perf_counter()
+
+    def frame_presented(self):
+        """Mark the frame as shown, resolving the events it is the first to use"""
+        now = time.perf_counter()
+        if self.late and self.poll_time is not None and self.ready_time is not None:
+            work = self.ready_time - self.poll_time
+            if work > self.work_estimate:
+                self.work_estimate = work
+            else:
+                self.work_estimate = self.work_estimate * 0.95 + work * 0.05
+            # A flip that took well over a refresh missed one: sample earlier from now on
+            if self.last_present is not None and now - self.last_present > self.period * 1.5:
+                self.missed += 1
+                self.margin = min(self.margin + 0.001, self.period / 2)
+            else:
+                self.margin = max(0.002, self.margin * 0.998)
+        self.last_present = now
+        self.poll_time = self.ready_time = None
+
+        if not self.record:
+            return
+        self.frames += 1
+        still_pending = []
+        for entry in self.pending:
+            frames_left, count, sampled, previous = entry
+            if frames_left:
+                entry[0] -= 1
+                still_pending.append(entry)
+                continue
+            self.latencies.extend([(now - sampled) * 1000.0] * count)
+            self.worst_latencies.extend([(now - previous) * 1000.0] * count)
+        self.pending = still_pending
+
+    def get_stats(self):
+        """Return latency percentiles (ms) for the measured events, or None without any"""
+        if not self.latencies:
+            return None
+        return {
+            "events": len(self.latencies),
+            "frames": self.frames,
+            "sampled": get_percentiles(self.latencies),
+            "worst": get_percentiles(self.worst_latencies),
+        }
+
+    def print_report(self, title="Input latency"):
+        """Print the latency distribution of the measured events"""
+        sampling = "late" if self.late else "at the start of the frame"
+        stats = self.get_stats()
+        if stats is None:
+            print(f"{title}: no key events measured (input sampled {sampling})")
+            return
+        print(f"{title}: {stats['events']} key events over {stats['frames']} frames, input sampled {sampling}")
+        for label, key in (("Sampled to shown", "sampled"), ("Worst case, from the previous sample", "worst")):
+            times = stats[key]
+            print(
+                f"  {label} (ms): mean {times['mean']:.2f}  p50 {times['p50']:.2f}  "
+                f"p95 {times['p95']:.2f}  p99 {times['p99']:.2f}  max {times['max']:.2f}"
+            )
+        if self.late:
+            print(f"  Late sampling: frame work {self.work_estimate * 1000.0:.2f} ms, "
+                  f"margin {self.margin * 1000.0:.2f} ms, {self.missed} refreshes missed")
@@ -0,0 +1,168 @@
+"""
+Compact storage for static level geometry
+Platforms, trees, clouds and items are kept as per-type NumPy arrays instead of one
+pygame Sprite (with its own Surface and Rect) per object. Objects that look the same
+share a single texture through a TextureTable, and collecting an item just clears
+its alive flag.
+"""
+import json
+
+import numpy as np
+import pygame
+
+
+def level_entry_key(entry):
+    """Return a hashable key that identifies a level entry by its contents"""
+    return json.dumps(entry, sort_keys=True, default=str)
+
+
+class TextureTable:
+    """Shared textures: one prototype sprite per distinct look, referenced by index
+
+    A prototype is any object with an `image` surface (e.g. a Platform or Tree built
+    at 0, 0), plus a `mask` for layers used in pixel-accurate checks; layers keep
+    only its index.
+    """
+
+    def __init__(self):
+        self.textures = []
+        self.indices = {}
+
+    def get_index(self, key, create):
+        """Return the index of the texture for key, calling create() only the first time"""
+        index = self.indices.get(key)
+        if index is None:
+            index = len(self.textures)
+            self.textures.append(create())
+            self.indices[key] = index
+        return index
+
+    def discard(self, keep):
+        """Free every texture whose index is not in keep (freed indices are not reused)"""
+        for key, index in list(self.indices.items()):
+            if index not in keep:
+                self.textures[index] = None
+                del self.indices[key]
+
+    def __getitem__(self, index):
+        return self.textures[index]
+
+    def __len__(self):
+        return len(self.textures)
+
+
+class GeometryLayer:
+    """All static objects of one type, stored as parallel arrays
+
+    Each row is (x, y, width, height, color, alpha, texture, top, top_height), where
+    top/top_height describe the part that can be stood on (the whole object for
+    platforms, just the crown for trees, nothing when top_height is 0). `entries` holds the level entry of each
+    row so hot reloads can match rows to level file contents.
+    """
+
+    def __init__(self, rows=(), entries=()):
+        rows = list(rows)
+        self.entries = list(entries)
+        count = len(rows)
+
+        self.x = np.array([row[0] for row in rows], dtype=np.int32)
+        self.y = np.array([row[1] for row in rows], dtype=np.int32)
+        self.width = np.array([row[2] for row in rows], dtype=np.int32)
+        self.height = np.array([row[3] for row in rows], dtype=np.int32)
+        self.color = np.array([row[4] for row in rows], dtype=np.uint8).reshape(count, 3)
+        self.alpha = np.array([row[5] for row in rows], dtype=np.uint8)
+        self.texture = np.array([row[6] for row in rows], dtype=np.int32)
+        self.top = np.array([row[7] for row in rows], dtype=np.int32)
+        self.top_height = np.array([row[8] for row in rows], dtype=np.int32)
+        self.alive = np.ones(count, dtype=bool)
+
+        # (texture index, position) of each live object, rebuilt when alive flags change
+        self._blit_list = None
+
+    def __len__(self):
+        """Number of objects still in play (collected items don't count)"""
+        return int(np.count_nonzero(self.alive))
+
+    @property
+    def nbytes(self):
+        """Bytes used by the arrays"""
+        return sum(
+            array.nbytes
+            for array in (self.x, self.y, self.width, self.height, self.color,
+                          self.alpha, self.texture, self.top, self.top_height, self.alive)
+        )
+
+    def _overlapping(self, rect, top=None, height=None):
+        """Indices of live objects overlapping rect (edges touching don't count)"""
+        top = self.y if top is None else top
+        height = self.height if height is None else height
+        mask = (
+            self.alive
+            & (self.x < rect.right)
+            & (self.x + self.width > rect.left)
+            & (top < rect.bottom)
+            & (top + height > rect.top)
+        )
+        return np.flatnonzero(mask)
+
+    def get_rects(self, area):
+        """Rects of the live objects overlapping area (a cheap broad phase for collisions)"""
+        return [
+            pygame.Rect(int(self.x[i]), int(self.y[i]), int(self.width[i]), int(self.height[i]))
+            for i in self._overlapping(area)
+        ]
+
+    def get_tops(self, area):
+        """(top rect, top y) of the live objects whose standable top overlaps area"""
+        hits = self._overlapping(area, self.top, self.top_height)
+        return [
+            (pygame.Rect(int(self.x[i]), int(self.top[i]), int(self.width[i]), int(self.top_height[i])), int(self.top[i]))
+            for i in hits[self.top_height[hits] > 0]
+        ]
+
+    def touches_mask(self, rect, mask, textures):
+        """True if `mask` placed at rect overlaps the mask of any live object
+
+        Bounding boxes are compared for the whole layer at once first, so only the
+        objects right next to rect cost a pixel test.
+        """
+        for i in self._overlapping(rect):
+            offset = (rect.x - int(self.x[i]), rect.y - int(self.y[i]))
+            if textures[self.texture[i]].mask.overlap(mask, offset):
+                return True
+        return False
+
+    def collect(self, rect):
+        """Mark every live object touching rect as collected; return how many there were"""
+        hits = self._overlapping(rect)
+        if len(hits):
+            self.alive[hits] = False
+            self._blit_list = None
+        return len(hits)
+
+    def revive(self):
+        """Bring every object back into play (e.g. collected items on reset)"""
+        self.alive[:] = True
+        self._blit_list = None
+
+    def set_alive(self, flags):
+        """Set which objects are in play (e.g. rolling back collected items)"""
+        self.alive[:] = flags
+        self._blit_list = None
+
+    def draw(self, surface, textures, offset=(0, 0)):
+        """Blit every live object with its shared texture, shifted by -offset (the camera position)"""
+        if self._blit_list is None:
+            live = np.flatnonzero(self.alive)
+            self._blit_list = list(zip(
+                self.texture[live].tolist(),
+                zip(self.x[live].tolist(), self.y[live].tolist()),
+            ))
+        if offset == (0, 0):
+            surface.blits([(textures[texture].image, position) for texture, position in self._blit_list], doreturn=False)
+        else:
+            offset_x, offset_y = offset
+            surface.blits(
+                [(textures[texture].image, (x - offset_x, y - offset_y)) for texture, (x, y) in self._blit_list],
+                doreturn=False,
+            )
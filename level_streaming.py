@@ -0,0 +1,185 @@
+"""
+Camera and chunked streaming for levels larger than one screen
+A level whose world is bigger than the screen is split into square chunks. Only
+the chunks around the camera are built (geometry rows and textures); chunks that
+scroll far out of view are evicted again, together with the textures no loaded
+object uses. The objects of the loaded chunks are merged into one GeometryLayer
+per type, so collisions and drawing work exactly as they do for one-screen levels.
+"""
+import numpy as np
+import pygame
+
+from level_geometry import GeometryLayer, level_entry_key
+
+
+class Camera:
+    """The part of the world shown on screen, kept between the objects it follows"""
+
+    def __init__(self, view_width, view_height, world_width, world_height):
+        self.rect = pygame.Rect(0, 0, view_width, view_height)
+        self.world = pygame.Rect(0, 0, world_width, world_height)
+
+    def follow(self, *targets):
+        """Center the view on the midpoint of the target rects, without leaving the world"""
+        self.rect.center = (
+            sum(target.centerx for target in targets) // len(targets),
+            sum(target.centery for target in targets) // len(targets),
+        )
+        self.rect.clamp_ip(self.world)
+
+    @property
+    def offset(self):
+        """World position of the top-left corner of the screen"""
+        return self.rect.topleft
+
+
+class LevelStreamer:
+    """Loads and evicts the objects of a large level in chunks around the camera
+
+    `builders` maps each level entry list to the function that builds a geometry
+    row from an entry (LEVEL_OBJECT_BUILDERS); `get_bounds(key, entry, world_width,
+    world_height)` returns a Rect around an entry without building it, used to
+    sort entries into chunks. Chunks within one chunk of the view are loaded
+    ahead of time, one per update so texture generation is spread over frames;
+    loaded chunks are kept until they are two chunks away, so walking back and
+    forth over a chunk border doesn't rebuild anything.
+    """
+
+    def __init__(self, level_data, builders, get_bounds, world_width, world_height, chunk_size, textures):
+        self.builders = builders
+        self.get_bounds = get_bounds
+        self.world_width = world_width
+        self.world_height = world_height
+        self.chunk_size = chunk_size
+        self.textures = textures
+
+        # Merged layers of the loaded chunks, and the entry index of each of their rows
+        self.layers = {}
+        self.layer_indices = {}
+        self.loaded = set()
+        self.set_level_data(level_data)
+
+    def set_level_data(self, level_data):
+        """Sort the entries of level_data into chunks (cheap: nothing is built yet)"""
+        # (column, row) -> {key: [entry indices]}
+        self.chunks = {}
+        self.entries = {}
+        # Alive flag of every entry, so collected items stay collected while evicted
+        self.alive = {}
+        # key -> {entry index: geometry row} for the entries of loaded chunks
+        self.rows = {key: {} for key in self.builders}
+
+        for key in self.builders:
+            entries = list(level_data.get(key) or [])
+            self.entries[key] = entries
+            self.alive[key] = np.ones(len(entries), dtype=bool)
+            for index, entry in enumerate(entries):
+                bounds = self.get_bounds(key, entry, self.world_width, self.world_height)
+                for chunk in self._chunks_overlapping(bounds):
+                    self.chunks.setdefault(chunk, {}).setdefault(key, []).append(index)
+
+        self.layers = {}
+        self.layer_indices = {}
+        self.loaded = set()
+
+    def _chunks_overlapping(self, rect):
+        """(column, row) of every chunk rect overlaps or touches"""
+        size = self.chunk_size
+        return [
+            (column, row)
+            for column in range(rect.left // size, max(rect.left, rect.right - 1) // size + 1)
+            for row in range(rect.top // size, max(rect.top, rect.bottom - 1) // size + 1)
+        ]
+
+    def update(self, view):
+        """Load the chunks near view and evict the far ones; return True if the layers changed"""
+        margin = self.chunk_size
+        visible = {chunk for chunk in self._chunks_overlapping(view) if chunk in self.chunks}
+        wanted = {chunk for chunk in self._chunks_overlapping(view.inflate(2 * margin, 2 * margin)) if chunk in self.chunks}
+        nearby = set(self._chunks_overlapping(view.inflate(4 * margin, 4 * margin)))
+
+        # Visible chunks load right away, the ones ahead of the view one at a time (nearest first)
+        ahead = wanted - visible - self.loaded
+        if ahead and self.layers:
+            center_x, center_y = view.center
+            half = self.chunk_size // 2
+            ahead = {min(ahead, key=lambda chunk: (chunk[0] * self.chunk_size + half - center_x) ** 2
+                                                  + (chunk[1] * self.chunk_size + half - center_y) ** 2)}
+        loaded = (self.loaded & nearby) | visible | ahead
+        if loaded == self.loaded and self.layers:
+            return False
+
+        self._save_alive()
+        self.loaded = loaded
+        self._build_layers()
+        return True
+
+    def _save_alive(self):
+        """Copy the alive flags of the merged layers (e.g. collected items) back to every entry"""
+        for key, layer in self.layers.items():
+            self.alive[key][self.layer_indices[key]] = layer.alive
+
+    def _build_layers(self):
+        """Merge the loaded chunks into one layer per type, building only newly loaded entries"""
+        for key, builder in self.builders.items():
+            indices = sorted({index for chunk in self.loaded for index in self.chunks[chunk].get(key, ())})
+            entries = self.entries[key]
+            old_rows = self.rows[key]
+            rows = {
+                index: old_rows[index] if index in old_rows
+                else builder(entries[index], self.world_width, self.world_height, self.textures)
+                for index in indices
+            }
+            self.rows[key] = rows
+
+            indices = np.array(indices, dtype=np.intp)
+            layer = GeometryLayer([rows[index] for index in indices], [entries[index] for index in indices])
+            layer.set_alive(self.alive[key][indices])
+            self.layers[key] = layer
+            self.layer_indices[key] = indices
+
+        # Free the textures that only evicted objects used
+        self.textures.discard({row[6] for rows in self.rows.values() for row in rows.values()})
+
+    def get_alive(self):
+        """Copies of the alive flags of every entry, loaded or not (e.g. to roll back collected items)"""
+        self._save_alive()
+        return {key: alive.copy() for key, alive in self.alive.items()}
+
+    def set_alive(self, alive):
+        """Restore alive flags returned by get_alive, in the loaded layers too"""
+        for key, flags in alive.items():
+            self.alive[key][:] = flags
+        for key, layer in self.layers.items():
+            layer.set_alive(self.alive[key][self.layer_indices[key]])
+
+    def revive(self):
+        """Bring every object back into play, loaded or not (e.g. collected items on reset)"""
+        for key, alive in self.alive.items():
+            alive[:] = True
+        for layer in self.layers.values():
+            layer.revive()
+
+    def reload(self, level_data, view):
+        """Switch to edited level data, keeping the collected state of unchanged entries
+
+        Returns the number of entries that were added or edited.
+        """
+        self._save_alive()
+        old_alive = {}
+        for key, entries in self.entries.items():
+            for entry, alive in zip(entries, self.alive[key]):
+                old_alive.setdefault((key, level_entry_key(entry)), []).append(bool(alive))
+
+        self.set_level_data(level_data)
+        rebuilt = 0
+        for key, entries in self.entries.items():
+            for index, entry in enumerate(entries):
+                matches = old_alive.get((key, level_entry_key(entry)))
+                if matches:
+                    self.alive[key][index] = matches.pop(0)
+                else:
+                    rebuilt += 1
+
+        self.update(view)
+        return rebuilt
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Level thumbnails for the level map and the level editor
+Renders every level in levels/ with the game's own drawing code (the level as it
+looks when it starts, without the HUD) under SDL's dummy video driver. Levels are
+spread over a process pool, and each is saved as a downscaled PNG (or WebP, which
+needs Pillow: `pip install Pillow`) next to a manifest.json that the web pages read.
+
+Rendering is incremental: a level is only rendered again when the SHA-256 of its
+file changed, its thumbnail is missing, or the thumbnail settings changed. Use
+--force after changing the drawing code or assets.
+
+Usage:
+    python level_thumbnails.py                    # render new and changed levels
+    python level_thumbnails.py 3 17               # only levels 3 and 17 (if changed)
+    python level_thumbnails.py --force --jobs 4   # render everything on 4 processes
+    python level_thumbnails.py --format webp --width 480
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent
+DEFAULT_OUTPUT_DIR = "thumbnails"
+MANIFEST_NAME = "manifest.json"
+
+# Bump when the rendering changes, so existing thumbnails are rendered again
+THUMBNAIL_VERSION = 1
+
+
+def hash_file(path):
+    """SHA-256 of a file's contents, as hex"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(output_dir):
+    """The manifest from a previous run, or an empty one"""
+    try:
+        with open(output_dir / MANIFEST_NAME) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"levels": {}}
+
+
+def save_manifest(output_dir, manifest):
+    """Write the manifest, replacing the old one only once the new one is complete"""
+    path = output_dir / MANIFEST_NAME
+    temp_path = path.with_suffix(".tmp")
+    with open(temp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    os.replace(temp_path, path)
+
+
+def is_up_to_date(entry, level_file, file_hash, output_dir):
+    """True if a manifest entry still describes the level file and its thumbnail exists"""
+    return (
+        entry is not None
+        and entry.get("file") == level_file
+        and entry.get("sha256") == file_hash
+        and (output_dir / entry.get("thumbnail", "")).is_file()
+    )
+
+
+def save_image(surface, path, image_format):
+    """Save a surface as PNG (with pygame) or WebP (with Pillow; pygame can't write WebP)"""
+    import pygame
+
+    if image_format == "webp":
+        from PIL import Image
+
+        image = Image.frombytes("RGB", surface.get_size(), pygame.image.tobytes(surface, "RGB"))
+        image.save(path, "WEBP", quality=85)
+    else:
+        pygame.image.save(surface, path)
+
+
+def init_worker(render_scale):
+    """Open the (dummy) display once per worker process"""
+    import main as game
+
+    # An offscreen framebuffer at the render scale, without SDL scaling the (unused) window
+    game.init_display(render_scale, mode="blit")
+
+
+def render_thumbnail(level, level_file, file_hash, output_path, size):
+    """Render one level to output_path and return its manifest entry"""
+    import pygame
+    import main as game
+
+    start = time.perf_counter()
+    # Seeded with the file hash, so an unchanged level always gets the same clouds
+    random.seed(file_hash)
+    game.current_level = level
+    level_data = game.reset_level(level_file)
+    game.draw_scene(game.screen)
+
+    thumbnail = pygame.transform.smoothscale(game.screen, size)
+    save_image(thumbnail, output_path, os.path.splitext(output_path)[1][1:])
+    return {
+        "file": level_file,
+        "sha256": file_hash,
+        "thumbnail": os.path.basename(output_path),
+        "name": (level_data.get("level") or {}).get("name") or f"Level {level}",
+        "render_ms": round((time.perf_counter() - start) * 1000.0, 1),
+    }
+
+
+def render_thumbnails(levels, output_dir, width, image_format, render_scale, jobs, force=False):
+    """Render the thumbnails of levels that changed and update the manifest
+
+    `levels` lists level numbers (None for every level). Returns the number of
+    thumbnails rendered; failures are reported and leave the old entry in place.
+    """
+    import main as game
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    size = (width, max(1, width * game.WINDOW_HEIGHT // game.WINDOW_WIDTH))
+    settings = {
+        "version": THUMBNAIL_VERSION,
+        "width": size[0],
+        "height": size[1],
+        "format": image_format,
+        "render_scale": render_scale,
+    }
+
+    manifest = load_manifest(output_dir)
+    if {key: manifest.get(key) for key in settings} != settings:
+        force = True
+    old_entries = manifest.get("levels", {})
+
+    all_levels = game.get_level_numbers()
+    entries = {}
+    pending = []
+    for level in all_levels:
+        level_file = game.get_level_file(level)
+        file_hash = hash_file(level_file)
+        entry = old_entries.get(str(level))
+        if levels is not None and level not in levels:
+            # Not asked for: keep whatever the last run produced
+            if entry is not None:
+                entries[str(level)] = entry
+        elif not force and is_up_to_date(entry, level_file, file_hash, output_dir):
+            entries[str(level)] = entry
+        else:
+            output_path = str(output_dir / f"level{level}.{image_format}")
+            pending.append((level, level_file, file_hash, output_path, size))
+            if entry is not None:
+                entries[str(level)] = entry
+
+    # Thumbnails of deleted levels
+    for level, entry in old_entries.items():
+        if int(level) not in all_levels:
+            (output_dir / entry.get("thumbnail", "")).unlink(missing_ok=True)
+
+    results = ()
+    if pending:
+        jobs = min(jobs, len(pending))
+        print(f"Rendering {len(pending)} of {len(all_levels)} levels on {jobs} process(es)")
+        results = run_in_process(pending, render_scale) if jobs == 1 else run_in_pool(pending, render_scale, jobs)
+
+    rendered = 0
+    for (level, level_file, *_), entry, error in results:
+        if error is not None:
+            print(f"  {level_file}: failed ({error})")
+            continue
+        entries[str(level)] = entry
+        rendered += 1
+        print(f"  {level_file} -> {entry['thumbnail']} ({entry['render_ms']:.0f} ms)")
+
+    manifest = dict(settings, levels={level: entries[level] for level in sorted(entries, key=int)})
+    save_manifest(output_dir, manifest)
+    return rendered
+
+
+def run_in_process(jobs, render_scale):
+    """Render jobs one after another in this process, yielding (job, entry, error)"""
+    init_worker(render_scale)
+    for job in jobs:
+        try:
+            yield job, render_thumbnail(*job), None
+        except Exception as e:
+            yield job, None, e
+
+
+def run_in_pool(jobs, render_scale, processes):
+    """Render jobs on a process pool, yielding (job, entry, error) as they finish"""
+    with ProcessPoolExecutor(processes, initializer=init_worker, initargs=(render_scale,)) as pool:
+        futures = {pool.submit(render_thumbnail, *job): job for job in jobs}
+        for future in as_completed(futures):
+            error = future.exception()
+            yield futures[future], None if error else future.result(), error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render thumbnails of the levels for the level map and editor")
+    parser.add_argument("levels", nargs="*", type=int, help="level numbers to render (default: every level)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIR, help=f"output folder (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--width", type=int, default=320, help="thumbnail width in pixels (default: 320)")
+    parser.add_argument("--format", choices=("png", "webp"), default="png", help="image format (default: png)")
+    parser.add_argument("--render-scale", type=float, default=0.5,
+                        help="resolution levels are drawn at before downscaling, relative to 1280x720 (default: 0.5)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="render every level even if it didn't change")
+    args = parser.parse_args()
+
+    if args.format == "webp" and importlib.util.find_spec("PIL") is None:
+        print("WebP thumbnails need Pillow (pip install Pillow); use --format png without it")
+        return 1
+
+    # Inherited by the worker processes
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    # The game loads levels and assets by relative path
+    os.chdir(REPO_ROOT)
+
+    start = time.perf_counter()
+    rendered = render_thumbnails(
+        args.levels or None, Path(args.output), args.width, args.format, args.render_scale, max(1, args.jobs), args.force,
+    )
+    print(f"{rendered} thumbnail(s) rendered in {time.perf_counter() - start:.1f} s, "
+          f"manifest: {Path(args.output) / MANIFEST_NAME}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
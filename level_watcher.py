@@ -0,0 +1,142 @@
+"""
+Level file watcher for Lily Unicorns
+Notices when level files change on disk so the running game can hot-reload them.
+Uses inotify on Linux and falls back to polling file modification times elsewhere.
+"""
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import threading
+
+# inotify constants (see <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+INOTIFY_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def _load_inotify():
+    """Return libc if it provides inotify, otherwise None"""
+    if not hasattr(select, "select") or not os.path.exists("/proc/sys/fs/inotify"):
+        return None
+    library_name = ctypes.util.find_library("c")
+    if library_name is None:
+        return None
+    try:
+        libc = ctypes.CDLL(library_name, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class LevelWatcher:
+    """Watch a directory for changed files in a background thread"""
+
+    def __init__(self, directory="levels", poll_interval=0.25):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.changes = queue.Queue()
+        self.backend = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._inotify_fd = None
+
+    def start(self):
+        """Start watching, preferring inotify over polling"""
+        if self._thread is not None or not os.path.isdir(self.directory):
+            return False
+
+        libc = _load_inotify()
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                mask = IN_CLOSE_WRITE | IN_MOVED_TO
+                if libc.inotify_add_watch(fd, os.fsencode(self.directory), mask) >= 0:
+                    self._inotify_fd = fd
+                    self.backend = "inotify"
+                else:
+                    os.close(fd)
+
+        if self.backend is None:
+            self.backend = "polling"
+            target = self._poll_loop
+        else:
+            target = self._inotify_loop
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=target, name="LevelWatcher", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Stop the background thread and release the inotify descriptor"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+        self.backend = None
+
+    def get_changes(self):
+        """Return the set of file paths that changed since the last call (never blocks)"""
+        changed = set()
+        while True:
+            try:
+                changed.add(self.changes.get_nowait())
+            except queue.Empty:
+                return changed
+
+    def _inotify_loop(self):
+        """Read inotify events and queue the paths of written files"""
+        fd = self._inotify_fd
+        while not self._stop_event.is_set():
+            # Short timeout so stop() is noticed promptly
+            readable, _, _ = select.select([fd], [], [], self.poll_interval)
+            if not readable:
+                continue
+            try:
+                buffer = os.read(fd, 4096)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+
+            offset = 0
+            while offset + INOTIFY_EVENT_HEADER.size <= len(buffer):
+                _, _, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+                offset += INOTIFY_EVENT_HEADER.size
+                name = buffer[offset:offset + name_length].rstrip(b"\0")
+                offset += name_length
+                if name:
+                    self.changes.put(os.path.join(self.directory, os.fsdecode(name)))
+
+    def _scan(self):
+        """Return a {path: (mtime, size)} snapshot of the watched directory"""
+        snapshot = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[os.path.join(self.directory, entry.name)] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            pass
+        return snapshot
+
+    def _poll_loop(self):
+        """Compare directory snapshots and queue the paths of changed files"""
+        previous = self._scan()
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._scan()
+            for path, signature in current.items():
+                if previous.get(path) != signature:
+                    self.changes.put(path)
+            previous = current
@@ -0,0 +1,51 @@
+// Live reload for pages served by server.py
+// The server sends a `change` event with the path of every file saved in the
+// game folder. A page handles the changes it can apply in place (a level it
+// shows, the thumbnails) in its onChange callback, which returns true for
+// those; a change to the page itself or to one of its scripts or stylesheets
+// reloads the page, and anything else is ignored.
+class LiveReload {
+    static connect(onChange = () => false) {
+        // Without server.py (file:// or a static host) there are no events
+        if (typeof EventSource === 'undefined' || window.location.protocol === 'file:') {
+            return null;
+        }
+
+        const source = new EventSource('/events');
+        let connected = false;
+        source.addEventListener('open', () => {
+            connected = true;
+        });
+        source.addEventListener('error', () => {
+            // The browser reconnects after a server restart, but not to a server without /events
+            if (!connected) {
+                source.close();
+            }
+        });
+        source.addEventListener('change', (event) => {
+            const change = JSON.parse(event.data);
+            if (onChange(change)) {
+                return;
+            }
+            if (LiveReload.isPageFile(change.path)) {
+                console.log(`${change.path} changed, reloading the page`);
+                window.location.reload();
+            }
+        });
+        return source;
+    }
+
+    static isPageFile(path) {
+        // Paths are relative to the game folder, like the page's own URLs
+        const urls = [
+            window.location.href,
+            ...Array.from(document.scripts, script => script.src),
+            ...Array.from(document.querySelectorAll('link[rel="stylesheet"]'), link => link.href)
+        ];
+        return urls.some(url => {
+            if (!url) return false;
+            const filePath = new URL(url).pathname.replace(/^\//, '');
+            return (filePath || 'index.html') === path;
+        });
+    }
+}
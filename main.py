@@ -2,11 +2,29 @@ import pygame
 import sys
 import random
 import math
-import yaml
 import os
 import glob
-
-pygame.init()
+import zlib
+from audio import AudioSystem
+from capture import CAPTURE_DIR, CAPTURE_FORMATS, FrameCapture
+from frame_pacing import FramePacer, PACING_MODES
+from input_latency import InputLatency
+from level_geometry import GeometryLayer, TextureTable, level_entry_key
+from level_streaming import Camera, LevelStreamer
+from level_watcher import LevelWatcher
+from netplay_inputs import (
+    ARROW_KEYS,
+    DEFAULT_INPUT_DELAY,
+    DEFAULT_PORT,
+    DIRECTION_INPUTS,
+    INPUT_NEXT,
+    INPUT_RESET,
+    WASD_KEYS,
+    read_input,
+)
+
+# Importing this module has no side effects: pygame subsystems, the window and
+# the first level are only set up once main() runs (see init_display).
 
 
 def invert_surface_colors(surface):
@@ -39,25 +57,28 @@ def invert_surface_colors(surface):
     return inverted
 
 
+def get_level_numbers():
+    """Return the sorted numbers of the level files in the levels folder
+
+    Levels are levelN.yml, or levelN.json as saved by the level editor (the YAML
+    file wins when both exist).
+    """
+    level_numbers = set()
+    for file_path in glob.glob("levels/level*.yml") + glob.glob("levels/level*.json"):
+        # Extract number from filename (e.g., "level3.yml" -> "3")
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        try:
+            level_numbers.add(int(stem[5:]))  # Remove "level"
+        except ValueError:
+            continue
+    return sorted(level_numbers)
+
+
 def get_max_levels():
     """Automatically detect the number of level files in the levels folder"""
     try:
-        # Get all level*.yml files in the levels directory
-        level_files = glob.glob("levels/level*.yml")
-        
-        # Extract level numbers and find the maximum
-        level_numbers = []
-        for file_path in level_files:
-            # Extract filename without path and extension
-            filename = os.path.basename(file_path)
-            # Extract number from filename (e.g., "level3.yml" -> "3")
-            if filename.startswith("level") and filename.endswith(".yml"):
-                try:
-                    level_num = int(filename[5:-4])  # Remove "level" and ".yml"
-                    level_numbers.append(level_num)
-                except ValueError:
-                    continue
-        
+        level_numbers = get_level_numbers()
+
         # Return the highest level number, or 1 if no levels found
         return max(level_numbers) if level_numbers else 1
     except Exception as e:
@@ -65,8 +86,17 @@ def get_max_levels():
         return 3  # Fallback to default
 
 
+def get_next_level(level):
+    """Return the number of the level after `level`, skipping gaps, or None after the last one"""
+    later_levels = [number for number in get_level_numbers() if number > level]
+    return later_levels[0] if later_levels else None
+
+
 def load_level(level_file):
-    """Load level configuration from YAML file"""
+    """Load level configuration from a YAML file (JSON levels parse as YAML too)"""
+    # Deferred import: PyYAML is not needed until the first level loads
+    import yaml
+
     try:
         with open(level_file, "r") as f:
             level_data = yaml.safe_load(f)
@@ -105,9 +135,12 @@ def load_background_image(image_path):
 
 
 def draw_ground(screen):
-    """Draw the ground at the bottom of the screen"""
+    """Draw the ground at the bottom of the world (the bottom of the screen unless it scrolls)"""
     ground_height_pixels = percentage_to_pixels(GROUND_HEIGHT_PERCENT, screen_height)
-    ground_rect = pygame.Rect(0, screen_height - ground_height_pixels, screen_width, ground_height_pixels)
+    ground_top = world_height - ground_height_pixels
+    if camera is not None:
+        ground_top -= camera.rect.y
+    ground_rect = pygame.Rect(0, ground_top, screen_width, ground_height_pixels)
     pygame.draw.rect(screen, GROUND_COLOR, ground_rect)
 
 
@@ -120,14 +153,163 @@ def percentage_to_pixels(percentage_value, screen_dimension):
         return int(percentage_value)
 
 
-def create_level_objects(level_data, screen_width, screen_height):
-    """Create game objects from level data"""
+def create_platform(platform_data, screen_width, screen_height, textures):
+    """Convert a platform entry to a geometry row; identical platforms share a texture"""
+    alpha = platform_data.get("alpha", 255)  # Default to fully opaque
+    color = tuple(platform_data["color"])
+
+    # Convert percentage-based positioning to pixels
+    x_pos = percentage_to_pixels(platform_data["x"], screen_width)
+    y_pos = screen_height - percentage_to_pixels(platform_data["y"], screen_height)  # Bottom-relative to top-relative
+    width = percentage_to_pixels(platform_data["width"], screen_width)
+    height = percentage_to_pixels(platform_data["height"], screen_height)
+
+    texture = textures.get_index(
+        ("platform", width, height, color, alpha),
+        lambda: Platform(0, 0, width, height, color, alpha),
+    )
+    return (x_pos, y_pos, width, height, color, alpha, texture, y_pos, height)
+
+
+def create_tree(tree_data, screen_width, screen_height, textures):
+    """Convert a tree entry to a geometry row; only the tree top can be stood on"""
+    # Convert percentage-based positioning to pixels
+    x_pos = percentage_to_pixels(tree_data["x"], screen_width)
+    y_pos = screen_height - percentage_to_pixels(tree_data["y"], screen_height)  # Bottom-relative to top-relative
+    width = percentage_to_pixels(tree_data["width"], screen_width)
+    height = percentage_to_pixels(tree_data["height"], screen_height)
+
+    texture = textures.get_index(("tree", width, height), lambda: Tree(0, 0, width, height))
+    prototype = textures[texture]  # Built at 0, 0, so its tree top is relative to y_pos
+    return (
+        x_pos, y_pos, width, height, Tree.CROWN_COLOR, 255, texture,
+        y_pos + prototype.visual_tree_top, prototype.top_collision_height,
+    )
+
+
+def create_cloud(cloud_data, screen_width, screen_height, textures):
+    """Convert a cloud entry to a geometry row; same-size clouds share a few textures"""
+    # Convert percentage-based positioning to pixels
+    x_pos = percentage_to_pixels(cloud_data["x"], screen_width)
+    y_pos = screen_height - percentage_to_pixels(cloud_data["y"], screen_height)  # Bottom-relative to top-relative
+    width = percentage_to_pixels(cloud_data["width"], screen_width)
+    height = percentage_to_pixels(cloud_data["height"], screen_height)
+
+    # Get optional alpha value
+    alpha = cloud_data.get("alpha", 180)  # Default to semi-transparent
+
+    # Pick one of a few random cloud shapes for this size, so repeated clouds still vary
+    variant = hash((cloud_data["x"], cloud_data["y"])) % CLOUD_VARIANTS
+    texture = textures.get_index(
+        ("cloud", width, height, alpha, variant),
+        lambda: Cloud(0, 0, width, height, alpha),
+    )
+    return (x_pos, y_pos, width, height, (255, 255, 255), alpha, texture, y_pos, height)
+
+
+def create_white_item(item_data, screen_width, screen_height, textures):
+    """Convert a white item entry to a geometry row"""
+    return create_item(item_data, screen_width, screen_height, textures, (255, 255, 255))
+
+
+def create_black_item(item_data, screen_width, screen_height, textures):
+    """Convert a black item entry to a geometry row"""
+    return create_item(item_data, screen_width, screen_height, textures, (0, 0, 0))
+
+
+def create_item(item_data, screen_width, screen_height, textures, color):
+    """Convert an item entry to a geometry row; all items of one color share a texture"""
+    x_pos = percentage_to_pixels(item_data["x"], screen_width)
+    y_pos = screen_height - percentage_to_pixels(item_data["y"], screen_height)  # Bottom-relative to top-relative
+
+    texture = textures.get_index(("item", color), lambda: Item(0, 0, color))
+    size = textures[texture].rect.width
+    return (x_pos, y_pos, size, size, color, 255, texture, y_pos, size)
+
+
+def create_triangle(triangle_data, screen_width, screen_height, textures):
+    """Convert a triangle entry (a hazard) to a geometry row; it has no top to stand on"""
+    x_pos = percentage_to_pixels(triangle_data["x"], screen_width)
+    y_pos = screen_height - percentage_to_pixels(triangle_data["y"], screen_height)  # Bottom-relative to top-relative
+    size = percentage_to_pixels(triangle_data["size"], screen_width)
+    color = tuple(triangle_data.get("color") or (255, 0, 0))
+
+    texture = textures.get_index(("triangle", size, color), lambda: Triangle(0, 0, size, color))
+    rect = textures[texture].rect  # Built at 0, 0, so the border overhang is relative to x_pos, y_pos
+    return (x_pos + rect.x, y_pos + rect.y, rect.width, rect.height, color, 255, texture, y_pos, 0)
+
+
+def create_swamp(swamp_data, screen_width, screen_height, textures):
+    """Convert a swamp entry (a hazard) to a geometry row; it has no top to stand on"""
+    x_pos = percentage_to_pixels(swamp_data["x"], screen_width)
+    y_pos = screen_height - percentage_to_pixels(swamp_data["y"], screen_height)  # Bottom-relative to top-relative
+    width = percentage_to_pixels(swamp_data["width"], screen_width)
+    height = percentage_to_pixels(swamp_data["height"], screen_height)
+    color = tuple(swamp_data.get("color") or (139, 69, 19))
+
+    texture = textures.get_index(("swamp", width, height, color), lambda: Swamp(0, 0, width, height, color))
+    return (x_pos, y_pos, width, height, color, 255, texture, y_pos, 0)
+
+
+def create_text(text_data, screen_width, screen_height, textures):
+    """Convert a text entry to a geometry row; only texts with canStandOn have a top"""
+    x_pos = percentage_to_pixels(text_data["x"], screen_width)
+    baseline_y = screen_height - percentage_to_pixels(text_data["y"], screen_height)  # Bottom-relative to top-relative
+    text = text_data.get("text") or "Sample Text"
+    font_size = max(1, scale_pixels(text_data.get("fontSize") or 20))
+    color = tuple(text_data.get("textColor") or (0, 0, 0))
+
+    texture = textures.get_index(("text", text, font_size, color), lambda: Text(0, 0, text, font_size, color))
+    rect = textures[texture].rect  # Built with its baseline at 0, so rect is relative to x_pos, baseline_y
+    top_offset = Text.get_top_offset(font_size)
+    top_height = top_offset if text_data.get("canStandOn") else 0
+    return (
+        x_pos + rect.x, baseline_y + rect.y, rect.width, rect.height, color, 255, texture,
+        baseline_y - top_offset, top_height,
+    )
+
+
+def create_rainbow(rainbow_data, screen_width, screen_height):
+    """Create the rainbow sprite from its level entry"""
+    # Convert percentage-based positioning to pixels
+    x_pos = percentage_to_pixels(rainbow_data["x"], screen_width)
+    y_pos = percentage_to_pixels(rainbow_data["y"], screen_height)
+    width = percentage_to_pixels(rainbow_data["width"], screen_width)
+    height = percentage_to_pixels(rainbow_data["height"], screen_height)
+
+    return Rainbow(
+        screen_width - x_pos,  # Convert from right-relative to left-relative
+        screen_height - y_pos,  # Convert from bottom-relative to top-relative
+        width,
+        height,
+    )
+
+
+# Level entry lists and the function that builds one geometry row from each entry
+LEVEL_OBJECT_BUILDERS = {
+    "platforms": create_platform,
+    "trees": create_tree,
+    "clouds": create_cloud,
+    "white_items": create_white_item,
+    "black_items": create_black_item,
+    "triangles": create_triangle,
+    "swamps": create_swamp,
+    "texts": create_text,
+}
+
+# Number of different random cloud textures generated per cloud size
+CLOUD_VARIANTS = 4
+
+
+def create_level_objects(level_data, screen_width, screen_height, textures=None):
+    """Create game objects from level data
+
+    Platforms, trees, clouds, items, triangles, swamps and texts become
+    GeometryLayers (arrays plus shared textures from `textures`); the clouds are
+    also baked into drifting CloudLayers. The rainbow is a regular sprite.
+    """
     objects = {
-        "platforms": pygame.sprite.Group(),
-        "trees": pygame.sprite.Group(),
-        "clouds": pygame.sprite.Group(),
-        "white_items": pygame.sprite.Group(),
-        "black_items": pygame.sprite.Group(),
+        "textures": textures if textures is not None else TextureTable(),
         "rainbow": None,
         "unicorn1_start": None,
         "unicorn2_start": None,
@@ -139,134 +321,137 @@ def create_level_objects(level_data, screen_width, screen_height):
         if background_path:
             load_background_image(background_path)
 
-    # Create platforms
-    if "platforms" in level_data:
-        for platform_data in level_data["platforms"]:
-            alpha = platform_data.get("alpha", 255)  # Default to fully opaque
-            
-            # Convert percentage-based positioning to pixels
-            x_pos = percentage_to_pixels(platform_data["x"], screen_width)
-            y_pos = percentage_to_pixels(platform_data["y"], screen_height)
-            width = percentage_to_pixels(platform_data["width"], screen_width)
-            height = percentage_to_pixels(platform_data["height"], screen_height)
-            
-            platform = Platform(
-                x_pos,
-                screen_height - y_pos,  # Convert from bottom-relative to top-relative
-                width,
-                height,
-                tuple(platform_data["color"]),
-                alpha,
-            )
-            objects["platforms"].add(platform)
-
-    # Create trees
-    if "trees" in level_data:
-        for tree_data in level_data["trees"]:
-            # Convert percentage-based positioning to pixels
-            x_pos = percentage_to_pixels(tree_data["x"], screen_width)
-            y_pos = percentage_to_pixels(tree_data["y"], screen_height)
-            width = percentage_to_pixels(tree_data["width"], screen_width)
-            height = percentage_to_pixels(tree_data["height"], screen_height)
-            
-            tree = Tree(
-                x_pos,
-                screen_height - y_pos,  # Convert from bottom-relative to top-relative
-                width,
-                height,
-            )
-            objects["trees"].add(tree)
-
-    # Create clouds
-    if "clouds" in level_data:
-        for cloud_data in level_data["clouds"]:
-            # Convert percentage-based positioning to pixels
-            x_pos = percentage_to_pixels(cloud_data["x"], screen_width)
-            y_pos = percentage_to_pixels(cloud_data["y"], screen_height)
-            width = percentage_to_pixels(cloud_data["width"], screen_width)
-            height = percentage_to_pixels(cloud_data["height"], screen_height)
-            
-            # Get optional alpha value
-            alpha = cloud_data.get("alpha", 180)  # Default to semi-transparent
-            
-            cloud = Cloud(
-                x_pos,
-                screen_height - y_pos,  # Convert from bottom-relative to top-relative
-                width,
-                height,
-                alpha,
-            )
-            objects["clouds"].add(cloud)
-
-    # Create white items
-    if "white_items" in level_data:
-        for item_data in level_data["white_items"]:
-            x_pos = percentage_to_pixels(item_data["x"], screen_width)
-            y_pos = percentage_to_pixels(item_data["y"], screen_height)
-            
-            item = Item(
-                x_pos,
-                screen_height - y_pos,  # Convert from bottom-relative to top-relative
-                (255, 255, 255),
-            )
-            objects["white_items"].add(item)
-
-    # Create black items
-    if "black_items" in level_data:
-        for item_data in level_data["black_items"]:
-            x_pos = percentage_to_pixels(item_data["x"], screen_width)
-            y_pos = percentage_to_pixels(item_data["y"], screen_height)
-            
-            item = Item(
-                x_pos,
-                screen_height - y_pos,  # Convert from bottom-relative to top-relative
-                (0, 0, 0),
-            )
-            objects["black_items"].add(item)
+    # Create platforms, trees, clouds, items and obstacles
+    for key, builder in LEVEL_OBJECT_BUILDERS.items():
+        entries = level_data.get(key) or []
+        rows = [builder(entry, screen_width, screen_height, objects["textures"]) for entry in entries]
+        objects[key] = GeometryLayer(rows, entries)
+    objects["cloud_layers"] = create_cloud_layers(objects["clouds"], objects["textures"], screen_width)
 
     # Create rainbow
     if "rainbow" in level_data:
-        rainbow_data = level_data["rainbow"]
-        
-        # Convert percentage-based positioning to pixels
-        x_pos = percentage_to_pixels(rainbow_data["x"], screen_width)
-        y_pos = percentage_to_pixels(rainbow_data["y"], screen_height)
-        width = percentage_to_pixels(rainbow_data["width"], screen_width)
-        height = percentage_to_pixels(rainbow_data["height"], screen_height)
-        
-        objects["rainbow"] = Rainbow(
-            screen_width - x_pos,  # Convert from right-relative to left-relative
-            screen_height - y_pos,  # Convert from bottom-relative to top-relative
-            width,
-            height,
-        )
+        objects["rainbow"] = create_rainbow(level_data["rainbow"], screen_width, screen_height)
+        objects["rainbow"].level_entry = level_data["rainbow"]
 
     # Get unicorn starting positions
     if "unicorns" in level_data:
         unicorns_data = level_data["unicorns"]
         if "unicorn1" in unicorns_data:
-            u1_data = unicorns_data["unicorn1"]
-            x_pos = percentage_to_pixels(u1_data["x"], screen_width)
-            y_pos = (
-                screen_height // 2
-                if u1_data["y"] is None
-                else screen_height - percentage_to_pixels(u1_data["y"], screen_height)
-            )
-            objects["unicorn1_start"] = (x_pos, y_pos)
-            
+            objects["unicorn1_start"] = get_unicorn_start(unicorns_data["unicorn1"], screen_width, screen_height)
         if "unicorn2" in unicorns_data:
-            u2_data = unicorns_data["unicorn2"]
-            x_pos = percentage_to_pixels(u2_data["x"], screen_width)
-            y_pos = (
-                screen_height // 2
-                if u2_data["y"] is None
-                else screen_height - percentage_to_pixels(u2_data["y"], screen_height)
-            )
-            objects["unicorn2_start"] = (x_pos, y_pos)
+            objects["unicorn2_start"] = get_unicorn_start(unicorns_data["unicorn2"], screen_width, screen_height)
 
     return objects
 
 
+def get_world_size(level_data):
+    """Return the size in pixels of the level's world (its optional `world` size is in screens)"""
+    world = level_data.get("world") or {}
+    return int(screen_width * world.get("width", 1)), int(screen_height * world.get("height", 1))
+
+
+def get_entry_bounds(key, entry, world_width, world_height):
+    """Rect around a level entry, worked out without building it (used to sort entries into chunks)"""
+    x_pos = percentage_to_pixels(entry["x"], world_width)
+    y_pos = world_height - percentage_to_pixels(entry["y"], world_height)  # Bottom-relative to top-relative
+    if "width" in entry:
+        width = percentage_to_pixels(entry["width"], world_width)
+        height = percentage_to_pixels(entry["height"], world_height)
+    elif "size" in entry:
+        width = height = percentage_to_pixels(entry["size"], world_width)
+    elif key == "texts":
+        # Generous estimate of the rendered text around its baseline
+        font_size = scale_pixels(entry.get("fontSize") or 20)
+        width = len(entry.get("text") or "Sample Text") * font_size
+        return pygame.Rect(x_pos, y_pos - font_size, width, 2 * font_size)
+    else:
+        width = height = scale_pixels(ITEM_SIZE)
+    return pygame.Rect(x_pos, y_pos, width, height)
+
+
+def create_streamed_level_objects(level_data, world_width, world_height):
+    """Create the objects of a level larger than the screen, in world coordinates
+
+    Returns (objects, streamer): platforms, trees, clouds, items and obstacles start
+    out as empty layers and are filled in by the LevelStreamer around the camera.
+    """
+    other_data = {key: value for key, value in level_data.items() if key not in LEVEL_OBJECT_BUILDERS}
+    objects = create_level_objects(other_data, world_width, world_height)
+    streamer = LevelStreamer(
+        level_data, LEVEL_OBJECT_BUILDERS, get_entry_bounds, world_width, world_height,
+        max(1, scale_pixels(LEVEL_CHUNK_SIZE)), objects["textures"],
+    )
+    return objects, streamer
+
+
+# Side of the square chunks large levels are streamed in, in pixels at 1280x720
+LEVEL_CHUNK_SIZE = 640
+
+
+def get_unicorn_start(unicorn_data, screen_width, screen_height):
+    """Convert a unicorn's level entry to a starting (x, y) center in pixels"""
+    x_pos = percentage_to_pixels(unicorn_data["x"], screen_width)
+    y_pos = (
+        screen_height // 2
+        if unicorn_data["y"] is None
+        else screen_height - percentage_to_pixels(unicorn_data["y"], screen_height)
+    )
+    return (x_pos, y_pos)
+
+
+def update_level_objects(level_objects, new_level_data, screen_width, screen_height):
+    """Diff new level data against live level objects and rebuild only what changed
+
+    Each layer's arrays are rebuilt from the new entries (cheap), but textures come
+    from the shared table, so only new or edited looks are drawn from scratch.
+    Unchanged items keep their collected state. Returns the number of entries that
+    were added or edited.
+    """
+    rebuilt = 0
+    textures = level_objects["textures"]
+    old_clouds = [level_entry_key(entry) for entry in level_objects["clouds"].entries]
+
+    for key, builder in LEVEL_OBJECT_BUILDERS.items():
+        old_layer = level_objects[key]
+
+        # Remember which entries were still in play, by contents
+        old_alive = {}
+        for entry, alive in zip(old_layer.entries, old_layer.alive):
+            old_alive.setdefault(level_entry_key(entry), []).append(bool(alive))
+
+        entries = new_level_data.get(key) or []
+        layer = GeometryLayer([builder(entry, screen_width, screen_height, textures) for entry in entries], entries)
+        for i, entry in enumerate(entries):
+            matches = old_alive.get(level_entry_key(entry))
+            if matches:
+                layer.alive[i] = matches.pop(0)
+            else:
+                rebuilt += 1
+
+        level_objects[key] = layer
+
+    # Re-bake the cloud strips only if the clouds changed, and let them drift on from where they were
+    if [level_entry_key(entry) for entry in level_objects["clouds"].entries] != old_clouds:
+        old_cloud_layers = level_objects["cloud_layers"]
+        level_objects["cloud_layers"] = create_cloud_layers(level_objects["clouds"], textures, screen_width)
+        for old_cloud_layer, cloud_layer in zip(old_cloud_layers, level_objects["cloud_layers"]):
+            cloud_layer.offset = old_cloud_layer.offset % cloud_layer.width
+
+    # Rebuild the rainbow only if its entry changed
+    old_rainbow = level_objects["rainbow"]
+    rainbow_data = new_level_data.get("rainbow")
+    old_key = level_entry_key(old_rainbow.level_entry) if old_rainbow else None
+    new_key = level_entry_key(rainbow_data) if rainbow_data else None
+    if old_key != new_key:
+        level_objects["rainbow"] = None
+        if rainbow_data:
+            level_objects["rainbow"] = create_rainbow(rainbow_data, screen_width, screen_height)
+            level_objects["rainbow"].level_entry = rainbow_data
+        rebuilt += 1
+
+    return rebuilt
+
+
 # Set window size with 16:9 aspect ratio
 WINDOW_WIDTH = 1280
 WINDOW_HEIGHT = 720  # 1280/720 = 16:9 ratio
@@ -275,16 +460,28 @@ WINDOW_HEIGHT = 720  # 1280/720 = 16:9 ratio
 GROUND_HEIGHT_PERCENT = 14  # Height of ground as percentage of screen height
 GROUND_COLOR = (139, 69, 19)  # Brown color (RGB)
 
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+# Render resolution: the game is drawn into an internal framebuffer of
+# WINDOW_WIDTH x WINDOW_HEIGHT * render_scale, then scaled up to the window
+render_scale = 1.0
 screen_width, screen_height = WINDOW_WIDTH, WINDOW_HEIGHT
-pygame.display.set_caption("Lily Unicorns")
 
-clock = pygame.time.Clock()
+# Size of the level being played; larger than the screen when the level sets a
+# `world` size, in which case the camera follows the unicorns around it
+world_width, world_height = screen_width, screen_height
+camera = None
+level_streamer = None
 
-# Initialize fonts for different uses
-font = pygame.font.Font(None, 36)
-title_font = pygame.font.Font(None, 96)  # Large pixelized font for title
-menu_font = pygame.font.Font(None, 48)   # Medium font for menu items
+# Present modes: "scaled" lets SDL scale the framebuffer (pygame.SCALED),
+# "blit" scales it into the window surface with one transform.scale per frame
+PRESENT_MODES = ("scaled", "blit")
+present_mode = "scaled"
+
+# Window and fonts are created by init_display()
+screen = None  # Internal framebuffer every draw targets
+display = None  # Window surface (same as screen unless present_mode is "blit")
+font = None
+title_font = None
+menu_font = None
 
 # Global background image
 background_image = None
@@ -294,6 +491,134 @@ MENU = 0
 PLAYING = 1
 game_state = MENU
 
+
+def scale_pixels(value):
+    """Scale a pixel size designed for 1280x720 to the current render resolution"""
+    return int(value * render_scale)
+
+
+def init_display(scale=1.0, fullscreen=False, mode="scaled", vsync=False):
+    """Initialize only the pygame subsystems the menu needs and open the window"""
+    global screen, display, font, title_font, menu_font
+    global render_scale, screen_width, screen_height, present_mode, world_width, world_height
+
+    # Audio is started separately (in the background) once the menu is up
+    pygame.display.init()
+    pygame.font.init()
+
+    render_scale = scale
+    present_mode = mode
+    screen_width = max(1, int(WINDOW_WIDTH * render_scale))
+    screen_height = max(1, int(WINDOW_HEIGHT * render_scale))
+    world_width, world_height = screen_width, screen_height
+
+    if present_mode == "scaled":
+        # SDL scales the framebuffer to the window (or the whole monitor) on the GPU
+        flags = 0
+        if fullscreen:
+            flags = pygame.SCALED | pygame.FULLSCREEN
+        elif render_scale != 1.0 or vsync:
+            # SDL only honours vsync through its renderer, which SCALED enables
+            flags = pygame.SCALED
+        display = set_display_mode((screen_width, screen_height), flags, vsync)
+        screen = display
+    else:
+        # Draw into an offscreen framebuffer and scale it into the window ourselves
+        if fullscreen:
+            display = set_display_mode((0, 0), pygame.FULLSCREEN, vsync)
+        else:
+            display = set_display_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SCALED if vsync else 0, vsync)
+        if display.get_size() == (screen_width, screen_height):
+            screen = display
+        else:
+            screen = pygame.Surface((screen_width, screen_height)).convert()
+    pygame.display.set_caption("Lily Unicorns")
+
+    # Initialize fonts for different uses
+    font = pygame.font.Font(None, scale_pixels(36))
+    title_font = pygame.font.Font(None, scale_pixels(96))  # Large pixelized font for title
+    menu_font = pygame.font.Font(None, scale_pixels(48))   # Medium font for menu items
+
+
+def set_display_mode(size, flags, vsync):
+    """Open the window, falling back to no vsync if the driver can't provide it"""
+    if vsync:
+        try:
+            return pygame.display.set_mode(size, flags, vsync=1)
+        except pygame.error as e:
+            print(f"Vsync not available ({e}), continuing without it")
+    return pygame.display.set_mode(size, flags)
+
+
+def present_frame():
+    """Show the finished frame, scaling the framebuffer to the window if needed"""
+    if screen is not display:
+        pygame.transform.scale(screen, display.get_size(), display)
+    pygame.display.flip()
+
+
+# Transparent colors for opaque sprites; the first one a sprite doesn't use is its colorkey
+COLORKEY_CANDIDATES = ((255, 0, 255), (0, 255, 255), (1, 254, 1), (254, 1, 254))
+
+
+def finalize_surface(surface):
+    """Convert a generated surface to the display format, set up for the fastest blits
+
+    Sprites whose pixels are all either opaque or fully transparent (platforms,
+    trees, items, triangles, unicorn frames) lose their alpha channel and get a
+    colorkey for the holes. Translucent sprites (clouds, text edges, the rainbow's
+    set_alpha) keep per-pixel alpha, with any surface alpha multiplied into it,
+    because SDL blends surface alpha much more slowly. Both are run-length encoded
+    (RLEACCEL): transparent runs are skipped and opaque runs copied whole, which
+    also beats a plain blit for sprites without holes. Run-length encoded blits
+    only work onto opaque targets like the screen. Without a display mode
+    (headless tools like vector_env), or if it is already finalized, the surface
+    is returned unchanged.
+    """
+    if pygame.display.get_surface() is None or surface.get_flags() & pygame.RLEACCELOK:
+        return surface
+
+    surface_alpha = surface.get_alpha()
+    if surface_alpha is None:
+        surface_alpha = 255
+    translucent = surface_alpha < 255
+    holes = None
+    if surface.get_flags() & pygame.SRCALPHA:
+        alpha = pygame.surfarray.pixels_alpha(surface)
+        # Any alpha from 1 to 254 (alpha - 1 wraps around to 255 for alpha 0)
+        translucent = translucent or bool((alpha - 1 < 254).any())
+        holes = alpha == 0
+        del alpha  # Unlocks the surface
+
+    if not translucent:
+        converted = surface.convert()
+        pixels = pygame.surfarray.pixels2d(converted)
+        used = pixels if holes is None else pixels[~holes]
+        key = next((color for color in COLORKEY_CANDIDATES if not (used == converted.map_rgb(color)).any()), None)
+        if key is not None and holes is not None:
+            pixels[holes] = converted.map_rgb(key)
+        del pixels, used
+        # A sprite using every candidate color falls through to per-pixel alpha
+        if key is not None:
+            converted.set_colorkey(key, pygame.RLEACCEL)
+            return converted
+
+    converted = surface.convert_alpha()
+    if surface_alpha < 255:
+        converted.set_alpha(255)
+        converted.fill((255, 255, 255, surface_alpha), special_flags=pygame.BLEND_RGBA_MULT)
+    converted.set_alpha(255, pygame.RLEACCEL)
+    return converted
+
+
+def draw_loading_screen(surface, message="Loading..."):
+    """Show a loading message while a level is being built (or another message while waiting)"""
+    surface.fill((50, 150, 50))
+    loading_text = font.render(message, True, (255, 255, 255))
+    surface.blit(loading_text, loading_text.get_rect(center=(screen_width // 2, screen_height // 2)))
+    present_frame()
+
+
 class MenuSystem:
     def __init__(self):
         self.selected_option = 0
@@ -308,6 +633,12 @@ class MenuSystem:
         
         # Animation for title
         self.title_pulse_timer = 0
+
+        # Title fonts by point size, so the pulse doesn't reload the font every frame
+        self.title_fonts = {}
+
+        # Drifting background clouds, baked on the first draw
+        self.cloud_layers = None
         
     def draw_pixelized_text(self, surface, text, font, color, x, y, center=False):
         """Draw text with pixelized effect"""
@@ -343,6 +674,8 @@ class MenuSystem:
     def update(self):
         """Update menu animations"""
         self.title_pulse_timer += 0.1
+        for cloud_layer in self.cloud_layers or []:
+            cloud_layer.update()
     
     def handle_input(self, event):
         """Handle menu input"""
@@ -375,7 +708,11 @@ class MenuSystem:
         )
         
         # Scale title font
-        scaled_font = pygame.font.Font(None, int(96 * title_scale))
+        title_size = scale_pixels(96 * title_scale)
+        scaled_font = self.title_fonts.get(title_size)
+        if scaled_font is None:
+            scaled_font = pygame.font.Font(None, title_size)
+            self.title_fonts[title_size] = scaled_font
         
         self.draw_pixelized_text(
             surface, 
@@ -388,7 +725,7 @@ class MenuSystem:
         )
         
         # Draw menu options
-        menu_y_start = screen_height // 2 + 50
+        menu_y_start = screen_height // 2 + scale_pixels(50)
         for i, option in enumerate(self.menu_options):
             color = self.selected_color if i == self.selected_option else self.normal_color
             
@@ -404,7 +741,7 @@ class MenuSystem:
                 menu_font,
                 color,
                 screen_width // 2,
-                menu_y_start + i * 80,
+                menu_y_start + i * scale_pixels(80),
                 center=True
             )
         
@@ -416,27 +753,33 @@ class MenuSystem:
             font,
             (200, 200, 200),
             screen_width // 2,
-            screen_height - 80,
+            screen_height - scale_pixels(80),
             center=True
         )
     
     def draw_background_clouds(self, surface):
-        """Draw some background clouds for atmosphere"""
-        # Create a few static clouds for the menu background
-        cloud_positions = [
-            (screen_width * 0.15, screen_height * 0.2, screen_width * 0.2, screen_height * 0.1),
-            (screen_width * 0.7, screen_height * 0.15, screen_width * 0.15, screen_height * 0.08),
-            (screen_width * 0.1, screen_height * 0.7, screen_width * 0.18, screen_height * 0.09),
-            (screen_width * 0.8, screen_height * 0.75, screen_width * 0.12, screen_height * 0.06),
-        ]
-        
-        for x, y, w, h in cloud_positions:
-            # Create a simple cloud for menu background
-            cloud = Cloud(int(x), int(y), int(w), int(h), 100)  # More transparent
-            surface.blit(cloud.image, (x, y))
+        """Draw some drifting background clouds for atmosphere"""
+        if self.cloud_layers is None:
+            # Two depth layers: small far clouds drift slower than the big near ones
+            depths = [
+                [(0.7, 0.15, 0.15, 0.08), (0.8, 0.75, 0.12, 0.06)],
+                [(0.15, 0.2, 0.2, 0.1), (0.1, 0.7, 0.18, 0.09)],
+            ]
+            self.cloud_layers = []
+            for cloud_positions, speed in zip(depths, CLOUD_LAYER_SPEEDS):
+                clouds = [
+                    # More transparent than level clouds
+                    (Cloud(0, 0, int(screen_width * w), int(screen_height * h), 100).image,
+                     int(screen_width * x), int(screen_height * y))
+                    for x, y, w, h in cloud_positions
+                ]
+                self.cloud_layers.append(CloudLayer(screen_width, clouds, speed * render_scale))
+
+        for cloud_layer in self.cloud_layers:
+            cloud_layer.draw(surface)
 
-# Initialize menu system
-menu_system = MenuSystem()
+# Menu system (created by main())
+menu_system = None
 
 
 class Platform(pygame.sprite.Sprite):
@@ -444,12 +787,15 @@ class Platform(pygame.sprite.Sprite):
         super().__init__()
         self.image = pygame.Surface((width, height), pygame.SRCALPHA)
         self.image.fill((*color, alpha))
+        self.image = finalize_surface(self.image)
         self.rect = pygame.Rect(x, y, width, height)
         self.color = color
         self.alpha = alpha
 
 
 class Tree(pygame.sprite.Sprite):
+    CROWN_COLOR = (34, 139, 34)
+
     def __init__(self, x, y, width, height):
         super().__init__()
         self.image = pygame.Surface((width, height), pygame.SRCALPHA)
@@ -463,7 +809,7 @@ class Tree(pygame.sprite.Sprite):
         
         # Calculate foliage dimensions and position
         crown_radius = int(width * 0.4)
-        crown_color = (34, 139, 34)
+        crown_color = self.CROWN_COLOR
         trunk_color = (101, 67, 33)
         
         # Position foliage to connect with trunk top
@@ -491,12 +837,8 @@ class Tree(pygame.sprite.Sprite):
                          (foliage_center_x, top_circle_y), 
                          crown_radius // 3)
         
-        # Calculate the actual visual top of the tree
-        # The highest point is the top of the top circle minus its radius
-        visual_tree_top_y = top_circle_y - crown_radius // 3
-        
         # Top collision area (positioned at the actual visual tree top)
-        self.top_collision_height = int(height * 0.15)  # Small collision area at the very top
+        visual_tree_top_y, self.top_collision_height = self.get_top_geometry(width, height)
         # Position collision rect at the visual tree top
         collision_rect_y = y + visual_tree_top_y
         self.top_collision_rect = pygame.Rect(x, collision_rect_y, width, self.top_collision_height)
@@ -504,6 +846,20 @@ class Tree(pygame.sprite.Sprite):
         # Store the actual tree top position for collision detection
         self.visual_tree_top = y + visual_tree_top_y
 
+        self.image = finalize_surface(self.image)
+
+    @staticmethod
+    def get_top_geometry(width, height):
+        """Return (visual top offset, collision height) of the tree crown for a tree size"""
+        # Same layout as the drawing above: trunk, crown on top of it, small top circle
+        trunk_y = height - int(height * 0.6)
+        crown_radius = int(width * 0.4)
+        foliage_center_y = trunk_y + crown_radius // 2
+        top_circle_y = foliage_center_y - crown_radius // 2
+        # The highest point is the top of the top circle minus its radius
+        visual_tree_top_y = top_circle_y - crown_radius // 3
+        return visual_tree_top_y, int(height * 0.15)  # Small collision area at the very top
+
 
 class Cloud(pygame.sprite.Sprite):
     def __init__(self, x, y, width, height, alpha=180):
@@ -513,6 +869,7 @@ class Cloud(pygame.sprite.Sprite):
         
         # Generate realistic cloud using noise-based approach
         self.generate_realistic_cloud(width, height, alpha)
+        self.image = finalize_surface(self.image)
     
     def simple_noise(self, x, y, seed=1):
         """Simple pseudo-noise function for cloud generation"""
@@ -618,14 +975,176 @@ class Cloud(pygame.sprite.Sprite):
                             self.image.set_at((x, y), color)
 
 
+# Drift speed of each cloud depth layer in pixels per frame at 1280x720, farthest first
+CLOUD_LAYER_SPEEDS = (0.15, 0.3, 0.5)
+
+
+class CloudLayer:
+    """Clouds at one depth, baked into a strip that tiles horizontally and drifts right
+
+    The clouds are blitted into the strip once; drawing the layer then costs two
+    blits per frame however many clouds it holds.
+    """
+
+    def __init__(self, width, clouds, speed):
+        """clouds is a list of (image, x, y); width is the strip (screen) width"""
+        top = min(y for _, _, y in clouds)
+        bottom = max(y + image.get_height() for image, _, y in clouds)
+        self.y = top
+        self.width = width
+        self.strip = pygame.Surface((width, bottom - top), pygame.SRCALPHA)
+        for image, x, y in clouds:
+            # SDL's run-length encoded blits assume an opaque target, so blend the
+            # (finalized) clouds into the transparent strip without it
+            image.set_alpha(255)
+            # A cloud sticking out of the right edge continues at the left edge
+            self.strip.blit(image, (x % width, y - top))
+            self.strip.blit(image, (x % width - width, y - top))
+            image.set_alpha(255, pygame.RLEACCEL)
+        # Run-length encoded, so the transparent gaps between clouds cost almost nothing to blit
+        self.strip = finalize_surface(self.strip)
+
+        self.speed = speed
+        self.offset = 0.0
+
+    def update(self, dt=1.0):
+        """Drift; dt is the time step in 60 Hz frames"""
+        self.offset = (self.offset + self.speed * dt) % self.width
+
+    def draw(self, surface):
+        """Blit the strip twice so the screen stays covered as it wraps around"""
+        x = int(self.offset)
+        surface.blit(self.strip, (x, self.y))
+        surface.blit(self.strip, (x - self.width, self.y))
+
+
+def create_cloud_layers(clouds, textures, width):
+    """Bake the clouds GeometryLayer into parallax CloudLayers
+
+    Smaller clouds are treated as farther away, so they go into slower layers.
+    """
+    count = len(clouds.x)
+    by_size = sorted(range(count), key=lambda i: int(clouds.width[i]) * int(clouds.height[i]))
+    depths = [[] for _ in CLOUD_LAYER_SPEEDS]
+    for rank, i in enumerate(by_size):
+        image = textures[clouds.texture[i]].image
+        depths[rank * len(depths) // count].append((image, int(clouds.x[i]), int(clouds.y[i])))
+    return [
+        CloudLayer(width, depth_clouds, speed * render_scale)
+        for depth_clouds, speed in zip(depths, CLOUD_LAYER_SPEEDS)
+        if depth_clouds
+    ]
+
+
+# Item size in pixels at 1280x720 (scaled with the render resolution)
+ITEM_SIZE = 20
+
+
 class Item(pygame.sprite.Sprite):
     def __init__(self, x, y, color):
         super().__init__()
-        self.image = pygame.Surface((20, 20))
+        size = max(1, scale_pixels(ITEM_SIZE))
+        self.image = pygame.Surface((size, size))
         self.image.fill(color)
-        self.rect = pygame.Rect(x, y, 20, 20)
+        self.image = finalize_surface(self.image)
+        self.rect = pygame.Rect(x, y, size, size)
+        self.color = color
+
+
+class Triangle(pygame.sprite.Sprite):
+    """A hazard: a triangle pointing up with its apex at (x + size / 2, y)"""
+
+    BORDER_COLOR = (0, 0, 0)
+    BORDER_WIDTH = 2
+
+    def __init__(self, x, y, size, color):
+        super().__init__()
+        # The border is centered on the edges, so half of it sticks out of the size x size box
+        border = self.BORDER_WIDTH // 2
+        self.image = pygame.Surface((size + 2 * border, size + 2 * border), pygame.SRCALPHA)
+        self.rect = self.image.get_rect(topleft=(x - border, y - border))
+        self.color = color
+
+        points = [(border + size / 2, border), (border, border + size), (border + size, border + size)]
+        pygame.draw.polygon(self.image, color, points)
+        pygame.draw.polygon(self.image, self.BORDER_COLOR, points, self.BORDER_WIDTH)
+
+        # Precomputed once per shape for pixel-accurate hazard checks
+        self.mask = pygame.mask.from_surface(self.image)
+        self.image = finalize_surface(self.image)
+
+
+class Swamp(pygame.sprite.Sprite):
+    """A hazard: a pool of mud, darker towards the bottom"""
+
+    BORDER_COLOR = (101, 67, 33)
+    SURFACE_COLOR = (85, 55, 25, 77)
+
+    def __init__(self, x, y, width, height, color):
+        super().__init__()
+        self.image = pygame.Surface((width, height), pygame.SRCALPHA)
+        self.rect = pygame.Rect(x, y, width, height)
         self.color = color
 
+        # Gradient like game.js: slightly transparent at the top, solid from 60% down
+        # and fading to a darker shade at the bottom
+        dark_color = tuple(max(0, channel - 20) for channel in color)
+        for row in range(height):
+            t = row / max(1, height - 1)
+            if t < 0.6:
+                row_color = (*color, int(255 * (0.9 + 0.1 * t / 0.6)))
+            else:
+                blend = (t - 0.6) / 0.4
+                row_color = (*(int(c + (d - c) * blend) for c, d in zip(color, dark_color)), 255)
+            pygame.draw.line(self.image, row_color, (0, row), (width - 1, row))
+        pygame.draw.rect(self.image, self.BORDER_COLOR, self.image.get_rect(), 2)
+
+        # Surface texture along the top
+        texture = pygame.Surface((width, min(4, height)), pygame.SRCALPHA)
+        texture.fill(self.SURFACE_COLOR)
+        self.image.blit(texture, (0, 0))
+
+        # Precomputed once per shape for pixel-accurate hazard checks
+        self.mask = pygame.mask.from_surface(self.image)
+        self.image = finalize_surface(self.image)
+
+
+# Fonts for level texts keyed by size, shared by every Text
+text_fonts = {}
+
+
+class Text(pygame.sprite.Sprite):
+    """Level text with a white outline; (x, y) is the start of its baseline"""
+
+    OUTLINE_COLOR = (255, 255, 255)
+    OUTLINE_WIDTH = 2
+
+    def __init__(self, x, y, text, font_size, text_color):
+        super().__init__()
+        font = text_fonts.get(font_size)
+        if font is None:
+            font = pygame.font.Font(None, font_size)
+            text_fonts[font_size] = font
+
+        fill = font.render(text, True, text_color)
+        outline = font.render(text, True, self.OUTLINE_COLOR)
+        offset = self.OUTLINE_WIDTH
+        self.image = pygame.Surface((fill.get_width() + 2 * offset, fill.get_height() + 2 * offset), pygame.SRCALPHA)
+        for dx in (-offset, 0, offset):
+            for dy in (-offset, 0, offset):
+                if dx or dy:
+                    self.image.blit(outline, (offset + dx, offset + dy))
+        self.image.blit(fill, (offset, offset))
+        self.image = finalize_surface(self.image)
+        self.rect = self.image.get_rect(topleft=(x - offset, y - font.get_ascent() - offset))
+        self.text = text
+        self.color = text_color
+
+    @staticmethod
+    def get_top_offset(font_size):
+        """Height above the baseline where unicorns stand on the text (as in game.js)"""
+        return int(font_size * 0.6)
+
 
 class Rainbow(pygame.sprite.Sprite):
     def __init__(self, x, y, width, height):
@@ -651,6 +1170,7 @@ class Rainbow(pygame.sprite.Sprite):
 
         # Make rainbow semi-transparent
         self.image.set_alpha(150)
+        self.image = finalize_surface(self.image)
 
 
 class Glitter:
@@ -691,50 +1211,137 @@ class Glitter:
             )
 
 
+# Unicorn animation frames keyed by invert_colors, loaded once and shared by every Unicorn
+unicorn_frames_cache = {}
+
+
+def load_unicorn_frames(invert_colors=False):
+    """Load the unicorn sprite sheet and cut it into animation frames (cached)"""
+    if invert_colors in unicorn_frames_cache:
+        return unicorn_frames_cache[invert_colors]
+
+    # Load the sprite sheet
+    sprite_sheet = pygame.image.load("assets/sprites/kaitlyn_unicorn.png").convert_alpha()
+
+    # Extract individual frames for animation
+    # 80x48 image with 15 parts in 5x3 grid = 16x16 per frame
+    frame_width = 16
+    frame_height = 16
+    cols = 5
+    rows = 3
+
+    frames = []
+    for row in range(rows):
+        for col in range(cols):
+            frame = pygame.Surface((frame_width, frame_height), pygame.SRCALPHA)
+            frame.blit(
+                sprite_sheet,
+                (0, 0),
+                (col * frame_width, row * frame_height, frame_width, frame_height),
+            )
+
+            # Invert colors if requested
+            if invert_colors:
+                frame = invert_surface_colors(frame)
+
+            frames.append(frame)
+
+    unicorn_frames_cache[invert_colors] = frames
+    return frames
+
+
+# Scaled unicorn frames and their collision masks keyed by (invert_colors, size), shared by every Unicorn
+unicorn_sprites_cache = {}
+
+
+def load_unicorn_sprites(invert_colors, size):
+    """Return (images, masks) for unicorns of one color and size (cached)
+
+    Both map facing_right to a list with one entry per animation frame, so updates
+    and hazard checks don't scale, flip or build masks every frame.
+    """
+    key = (invert_colors, size)
+    if key not in unicorn_sprites_cache:
+        right = [pygame.transform.scale(frame, (size, size)) for frame in load_unicorn_frames(invert_colors)]
+        left = [pygame.transform.flip(image, True, False) for image in right]
+        images = {True: right, False: left}
+        masks = {facing: [pygame.mask.from_surface(image) for image in frames] for facing, frames in images.items()}
+        images = {facing: [finalize_surface(image) for image in frames] for facing, frames in images.items()}
+        unicorn_sprites_cache[key] = (images, masks)
+    return unicorn_sprites_cache[key]
+
+
+# Unicorn size and movement in pixels at 1280x720 (scaled with the render resolution)
+UNICORN_SIZE = 64
+UNICORN_SPEED = 5
+UNICORN_GRAVITY = 0.5
+UNICORN_JUMP_STRENGTH = -12
+
+# Unicorn attributes that change during play (saved and restored by get_state/set_state)
+UNICORN_STATE_ATTRIBUTES = (
+    "vel_x",
+    "vel_y",
+    "facing_right",
+    "on_ground",
+    "can_climb",
+    "jumped",
+    "current_frame",
+    "score",
+)
+
+
+def sweep_rect(moving, dx, dy, target):
+    """Swept AABB test of `moving` travelling by (dx, dy) against a static `target` rect
+
+    Returns (time, axis) for the first contact, where time is the fraction of the
+    move (0-1) and axis is "x" or "y" for the face that was hit, or None if the
+    rects don't meet along the way (or already overlap at the start).
+    """
+    if dx > 0:
+        x_entry = (target.left - moving.right) / dx
+        x_exit = (target.right - moving.left) / dx
+    elif dx < 0:
+        x_entry = (target.right - moving.left) / dx
+        x_exit = (target.left - moving.right) / dx
+    elif moving.right <= target.left or moving.left >= target.right:
+        return None
+    else:
+        x_entry, x_exit = -math.inf, math.inf
+
+    if dy > 0:
+        y_entry = (target.top - moving.bottom) / dy
+        y_exit = (target.bottom - moving.top) / dy
+    elif dy < 0:
+        y_entry = (target.bottom - moving.top) / dy
+        y_exit = (target.top - moving.bottom) / dy
+    elif moving.bottom <= target.top or moving.top >= target.bottom:
+        return None
+    else:
+        y_entry, y_exit = -math.inf, math.inf
+
+    entry = max(x_entry, y_entry)
+    if entry >= min(x_exit, y_exit) or entry < 0 or entry > 1:
+        return None
+    # On a tie (hitting a corner exactly) prefer the vertical face, so landings win
+    return entry, "x" if x_entry > y_entry else "y"
+
+
 class Unicorn(pygame.sprite.Sprite):
     def __init__(self, invert_colors=False, start_x=None):
         super().__init__()
 
-        # Load the sprite sheet
-        self.sprite_sheet = pygame.image.load("assets/sprites/kaitlyn_unicorn.png").convert_alpha()
-
-        # Extract individual frames for animation
-        # 80x48 image with 15 parts in 5x3 grid = 16x16 per frame
-        self.frame_width = 16
-        self.frame_height = 16
-        self.cols = 5
-        self.rows = 3
-
-        self.frames = []
-        for row in range(self.rows):
-            for col in range(self.cols):
-                frame = pygame.Surface(
-                    (self.frame_width, self.frame_height), pygame.SRCALPHA
-                )
-                frame.blit(
-                    self.sprite_sheet,
-                    (0, 0),
-                    (
-                        col * self.frame_width,
-                        row * self.frame_height,
-                        self.frame_width,
-                        self.frame_height,
-                    ),
-                )
-
-                # Invert colors if requested
-                if invert_colors:
-                    frame = invert_surface_colors(frame)
-
-                self.frames.append(frame)
+        # Animation frames are shared between unicorns with the same colors
+        self.frames = load_unicorn_frames(invert_colors)
 
         # Animation setup
         self.current_frame = 0
         self.animation_speed = 0.15
-        self.image = self.frames[self.current_frame]
 
         # Scale up the sprite for better visibility
-        self.image = pygame.transform.scale(self.image, (64, 64))
+        self.size = max(1, scale_pixels(UNICORN_SIZE))
+        self.images, self.masks = load_unicorn_sprites(invert_colors, self.size)
+        self.image = self.images[True][self.current_frame]
+        self.mask = self.masks[True][self.current_frame]
 
         self.rect = self.image.get_rect()
         if start_x is not None:
@@ -742,64 +1349,82 @@ class Unicorn(pygame.sprite.Sprite):
         else:
             self.rect.center = (screen_width // 2, screen_height // 2)
 
-        # Movement
-        self.speed = 5
+        # Movement (pixel values are for 1280x720 and scale with the render resolution)
+        self.speed = UNICORN_SPEED * render_scale
         self.vel_x = 0
         self.vel_y = 0
         self.facing_right = True
 
         # Physics
-        self.gravity = 0.5
-        self.jump_strength = -12
+        self.gravity = UNICORN_GRAVITY * render_scale
+        self.jump_strength = UNICORN_JUMP_STRENGTH * render_scale
         self.on_ground = False
-        self.ground_y = screen_height - percentage_to_pixels(GROUND_HEIGHT_PERCENT, screen_height)
+        self.ground_y = world_height - percentage_to_pixels(GROUND_HEIGHT_PERCENT, screen_height)
         self.can_climb = False
+        self.jumped = False  # Set for the frame a jump starts
+        self.previous_rect = None  # Where the last update() move started, for swept collisions
 
         # Score
         self.score = 0
 
-    def update(self):
+    def update(self, dt=1.0):
+        """Animate and move; dt is the time step in 60 Hz frames (2.0 for a 30 Hz tick)"""
         # Animate through frames
-        self.current_frame += self.animation_speed
+        self.current_frame += self.animation_speed * dt
         if self.current_frame >= len(self.frames):
             self.current_frame = 0
 
-        # Update image
-        self.image = self.frames[int(self.current_frame)]
-        self.image = pygame.transform.scale(self.image, (64, 64))
-
-        # Flip sprite based on movement direction
-        if not self.facing_right:
-            self.image = pygame.transform.flip(self.image, True, False)
+        # Update image (flipped based on movement direction)
+        self.image = self.images[self.facing_right][int(self.current_frame)]
+        self.mask = self.masks[self.facing_right][int(self.current_frame)]
 
         # Apply gravity
         if not self.on_ground:
-            self.vel_y += self.gravity
-
-        # Move
-        self.rect.x += self.vel_x
-        self.rect.y += self.vel_y
-
-        # Keep on screen horizontally
-        if self.rect.left < 0:
-            self.rect.left = 0
-        if self.rect.right > screen_width:
-            self.rect.right = screen_width
+            self.vel_y += self.gravity * dt
+
+        # Move (check_collisions sweeps from previous_rect so nothing is tunnelled through)
+        self.previous_rect = self.rect.copy()
+        self.rect.x += self.vel_x * dt
+        self.rect.y += self.vel_y * dt
+
+        # Keep on screen horizontally (the camera view in scrolling levels, so both unicorns stay visible)
+        left, right = (camera.rect.left, camera.rect.right) if camera is not None else (0, screen_width)
+        if self.rect.left < left:
+            self.rect.left = left
+        if self.rect.right > right:
+            self.rect.right = right
         if self.rect.top < 0:
             self.rect.top = 0
 
-    def check_collisions(self, platforms, trees=None):
+    def check_collisions(self, platforms, trees=None, texts=None):
+        """Collide with the platforms, tree tops and standable text GeometryLayers"""
         self.on_ground = False
         self.can_climb = False
 
-        # Check platform collisions
-        for platform in platforms:
-            if self.rect.colliderect(platform.rect):
+        # Broad phase: only fetch platforms and tree tops near this move (touching included)
+        area = self.rect if self.previous_rect is None else self.rect.union(self.previous_rect)
+        area = area.inflate(2, 2)
+        platform_rects = platforms.get_rects(area)
+        tree_tops = trees.get_tops(area) if trees is not None else []
+        if texts is not None:
+            # Texts that can be stood on are one-way tops, like tree tops
+            tree_tops += texts.get_tops(area)
+
+        # Sweep along the last move so fast falls can't pass through thin platforms
+        previous_bottom = None
+        if self.previous_rect is not None:
+            previous_bottom = self.previous_rect.bottom
+            self.sweep_collisions(platform_rects, tree_tops)
+            self.previous_rect = None
+
+        # Resolve anything still overlapping (e.g. a unicorn that started inside a platform)
+        for platform_rect in platform_rects:
+            if self.rect.colliderect(platform_rect):
                 # Calculate overlap amounts
-                overlap_left = self.rect.right - platform.rect.left
-                overlap_right = platform.rect.right - self.rect.left
-                overlap_top = self.rect.bottom - platform.rect.top
-                overlap_bottom = platform.rect.bottom - self.rect.top
+                overlap_left = self.rect.right - platform_rect.left
+                overlap_right = platform_rect.right - self.rect.left
+                overlap_top = self.rect.bottom - platform_rect.top
+                overlap_bottom = platform_rect.bottom - self.rect.top
 
                 # Find the smallest overlap (most likely collision direction)
                 min_overlap = min(
@@ -808,32 +1433,52 @@ class Unicorn(pygame.sprite.Sprite):
 
                 # Landing on top of platform (falling down)
                 if min_overlap == overlap_top and self.vel_y > 0:
-                    self.rect.bottom = platform.rect.top
+                    self.rect.bottom = platform_rect.top
                     self.vel_y = 0
                     self.on_ground = True
                 # Hitting platform from below (jumping up)
                 elif min_overlap == overlap_bottom and self.vel_y < 0:
-                    self.rect.top = platform.rect.bottom
+                    self.rect.top = platform_rect.bottom
                     self.vel_y = 0
                 # Hitting platform from the left (moving right)
                 elif min_overlap == overlap_left and self.vel_x > 0:
-                    self.rect.right = platform.rect.left
+                    self.rect.right = platform_rect.left
                     self.can_climb = True
                 # Hitting platform from the right (moving left)
                 elif min_overlap == overlap_right and self.vel_x < 0:
-                    self.rect.left = platform.rect.right
+                    self.rect.left = platform_rect.right
                     self.can_climb = True
 
         # Check tree collisions (top-only)
-        if trees:
-            for tree in trees:
-                # Only check collision with the top part of the tree
-                if self.rect.colliderect(tree.top_collision_rect) and self.vel_y > 0:
-                    # Landing on top of tree (falling down)
-                    # Place unicorn directly on the visual tree top
-                    self.rect.bottom = tree.visual_tree_top
-                    self.vel_y = 0
+        for top_collision_rect, visual_tree_top in tree_tops:
+            # Only check collision with the top part of the tree
+            if self.rect.colliderect(top_collision_rect) and self.vel_y > 0:
+                # Tree tops are one-way: a unicorn that was below the top (coming up
+                # through the crown or in from the side) isn't lifted onto it
+                if previous_bottom is not None and previous_bottom > visual_tree_top:
+                    continue
+                # Nor is one whose spot on the tree top is inside a platform
+                landing_rect = self.rect.copy()
+                landing_rect.bottom = visual_tree_top
+                if landing_rect.collidelist(platforms.get_rects(landing_rect)) != -1:
+                    continue
+                # Landing on top of tree (falling down)
+                # Place unicorn directly on the visual tree top
+                self.rect.bottom = visual_tree_top
+                self.vel_y = 0
+                self.on_ground = True
+
+        # Standing exactly on a platform or tree top counts as being on the ground
+        if not self.on_ground and self.vel_y >= 0:
+            for platform_rect in platform_rects:
+                if self.rect.bottom == platform_rect.top and self.overlaps_horizontally(platform_rect):
                     self.on_ground = True
+                    break
+            else:
+                for top_collision_rect, visual_tree_top in tree_tops:
+                    if self.rect.bottom == visual_tree_top and self.overlaps_horizontally(top_collision_rect):
+                        self.on_ground = True
+                        break
 
         # Check ground collision
         if self.rect.bottom >= self.ground_y:
@@ -841,8 +1486,77 @@ class Unicorn(pygame.sprite.Sprite):
             self.vel_y = 0
             self.on_ground = True
 
+    def overlaps_horizontally(self, rect):
+        """True if this unicorn and rect share some horizontal span (not just an edge)"""
+        return self.rect.left < rect.right and rect.left < self.rect.right
+
+    def sweep_collisions(self, platform_rects, tree_tops):
+        """Move from previous_rect to rect, stopping at the first platform or tree top hit
+
+        After a hit the move continues along the other axis (sliding), so landing,
+        ceiling, climbing and tree-top rules match the overlap checks.
+        """
+        moving = self.previous_rect.copy()
+        target_x, target_y = self.rect.x, self.rect.y
+
+        # Two hits (e.g. a wall, then a floor) plus the final free move
+        for _ in range(3):
+            dx = target_x - moving.x
+            dy = target_y - moving.y
+            if dx == 0 and dy == 0:
+                break
+
+            # Only test obstacles near the path of this move
+            swept_area = moving.union(moving.move(dx, dy))
+            first_hit = None
+            for platform_rect in platform_rects:
+                if swept_area.colliderect(platform_rect):
+                    hit = sweep_rect(moving, dx, dy, platform_rect)
+                    if hit and (first_hit is None or hit[0] < first_hit[0]):
+                        first_hit = (hit[0], hit[1], platform_rect.top, platform_rect)
+
+            # Tree tops are one-way: only a downward move crossing the top can land
+            if dy > 0:
+                for collision_rect, top in tree_tops:
+                    if moving.bottom <= top < moving.bottom + dy:
+                        time = (top - moving.bottom) / dy
+                        left = moving.left + dx * time
+                        if left < collision_rect.right and collision_rect.left < left + moving.width:
+                            if first_hit is None or time < first_hit[0]:
+                                first_hit = (time, "y", top, None)
+
+            if first_hit is None:
+                moving.topleft = (target_x, target_y)
+                break
+
+            time, axis, landing_y, obstacle = first_hit
+            if axis == "y":
+                # Advance sideways to the moment of impact, then stop vertically
+                moving.x = round(moving.x + dx * time)
+                if dy > 0:
+                    # Landing on top of platform or tree (falling down)
+                    moving.bottom = landing_y
+                    self.on_ground = True
+                else:
+                    # Hitting platform from below (jumping up)
+                    moving.top = obstacle.bottom
+                self.vel_y = 0
+                target_y = moving.y
+            else:
+                # Hitting the side of a platform: stop there and allow climbing
+                moving.y = round(moving.y + dy * time)
+                if dx > 0:
+                    moving.right = obstacle.left
+                else:
+                    moving.left = obstacle.right
+                self.can_climb = True
+                target_x = moving.x
+
+        self.rect.topleft = moving.topleft
+
     def handle_input(self, keys, use_wasd=False):
         self.vel_x = 0
+        self.jumped = False
 
         if use_wasd:
             # WASD controls for player 2
@@ -856,6 +1570,7 @@ class Unicorn(pygame.sprite.Sprite):
                 if self.on_ground:
                     self.vel_y = self.jump_strength
                     self.on_ground = False
+                    self.jumped = True
                 elif self.can_climb:
                     self.vel_y = -self.speed
             if keys[pygame.K_s]:
@@ -873,29 +1588,58 @@ class Unicorn(pygame.sprite.Sprite):
                 if self.on_ground:
                     self.vel_y = self.jump_strength
                     self.on_ground = False
+                    self.jumped = True
                 elif self.can_climb:
                     self.vel_y = -self.speed
             if keys[pygame.K_DOWN]:
                 if self.can_climb:
                     self.vel_y = self.speed
 
-    def collect_item(self, item):
-        """Check if unicorn can collect the item and collect it"""
-        if self.rect.colliderect(item.rect):
-            # Original unicorn (unicorn1) collects white items
-            # Inverted unicorn (unicorn2) collects black items
-            return True
-        return False
+    def get_state(self):
+        """Return a copy of everything about this unicorn that changes during play"""
+        state = {name: getattr(self, name) for name in UNICORN_STATE_ATTRIBUTES}
+        state["rect"] = self.rect.copy()
+        return state
+
+    def set_state(self, state):
+        """Restore a state returned by get_state"""
+        for name in UNICORN_STATE_ATTRIBUTES:
+            setattr(self, name, state[name])
+        self.rect = state["rect"].copy()
+        self.previous_rect = None
+
+    def touches_hazard(self, hazards, textures):
+        """True if the unicorn's visible pixels touch an object in any of the hazards GeometryLayers"""
+        return any(layer.touches_mask(self.rect, self.mask, textures) for layer in hazards)
+
+    def collect_items(self, items):
+        """Collect every item in the items GeometryLayer the unicorn touches; return how many"""
+        # Original unicorn (unicorn1) collects white items
+        # Inverted unicorn (unicorn2) collects black items
+        collected = items.collect(self.rect)
+        self.score += collected
+        return collected
 
 
 # Level management
 current_level = 1
-max_levels = get_max_levels()  # Automatically detect number of level files
+max_levels = 1  # Detected from the level files when PLAY is chosen
+
+
+def get_level_file(level=None):
+    """Return the path of the current (or given) level's file (YAML, or JSON from the level editor)"""
+    if level is None:
+        level = current_level
+    level_file = f"levels/level{level}.yml"
+    json_file = f"levels/level{level}.json"
+    if not os.path.exists(level_file) and os.path.exists(json_file):
+        return json_file
+    return level_file
 
 
-def load_current_level():
-    """Load the current level"""
-    level_file = f"levels/level{current_level}.yml"
+def load_current_level(level_file=None):
+    """Load the current level (or the given level file)"""
+    level_file = level_file or get_level_file()
     level_data = load_level(level_file)
 
     if level_data is None:
@@ -928,25 +1672,40 @@ def load_current_level():
     return level_data
 
 
-def reset_level():
-    """Reset the current level"""
-    global level_complete, glitters, unicorn1, unicorn2, platforms, trees, clouds, white_items, black_items, rainbow, all_sprites
+def reset_level(level_file=None, level_data=None, restart=False):
+    """Reset the current level (or load the given level file, or play the given level data)
+
+    restart=True starts the same level over (a hot reload), which telemetry
+    doesn't count as another play.
+    """
+    global level_complete, glitters, unicorn1, unicorn2, unicorns, level_objects, hazard_message
+    global world_width, world_height, camera, level_streamer, next_level_frame
 
     level_complete = False
+    hazard_message = None
+    next_level_frame = None
     glitters = []
 
     # Load level data
-    level_data = load_current_level()
-    level_objects = create_level_objects(level_data, screen_width, screen_height)
+    if level_data is None:
+        level_data = load_current_level(level_file)
+    world_width, world_height = get_world_size(level_data)
+    if (world_width, world_height) == (screen_width, screen_height):
+        camera = level_streamer = None
+        level_objects = create_level_objects(level_data, screen_width, screen_height)
+    else:
+        # Larger than the screen: stream the level in chunks around a camera
+        camera = Camera(screen_width, screen_height, world_width, world_height)
+        level_objects, level_streamer = create_streamed_level_objects(level_data, world_width, world_height)
 
     # Create unicorns with starting positions
     unicorn1_start = level_objects["unicorn1_start"] or (
-        screen_width // 4,
-        screen_height // 2,
+        world_width // 4,
+        world_height // 2,
     )
     unicorn2_start = level_objects["unicorn2_start"] or (
-        3 * screen_width // 4,
-        screen_height // 2,
+        3 * world_width // 4,
+        world_height // 2,
     )
 
     unicorn1 = Unicorn(invert_colors=False, start_x=unicorn1_start[0])
@@ -956,123 +1715,318 @@ def reset_level():
     unicorn1.rect.centery = unicorn1_start[1]
     unicorn2.rect.centery = unicorn2_start[1]
 
+    unicorns = pygame.sprite.Group(unicorn1, unicorn2)
+
     # Get level objects
+    bind_level_objects()
+    update_camera()
+
+    # Remember the starting state so R can restore it without rebuilding
+    capture_level_snapshot()
+
+    if memory_report is not None:
+        memory_report.record(level_file or get_level_file(), get_level_surfaces(), get_level_array_bytes())
+    if telemetry is not None:
+        if restart:
+            telemetry.attempt_started()
+        else:
+            telemetry.level_started(current_level, level_file or get_level_file())
+
+    return level_data
+
+
+def capture_level_snapshot():
+    """Save the mutable state of the level as it is right now"""
+    global level_snapshot
+    level_snapshot = {
+        "unicorn1": unicorn1.get_state(),
+        "unicorn2": unicorn2.get_state(),
+    }
+
+
+def restore_level_snapshot():
+    """Put the level back to its starting state in place (pressing R)
+
+    Platforms, trees, clouds, the rainbow and the unicorn frames are reused as they
+    are; only unicorn states, scores and collected items are restored.
+    """
+    global level_complete, glitters, hazard_message
+
+    level_complete = False
+    hazard_message = None
+    glitters = []
+    if telemetry is not None:
+        # Completion time counts from the start of the attempt
+        frame_events.append(("attempt", {}))
+
+    unicorn1.set_state(level_snapshot["unicorn1"])
+    unicorn2.set_state(level_snapshot["unicorn2"])
+
+    # Bring back collected items
+    if level_streamer is not None:
+        level_streamer.revive()
+    white_items.revive()
+    black_items.revive()
+    update_camera()
+
+
+def save_game_state():
+    """Copy everything step_game changes, so online play can roll back to this frame
+
+    Unlike the level snapshot this includes collected items, the hazard countdown
+    and the camera (the unicorns can't leave its view, so it takes part in the physics).
+    """
+    state = {
+        "unicorn1": unicorn1.get_state(),
+        "unicorn2": unicorn2.get_state(),
+        "level_complete": level_complete,
+        "hazard_message": hazard_message,
+        "hazard_frames_left": hazard_frames_left,
+        "next_level_frame": next_level_frame,
+    }
+    if level_streamer is not None:
+        state["alive"] = level_streamer.get_alive()
+        state["camera"] = camera.rect.copy()
+    else:
+        state["white_items"] = white_items.alive.copy()
+        state["black_items"] = black_items.alive.copy()
+    return state
+
+
+def load_game_state(state):
+    """Restore a state returned by save_game_state"""
+    global level_complete, hazard_message, hazard_frames_left, next_level_frame
+
+    unicorn1.set_state(state["unicorn1"])
+    unicorn2.set_state(state["unicorn2"])
+    level_complete = state["level_complete"]
+    hazard_message = state["hazard_message"]
+    hazard_frames_left = state["hazard_frames_left"]
+    next_level_frame = state["next_level_frame"]
+    if level_streamer is not None:
+        camera.rect.update(state["camera"])
+        level_streamer.set_alive(state["alive"])
+    else:
+        white_items.set_alive(state["white_items"])
+        black_items.set_alive(state["black_items"])
+
+
+def bind_level_objects():
+    """Point the level object globals at the layers in level_objects"""
+    global platforms, trees, clouds, white_items, black_items, triangles, swamps, texts, rainbow, cloud_layers
     platforms = level_objects["platforms"]
     trees = level_objects["trees"]
     clouds = level_objects["clouds"]
     white_items = level_objects["white_items"]
     black_items = level_objects["black_items"]
+    triangles = level_objects["triangles"]
+    swamps = level_objects["swamps"]
+    texts = level_objects["texts"]
     rainbow = level_objects["rainbow"]
-
-    # Create sprite groups
-    all_sprites = pygame.sprite.Group()
-    all_sprites.add(unicorn1)
-    all_sprites.add(unicorn2)
-    all_sprites.add(platforms)
-    all_sprites.add(trees)
-    all_sprites.add(clouds)
-    all_sprites.add(white_items)
-    all_sprites.add(black_items)
+    cloud_layers = level_objects["cloud_layers"]
+
+
+def update_camera():
+    """Follow the unicorns and stream in the chunks around them (scrolling levels only)"""
+    if camera is None:
+        return
+    camera.follow(unicorn1.rect, unicorn2.rect)
+    if level_streamer.update(camera.rect):
+        level_objects.update(level_streamer.layers)
+        bind_level_objects()
+
+
+def draw_level(surface):
+    """Draw the unicorns, level objects and rainbow, in that order, as seen by the camera
+
+    One-screen levels draw their clouds as drifting CloudLayers.
+    """
+    offset_x, offset_y = offset = camera.offset if camera is not None else (0, 0)
+
+    # Like game.js, the unicorns disappear once one of them has touched a hazard
+    if hazard_message is None:
+        surface.blits([(unicorn.image, unicorn.rect.move(-offset_x, -offset_y)) for unicorn in unicorns], doreturn=False)
+    textures = level_objects["textures"]
+    for key in LEVEL_OBJECT_BUILDERS:
+        if key == "clouds" and level_streamer is None:
+            for cloud_layer in cloud_layers:
+                cloud_layer.draw(surface)
+        else:
+            level_objects[key].draw(surface, textures, offset)
     if rainbow:
-        all_sprites.add(rainbow)
+        surface.blit(rainbow.image, rainbow.rect.move(-offset_x, -offset_y))
 
-    return level_data
 
+def draw_scene(surface):
+    """Draw the background, ground and level, without glitters or HUD"""
+    # Draw background
+    if background_image:
+        surface.blit(background_image, (0, 0))
+    else:
+        surface.fill((50, 150, 50))
 
-# Load initial level
-level_data = reset_level()
+    # Draw ground
+    draw_ground(surface)
 
-# Game loop
-running = True
-while running:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_ESCAPE:
-                if game_state == PLAYING:
-                    game_state = MENU  # Return to menu instead of exiting
-                else:
-                    running = False
-        
-        # Handle menu input
-        if game_state == MENU:
-            menu_result = menu_system.handle_input(event)
-            if menu_result == "PLAY":
-                game_state = PLAYING
-                # Reset to level 1 when starting game
-                current_level = 1
-                level_data = reset_level()
-            elif menu_result == "EXIT":
-                running = False
-        
-        # Handle game input
-        elif game_state == PLAYING:
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r:
-                    # Reset current level
-                    level_data = reset_level()
-                elif event.key == pygame.K_n and level_complete:
-                    # Next level
-                    if current_level < max_levels:
-                        current_level += 1
-                        level_data = reset_level()
-                    else:
-                        # All levels completed - return to menu
-                        game_state = MENU
+    draw_level(surface)
 
-    # Update and draw based on game state
-    if game_state == MENU:
-        # Update menu
-        menu_system.update()
-        
-        # Draw menu
-        menu_system.draw(screen)
-        
-    elif game_state == PLAYING:
-        if not level_complete:
-            keys = pygame.key.get_pressed()
-            unicorn1.handle_input(keys, use_wasd=False)  # Arrow keys
-            unicorn2.handle_input(keys, use_wasd=True)  # WASD
-
-            # Update sprites
-            unicorn1.update()
-            unicorn2.update()
-
-            # Check collisions
-            unicorn1.check_collisions(platforms, trees)
-            unicorn2.check_collisions(platforms, trees)
-
-            # Check item collections
-            # Unicorn1 collects white items
-            for item in white_items:
-                if unicorn1.collect_item(item):
-                    unicorn1.score += 1
-                    item.kill()
-
-            # Unicorn2 collects black items
-            for item in black_items:
-                if unicorn2.collect_item(item):
-                    unicorn2.score += 1
-                    item.kill()
-
-            # Check if both unicorns are fully inside the rainbow (not just touching border)
-            def is_fully_inside_rainbow(unicorn, rainbow):
-                if rainbow is None:
-                    return False
-                # Check if unicorn is completely within rainbow boundaries
-                return (
-                    unicorn.rect.left >= rainbow.rect.left
-                    and unicorn.rect.right <= rainbow.rect.right
-                    and unicorn.rect.top >= rainbow.rect.top
-                    and unicorn.rect.bottom <= rainbow.rect.bottom
-                )
 
-            unicorn1_in_rainbow = is_fully_inside_rainbow(unicorn1, rainbow)
-            unicorn2_in_rainbow = is_fully_inside_rainbow(unicorn2, rainbow)
+def draw_playing(surface):
+    """Draw a frame of the level being played: background, level, glitters and HUD"""
+    draw_scene(surface)
+
+    # Draw glitters
+    for glitter in glitters:
+        glitter.draw(surface)
+
+    # Draw score counters and level info
+    level_name = level_data.get("level", {}).get("name", f"Level {current_level}")
+    level_text = font.render(f"{level_name}", True, (255, 255, 255))
+    score1_text = font.render(
+        f"Player 1 (White): {unicorn1.score}", True, (255, 255, 255)
+    )
+    score2_text = font.render(
+        f"Player 2 (Black): {unicorn2.score}", True, (255, 255, 255)
+    )
+
+    surface.blit(level_text, (scale_pixels(20), scale_pixels(20)))
+    surface.blit(score1_text, (scale_pixels(20), scale_pixels(60)))
+    surface.blit(score2_text, (scale_pixels(20), scale_pixels(100)))
+
+    # Draw level complete message
+    if level_complete:
+        complete_text = font.render("LEVEL COMPLETE!", True, (255, 255, 255))
+        text_rect = complete_text.get_rect(
+            center=(screen_width // 2, screen_height // 2)
+        )
+
+        # Draw background for text
+        background_rect = text_rect.inflate(scale_pixels(40), scale_pixels(20))
+        pygame.draw.rect(surface, (0, 0, 0, 128), background_rect)
+        pygame.draw.rect(surface, (255, 255, 255), background_rect, 3)
 
-            if unicorn1_in_rainbow and unicorn2_in_rainbow:
-                level_complete = True
+        surface.blit(complete_text, text_rect)
+
+        # Draw instructions
+        if current_level < max_levels:
+            instruction_text = font.render(
+                "Press N for next level or ESC for menu", True, (255, 255, 255)
+            )
+        else:
+            instruction_text = font.render(
+                "All levels completed! Press ESC for menu", True, (255, 255, 255)
+            )
+        instruction_rect = instruction_text.get_rect(
+            center=(screen_width // 2, screen_height // 2 + scale_pixels(50))
+        )
+        surface.blit(instruction_text, instruction_rect)
+
+        # Draw reset instruction
+        reset_text = font.render("Press R to reset level", True, (255, 255, 255))
+        reset_rect = reset_text.get_rect(
+            center=(screen_width // 2, screen_height // 2 + scale_pixels(90))
+        )
+        surface.blit(reset_text, reset_rect)
+
+    # Draw the hazard message until the level restarts
+    if hazard_message is not None:
+        ouch_text = title_font.render("OUCH!", True, (255, 0, 0))
+        message_text = font.render(hazard_message, True, (255, 255, 255))
+        restart_text = font.render("Restarting level... Press R to restart now", True, (255, 255, 255))
+        ouch_rect = ouch_text.get_rect(center=(screen_width // 2, screen_height // 2 - scale_pixels(50)))
+        message_rect = message_text.get_rect(center=(screen_width // 2, screen_height // 2 + scale_pixels(20)))
+        restart_rect = restart_text.get_rect(center=(screen_width // 2, screen_height // 2 + scale_pixels(70)))
+
+        # Draw background for text
+        background_rect = ouch_rect.union(message_rect).union(restart_rect).inflate(scale_pixels(40), scale_pixels(20))
+        pygame.draw.rect(surface, (0, 0, 0), background_rect)
+        pygame.draw.rect(surface, (255, 255, 255), background_rect, 3)
+
+        surface.blit(ouch_text, ouch_rect)
+        surface.blit(message_text, message_rect)
+        surface.blit(restart_text, restart_rect)
+
+
+def check_hazards():
+    """Check both unicorns against triangles and swamps; return the player (1 or 2) who touched them, or 0
+
+    Starts the countdown after which the level restarts, like game.js does.
+    """
+    global hazard_message, hazard_frames_left
+
+    textures = level_objects["textures"]
+    for player, unicorn in ((1, unicorn1), (2, unicorn2)):
+        if unicorn.touches_hazard((triangles, swamps), textures):
+            hazard_message = f"Player {player} touched a hazard!"
+            hazard_frames_left = HAZARD_RESTART_FRAMES
+            return player
+    return 0
+
+
+def step_game(keys1, keys2, effects=True):
+    """Advance play by one frame: unicorn 1 reads keys1 (arrows), unicorn 2 keys2 (WASD)
+
+    Only changes what save_game_state copies, so netplay can roll it back and
+    run it again; effects=False then skips the sounds and the glitter burst.
+    """
+    global level_complete, hazard_frames_left
+
+    if hazard_message is not None:
+        # A unicorn touched a hazard: restart the level when the countdown ends
+        hazard_frames_left -= 1
+        if hazard_frames_left <= 0:
+            restore_level_snapshot()
+    elif not level_complete:
+        unicorn1.handle_input(keys1, use_wasd=False)  # Arrow keys
+        unicorn2.handle_input(keys2, use_wasd=True)  # WASD
+        if effects and (unicorn1.jumped or unicorn2.jumped):
+            audio.play_sound("jump")
+
+        # Update sprites
+        unicorn1.update()
+        unicorn2.update()
+
+        # Check collisions
+        unicorn1.check_collisions(platforms, trees, texts)
+        unicorn2.check_collisions(platforms, trees, texts)
+
+        # Check item collections
+        # Unicorn1 collects white items, unicorn2 collects black items
+        collected1 = unicorn1.collect_items(white_items)
+        collected2 = unicorn2.collect_items(black_items)
+        if effects and (collected1 or collected2):
+            audio.play_sound("pickup")
+        if telemetry is not None:
+            for player, count in ((1, collected1), (2, collected2)):
+                if count:
+                    frame_events.append(("item", {"player": player, "count": count}))
+
+        # Touching a triangle or swamp ends the attempt
+        touched_hazard = check_hazards()
+        if touched_hazard and telemetry is not None:
+            frame_events.append(("death", {"player": touched_hazard}))
+
+        # Check if both unicorns are fully inside the rainbow (not just touching border)
+        def is_fully_inside_rainbow(unicorn, rainbow):
+            if rainbow is None:
+                return False
+            # Check if unicorn is completely within rainbow boundaries
+            return (
+                unicorn.rect.left >= rainbow.rect.left
+                and unicorn.rect.right <= rainbow.rect.right
+                and unicorn.rect.top >= rainbow.rect.top
+                and unicorn.rect.bottom <= rainbow.rect.bottom
+            )
+
+        unicorn1_in_rainbow = is_fully_inside_rainbow(unicorn1, rainbow)
+        unicorn2_in_rainbow = is_fully_inside_rainbow(unicorn2, rainbow)
+
+        if unicorn1_in_rainbow and unicorn2_in_rainbow and not touched_hazard:
+            level_complete = True
+            if telemetry is not None:
+                frame_events.append(("complete", {}))
+            if effects:
+                audio.play_sound("level_complete")
                 # Create initial burst of glitters
                 for _ in range(100):
                     glitters.append(
@@ -1082,84 +2036,621 @@ while running:
                         )
                     )
 
-        # Update glitters
-        glitters = [g for g in glitters if g.update()]
+    # Scroll to the unicorns' new positions
+    update_camera()
 
-        # Add more glitters during level complete
-        if level_complete and len(glitters) < 200:
-            for _ in range(5):
-                glitters.append(
-                    Glitter(
-                        random.randint(0, screen_width), random.randint(0, screen_height)
-                    )
-                )
 
-        # Draw background
-        if background_image:
-            screen.blit(background_image, (0, 0))
-        else:
-            screen.fill((50, 150, 50))
-        
-        # Draw ground
-        draw_ground(screen)
-        
-        all_sprites.draw(screen)
+def hot_reload_level():
+    """Re-read the current level file and rebuild only the objects that changed
 
-        # Draw glitters
-        for glitter in glitters:
-            glitter.draw(screen)
+    Unicorn positions, scores and collected items are kept. Returns the new level
+    data, or the old one if the file could not be parsed (e.g. half-written).
+    """
+    new_level_data = load_level(get_level_file())
+    if new_level_data is None:
+        return level_data
 
-        # Draw score counters and level info
-        level_name = level_data.get("level", {}).get("name", f"Level {current_level}")
-        level_text = font.render(f"{level_name}", True, (255, 255, 255))
-        score1_text = font.render(
-            f"Player 1 (White): {unicorn1.score}", True, (255, 255, 255)
-        )
-        score2_text = font.render(
-            f"Player 2 (Black): {unicorn2.score}", True, (255, 255, 255)
+    # Reload the background only if it changed
+    old_background = (level_data.get("background") or {}).get("image")
+    new_background = (new_level_data.get("background") or {}).get("image")
+    if new_background != old_background:
+        load_background_image(new_background)
+
+    if get_world_size(new_level_data) != (world_width, world_height):
+        # Every position depends on the world size, so start the level over
+        print(f"Reloaded {get_level_file()}: world size changed, restarting the level")
+        return reset_level(restart=True)
+
+    if level_streamer is None:
+        rebuilt = update_level_objects(level_objects, new_level_data, screen_width, screen_height)
+        # Free the looks of edited and removed objects (the streamer frees its own)
+        level_objects["textures"].discard(
+            {int(index) for key in LEVEL_OBJECT_BUILDERS for index in level_objects[key].texture}
         )
+    else:
+        # The rainbow is diffed as usual; the streamer rebuilds the loaded chunks
+        other_data = {key: value for key, value in new_level_data.items() if key not in LEVEL_OBJECT_BUILDERS}
+        rebuilt = update_level_objects(level_objects, other_data, world_width, world_height)
+        rebuilt += level_streamer.reload(new_level_data, camera.rect)
+        level_objects.update(level_streamer.layers)
+    bind_level_objects()
+
+    # Pressing R should use the edited start positions
+    unicorns_data = new_level_data.get("unicorns") or {}
+    default_starts = {
+        "unicorn1": (world_width // 4, world_height // 2),
+        "unicorn2": (3 * world_width // 4, world_height // 2),
+    }
+    for name, default_start in default_starts.items():
+        if name in unicorns_data:
+            start = get_unicorn_start(unicorns_data[name], world_width, world_height)
+        else:
+            start = default_start
+        level_snapshot[name]["rect"].center = start
+
+    print(f"Reloaded {get_level_file()}: {rebuilt} objects rebuilt")
+    if memory_report is not None:
+        memory_report.record(f"{get_level_file()} (reloaded)", get_level_surfaces(), get_level_array_bytes())
+    return new_level_data
+
+
+def get_level_surfaces():
+    """Surfaces held by the loaded level, grouped by object type (for memory reports)"""
+    from memory_diagnostics import SURFACE_CATEGORIES
+
+    surfaces = {category: [] for category in SURFACE_CATEGORIES}
+    for prototype in level_objects["textures"].textures:
+        if prototype is not None:  # None for textures freed by the level streamer
+            surfaces[type(prototype).__name__.lower()].append(prototype.image)
+    surfaces["cloud"].extend(cloud_layer.strip for cloud_layer in cloud_layers)
+    if rainbow is not None:
+        surfaces["rainbow"].append(rainbow.image)
+    if background_image is not None:
+        surfaces["background"].append(background_image)
+    for frames in unicorn_frames_cache.values():
+        surfaces["unicorn frames"].extend(frames)
+    for images, _ in unicorn_sprites_cache.values():
+        for frames in images.values():
+            surfaces["unicorn frames"].extend(frames)
+    return surfaces
+
+
+def get_level_array_bytes():
+    """Bytes used by the loaded level's geometry arrays"""
+    return sum(level_objects[key].nbytes for key in LEVEL_OBJECT_BUILDERS)
+
+
+# Level state (set up by reset_level() once PLAY is chosen)
+level_data = None
+level_objects = None
+level_snapshot = None
+level_complete = False
+glitters = []
+
+# Set when a unicorn touches a triangle or swamp; the level restarts after HAZARD_RESTART_FRAMES
+hazard_message = None
+hazard_frames_left = 0
+HAZARD_RESTART_FRAMES = 120  # 2 seconds at 60 FPS, as in game.js
+
+# Screenshots (F12), recording and instant replay (F10)
+frame_capture = None
+
+# Online co-op (--host/--join): the rollback session, R/N presses not sent yet, and
+# the frame in which N was pressed on a completed level (loaded once it is confirmed)
+net_session = None
+net_presses = 0
+next_level_frame = None
+
+# Audio and level watcher (created by main())
+audio = None
+level_watcher = None
+
+# Memory report printed after every level load (set by --memory-report)
+memory_report = None
+
+# Gameplay stats written in the background (set by --telemetry)
+telemetry = None
+# Default --telemetry-dir, the folder telemetry.py summarizes by default (the
+# telemetry module itself is only imported when recording)
+TELEMETRY_DIR = "telemetry"
+# Telemetry events of the frame being simulated, recorded once the frame can't change any more
+frame_events = []
+# Online: the events of every simulated frame that isn't confirmed yet, by frame
+net_frame_events = {}
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Lily's Unicorns")
+    parser.add_argument(
+        "--exit-after-first-frame",
+        action="store_true",
+        help="quit right after the first menu frame is shown (used by benchmarks/startup.py)",
+    )
+    parser.add_argument(
+        "--render-scale",
+        type=float,
+        default=1.0,
+        help="internal render resolution as a fraction of 1280x720 (e.g. 0.5 renders at 640x360)",
+    )
+    parser.add_argument("--fullscreen", action="store_true", help="run fullscreen at the monitor's resolution")
+    parser.add_argument(
+        "--present",
+        choices=PRESENT_MODES,
+        default="scaled",
+        help="how the framebuffer reaches the window: SDL scaling (scaled) or one transform.scale blit (blit)",
+    )
+    parser.add_argument(
+        "--pacing",
+        choices=PACING_MODES,
+        help="frame pacing: sleep (default), vsync, hybrid sleep/spin, or uncapped (default with --benchmark)",
+    )
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="FRAMES",
+        help="play a level with scripted input for FRAMES frames, then print FPS and frame-time percentiles",
+    )
+    parser.add_argument("--benchmark-level", type=int, default=1, help="level used by --benchmark (default: 1)")
+    parser.add_argument(
+        "--input-latency",
+        action="store_true",
+        help="time every key event until the frame using it is shown, and print the latency percentiles on exit",
+    )
+    parser.add_argument(
+        "--late-input",
+        action="store_true",
+        help="sample input just before the next refresh instead of right after the last one (for --pacing vsync)",
+    )
+    parser.add_argument(
+        "--memory-report",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="TOP_N",
+        help="after every level load, print surface memory by object type and the TOP_N (default 10) "
+        "largest Python allocation changes",
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="record gameplay to the capture folder (written in the background while playing)",
+    )
+    parser.add_argument(
+        "--replay",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help="keep the last SECONDS of play in memory; F10 saves them (instant replay)",
+    )
+    parser.add_argument(
+        "--telemetry",
+        action="store_true",
+        help="record per-level stats (completion times, resets, items, deaths) to compressed files "
+        "summarized by telemetry.py",
+    )
+    parser.add_argument("--telemetry-dir", default=TELEMETRY_DIR, help=f"folder for telemetry files (default: {TELEMETRY_DIR})")
+    parser.add_argument("--capture-dir", default=CAPTURE_DIR, help=f"folder for screenshots and recordings (default: {CAPTURE_DIR})")
+    parser.add_argument("--capture-fps", type=int, default=30, help="frame rate of recordings and replays (default: 30)")
+    parser.add_argument(
+        "--capture-scale",
+        type=float,
+        default=0.5,
+        help="size of recorded frames relative to the render resolution (default: 0.5)",
+    )
+    parser.add_argument(
+        "--capture-format",
+        choices=CAPTURE_FORMATS,
+        default="png",
+        help="recordings and replays as PNG sequences or raw RGB24 video for ffmpeg (default: png)",
+    )
+    online = parser.add_mutually_exclusive_group()
+    online.add_argument(
+        "--host",
+        type=int,
+        nargs="?",
+        const=DEFAULT_PORT,
+        metavar="PORT",
+        help=f"play online: wait for player 2 on this UDP port (default {DEFAULT_PORT}) and play player 1",
+    )
+    online.add_argument(
+        "--join",
+        type=parse_address,
+        metavar="HOST[:PORT]",
+        help="play online as player 2 with the player hosting at HOST",
+    )
+    parser.add_argument(
+        "--net-delay",
+        type=int,
+        default=DEFAULT_INPUT_DELAY,
+        metavar="FRAMES",
+        help=f"online: frames local input is delayed by, trading rollbacks for lag (default: {DEFAULT_INPUT_DELAY})",
+    )
+    parser.add_argument("--net-latency", type=float, default=0.0, metavar="MS", help="online: add this delay to sent packets")
+    parser.add_argument("--net-jitter", type=float, default=0.0, metavar="MS", help="online: vary the added delay by up to +-MS")
+    parser.add_argument("--net-loss", type=float, default=0.0, metavar="FRACTION", help="online: drop this fraction of sent packets")
+    args = parser.parse_args(argv)
+    if args.render_scale <= 0:
+        parser.error("--render-scale must be positive")
+    if args.benchmark is not None and args.benchmark <= 0:
+        parser.error("--benchmark needs a positive number of frames")
+    if args.record and args.replay:
+        parser.error("--replay is not needed with --record, which saves every frame")
+    if args.replay < 0 or args.capture_fps <= 0 or args.capture_scale <= 0:
+        parser.error("--replay, --capture-fps and --capture-scale must be positive")
+    if args.benchmark and (args.host is not None or args.join is not None):
+        parser.error("--benchmark can't be combined with --host or --join")
+    if args.net_delay < 0 or not 0 <= args.net_loss < 1:
+        parser.error("--net-delay must be 0 or more and --net-loss between 0 and 1")
+    if args.pacing is None:
+        args.pacing = "uncapped" if args.benchmark else "sleep"
+    if args.late_input and args.pacing == "uncapped":
+        parser.error("--late-input needs a frame rate to aim for; use it with --pacing vsync, sleep or hybrid")
+    return args
+
+
+def parse_address(text):
+    """(host, port) from "host:port", or just "host" for the default port"""
+    host, _, port = text.rpartition(":")
+    if not host:
+        return text, DEFAULT_PORT
+    return host, int(port)
+
+
+class ScriptedKeys:
+    """Stand-in for pygame.key.get_pressed() holding a fixed set of pressed keys"""
+
+    def __init__(self, pressed):
+        self.pressed = pressed
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+def get_benchmark_keys(frame):
+    """Scripted input for --benchmark: both unicorns run, jump and climb in a fixed cycle"""
+    phase = (frame // 60) % 4
+    if phase == 0:
+        return ScriptedKeys({pygame.K_RIGHT, pygame.K_a})
+    if phase == 1:
+        return ScriptedKeys({pygame.K_RIGHT, pygame.K_UP, pygame.K_a, pygame.K_w})
+    if phase == 2:
+        return ScriptedKeys({pygame.K_LEFT, pygame.K_d})
+    return ScriptedKeys({pygame.K_LEFT, pygame.K_UP, pygame.K_d, pygame.K_w})
+
+
+def get_input_keys(bits, use_wasd=False):
+    """ScriptedKeys holding the keys (arrows, or WASD) one player's netplay input bits stand for"""
+    keys = WASD_KEYS if use_wasd else ARROW_KEYS
+    return ScriptedKeys({key for key, bit in zip(keys, DIRECTION_INPUTS) if bits & bit})
+
+
+def get_levels_checksum():
+    """CRC-32 of every level file, so online players can check they have the same levels"""
+    checksum = 0
+    for level in get_level_numbers():
+        with open(get_level_file(level), "rb") as f:
+            checksum = zlib.crc32(f.read(), checksum)
+    return checksum
+
+
+def record_frame_events(events):
+    """Pass the telemetry events of a simulated frame on to telemetry, and clear the list"""
+    for event, fields in events:
+        if event == "complete":
+            telemetry.level_completed()
+        elif event == "attempt":
+            telemetry.attempt_started()
+        else:
+            telemetry.record(event, **fields)
+    events.clear()
+
+
+def step_netplay_frame(frame, inputs, resimulating=False):
+    """Advance an online game by one frame of both players' input bits (see netplay.py)"""
+    global next_level_frame
+
+    frame_events.clear()
+    pressed = inputs[0] | inputs[1]
+    if pressed & INPUT_RESET:
+        restore_level_snapshot()
+        if telemetry is not None:
+            frame_events.append(("reset", {}))
+    elif pressed & INPUT_NEXT and level_complete and next_level_frame is None:
+        if get_next_level(current_level) is not None:
+            # Loaded by advance_netplay once this frame can't be rolled back any more
+            next_level_frame = frame
+    step_game(get_input_keys(inputs[0]), get_input_keys(inputs[1], use_wasd=True), effects=not resimulating)
+    if telemetry is not None:
+        # Replaces the events of an earlier simulation of this frame with mispredicted input
+        net_frame_events[frame] = frame_events.copy()
+
+
+def start_netplay(args):
+    """Host or join an online game, showing a waiting screen until the other player is there
+
+    Returns False if it was cancelled (ESC) or failed.
+    """
+    global net_session, game_state, current_level, max_levels, level_data
+    # Deferred import: the networking code is only needed for online play
+    from netplay import LinkSimulator, Peer, RollbackSession
+
+    simulator = None
+    if args.net_latency or args.net_jitter or args.net_loss:
+        simulator = LinkSimulator(args.net_latency, args.net_jitter, args.net_loss)
+    # Both players must simulate exactly the same levels at the same scale
+    settings = {"render_scale": render_scale, "levels": get_levels_checksum()}
+    try:
+        if args.host is not None:
+            peer = Peer.host(args.host, dict(settings, level=1), simulator)
+            message = f"Waiting for player 2 on port {args.host}..."
+        else:
+            peer = Peer.join(args.join, settings, simulator)
+            message = f"Joining {args.join[0]}:{args.join[1]}..."
+    except OSError as e:
+        print(f"Could not start online play: {e}")
+        return False
 
-        screen.blit(level_text, (20, 20))
-        screen.blit(score1_text, (20, 60))
-        screen.blit(score2_text, (20, 100))
+    print(message)
+    while not peer.handshake():
+        if peer.rejected is not None:
+            print(f"Could not join: {peer.rejected}")
+            peer.close()
+            return False
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                peer.close()
+                return False
+        draw_loading_screen(screen, message)
+        pygame.time.wait(10)
 
-        # Draw level complete message
-        if level_complete:
-            complete_text = font.render("LEVEL COMPLETE!", True, (255, 255, 255))
-            text_rect = complete_text.get_rect(
-                center=(screen_width // 2, screen_height // 2)
-            )
+    local_player = 0 if args.host is not None else 1
+    print(f"Connected, you are player {local_player + 1}")
+    net_session = RollbackSession(peer, local_player, save_game_state, load_game_state, step_netplay_frame, args.net_delay)
 
-            # Draw background for text
-            background_rect = text_rect.inflate(40, 20)
-            pygame.draw.rect(screen, (0, 0, 0, 128), background_rect)
-            pygame.draw.rect(screen, (255, 255, 255), background_rect, 3)
+    game_state = PLAYING
+    current_level = peer.settings["level"] if local_player == 0 else peer.remote_settings["level"]
+    max_levels = get_max_levels()
+    draw_loading_screen(screen)
+    level_data = reset_level()
+    return True
 
-            screen.blit(complete_text, text_rect)
 
-            # Draw instructions
-            if current_level < max_levels:
-                instruction_text = font.render(
-                    "Press N for next level or ESC for menu", True, (255, 255, 255)
-                )
+def advance_netplay():
+    """Play the next online frame; return False once the other player is gone
+
+    The next level is loaded when the frame N was pressed in is confirmed, which
+    both players reach with the same inputs, and the frames since are played again.
+    """
+    global net_presses, current_level, level_data
+
+    if net_session.peer.closed or net_session.peer.timed_out:
+        print("The other player left" if net_session.peer.closed else "Lost the connection to the other player")
+        return False
+
+    if net_session.advance(read_input(pygame.key.get_pressed()) | net_presses):
+        net_presses = 0
+
+    if telemetry is not None:
+        # Record the frames simulated with both players' real input. Frames after
+        # a pending level change are played again on the next level.
+        last_frame = net_session.confirmed_frame
+        if next_level_frame is not None:
+            last_frame = min(last_frame, next_level_frame)
+        for frame in sorted(frame for frame in net_frame_events if frame <= last_frame):
+            record_frame_events(net_frame_events.pop(frame))
+
+    if next_level_frame is not None and net_session.confirmed_frame >= next_level_frame:
+        restart_frame = next_level_frame + 1
+        current_level = get_next_level(current_level)
+        draw_loading_screen(screen)
+        level_data = reset_level()
+        net_session.restart(restart_frame)
+    return True
+
+
+def draw_netplay_status(surface):
+    """Show the online player number, ping and rollbacks in the top-right corner"""
+    status_text = font.render(net_session.describe(), True, (255, 255, 255))
+    surface.blit(status_text, status_text.get_rect(topright=(screen_width - scale_pixels(20), scale_pixels(20))))
+
+
+def main(argv=None):
+    """Run the game"""
+    global game_state, current_level, max_levels, level_data, glitters
+    global menu_system, audio, level_watcher, memory_report, net_presses, frame_capture, telemetry
+
+    args = parse_args(argv)
+    if args.memory_report is not None:
+        # Deferred import: memory tracing is only set up when asked for
+        from memory_diagnostics import MemoryReport
+
+        memory_report = MemoryReport(args.memory_report)
+    if args.telemetry:
+        # Deferred import: the writer thread and its modules are only needed when recording
+        from telemetry import Telemetry
+
+        telemetry = Telemetry(args.telemetry_dir)
+
+    # Only what the menu needs is set up before the first frame
+    init_display(args.render_scale, args.fullscreen, args.present, vsync=args.pacing == "vsync")
+    menu_system = MenuSystem()
+    audio = AudioSystem()
+    level_watcher = LevelWatcher("levels")
+    pacer = FramePacer(args.pacing, 60, record=args.benchmark is not None)
+    input_latency = InputLatency(60, late=args.late_input, record=args.input_latency)
+    frame_capture = FrameCapture(
+        screen, args.capture_dir, args.capture_fps, args.capture_scale, args.capture_format, args.record, args.replay,
+    )
+    if frame_capture.slots:
+        width, height = frame_capture.size
+        print(f"Capture buffer: {len(frame_capture.slots)} frames of {width}x{height} "
+              f"({frame_capture.memory_bytes / (1024 * 1024):.0f} MB)")
+
+    first_frame = True
+    frame_count = 0
+
+    if args.benchmark:
+        # Skip the menu and play the benchmark level with reproducible clouds and glitter
+        random.seed(0)
+        game_state = PLAYING
+        current_level = args.benchmark_level
+        max_levels = get_max_levels()
+        level_data = reset_level()
+        pacer.reset()
+
+    # Game loop
+    running = True
+    if args.host is not None or args.join is not None:
+        # Skip the menu and play online from the host's first level
+        running = start_netplay(args)
+        # Local input is simulated net_delay frames after it is sampled
+        input_latency.effect_delay = args.net_delay
+        pacer.reset()
+    while running:
+        for event in input_latency.poll():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_F12:
+                    frame_capture.save_screenshot(screen)
+                elif event.key == pygame.K_F10:
+                    if args.replay:
+                        replay_path = frame_capture.save_replay()
+                        if replay_path is None:
+                            print("No replay saved: nothing captured yet, or the last replay is still being written")
+                        else:
+                            print(f"Saving replay to {replay_path}")
+                    else:
+                        print("Start the game with --replay SECONDS to save instant replays")
+                elif event.key == pygame.K_ESCAPE:
+                    if game_state == PLAYING and net_session is None:
+                        game_state = MENU  # Return to menu instead of exiting
+                    else:
+                        running = False
+            
+            # Handle menu input
+            if game_state == MENU:
+                menu_result = menu_system.handle_input(event)
+                if menu_result == "PLAY":
+                    game_state = PLAYING
+                    # Reset to level 1 when starting game
+                    current_level = 1
+                    max_levels = get_max_levels()  # Automatically detect number of level files
+                    draw_loading_screen(screen)
+                    level_data = reset_level()
+                    # Watch the levels folder so edits show up in the running game
+                    level_watcher.start()
+                elif menu_result == "EXIT":
+                    running = False
+            
+            # Handle game input
+            elif game_state == PLAYING:
+                if event.type == pygame.KEYDOWN:
+                    if net_session is not None:
+                        # Sent with the next online frame, so both players apply them in the same frame
+                        if event.key == pygame.K_r:
+                            net_presses |= INPUT_RESET
+                        elif event.key == pygame.K_n:
+                            net_presses |= INPUT_NEXT
+                    elif event.key == pygame.K_r:
+                        # Reset current level
+                        restore_level_snapshot()
+                        if telemetry is not None:
+                            frame_events.append(("reset", {}))
+                    elif event.key == pygame.K_n and level_complete:
+                        # Next level
+                        next_level = get_next_level(current_level)
+                        if next_level is not None:
+                            current_level = next_level
+                            level_data = reset_level()
+                        else:
+                            # All levels completed - return to menu
+                            game_state = MENU
+
+        # Hot-reload the current level when its file changes on disk
+        changed_files = {os.path.normpath(path) for path in level_watcher.get_changes()}
+        if game_state == PLAYING and os.path.normpath(get_level_file()) in changed_files:
+            level_data = hot_reload_level()
+
+        # Update and draw based on game state
+        if game_state == MENU:
+            # Update menu
+            menu_system.update()
+            
+            # Draw menu
+            menu_system.draw(screen)
+            
+        elif game_state == PLAYING:
+            if net_session is not None:
+                if not advance_netplay():
+                    running = False
             else:
-                instruction_text = font.render(
-                    "All levels completed! Press ESC for menu", True, (255, 255, 255)
-                )
-            instruction_rect = instruction_text.get_rect(
-                center=(screen_width // 2, screen_height // 2 + 50)
-            )
-            screen.blit(instruction_text, instruction_rect)
+                if args.benchmark:
+                    keys = get_benchmark_keys(frame_count)
+                else:
+                    keys = pygame.key.get_pressed()
+                step_game(keys, keys)
+                if telemetry is not None:
+                    record_frame_events(frame_events)
 
-            # Draw reset instruction
-            reset_text = font.render("Press R to reset level", True, (255, 255, 255))
-            reset_rect = reset_text.get_rect(
-                center=(screen_width // 2, screen_height // 2 + 90)
-            )
-            screen.blit(reset_text, reset_rect)
+            # Drift the clouds
+            for cloud_layer in cloud_layers:
+                cloud_layer.update()
+
+            # Update glitters
+            glitters = [g for g in glitters if g.update()]
+
+            # Add more glitters during level complete
+            if level_complete and len(glitters) < 200:
+                for _ in range(5):
+                    glitters.append(
+                        Glitter(
+                            random.randint(0, screen_width), random.randint(0, screen_height)
+                        )
+                    )
+
+            draw_playing(screen)
+            if net_session is not None:
+                draw_netplay_status(screen)
+
+        input_latency.frame_ready()
+        present_frame()
+        input_latency.frame_presented()
+        frame_capture.capture(screen)
+
+        if first_frame:
+            first_frame = False
+            if args.exit_after_first_frame:
+                # Marker read by benchmarks/startup.py
+                print("first frame presented", flush=True)
+                running = False
+            elif not args.benchmark:
+                # Start audio now that the menu is visible; it loads on its own thread
+                audio.start()
+
+        pacer.wait()
+        frame_count += 1
+        if args.benchmark and frame_count >= args.benchmark:
+            running = False
+
+    if args.benchmark:
+        pacer.print_report(f"Benchmark level {current_level}")
+    if args.input_latency:
+        input_latency.print_report()
+
+    if net_session is not None:
+        net_session.peer.close()
+    frame_capture.stop()
+    if telemetry is not None:
+        telemetry.stop()
+    level_watcher.stop()
+    audio.stop()
+    pygame.quit()
 
-    pygame.display.flip()
-    clock.tick(60)
 
-pygame.quit()
-sys.exit()
+if __name__ == "__main__":
+    main()
+    sys.exit()
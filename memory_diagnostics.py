@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Memory diagnostics for Lily Unicorns
+`python main.py --memory-report` prints, after every level load, the bytes held by
+surfaces grouped by object type and the top tracemalloc changes since the previous
+load. Running this file cycles through every level and checks that memory returns
+to its baseline afterwards.
+
+Surface pixels are allocated by SDL, outside Python's allocator, so tracemalloc
+doesn't see them; they are counted from the surfaces the level holds instead.
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from pathlib import Path
+
+# Surface groups in the report, in order
+SURFACE_CATEGORIES = (
+    "cloud", "tree", "platform", "item", "triangle", "swamp", "text", "rainbow", "background", "unicorn frames",
+)
+
+# Allocations by tracemalloc itself and the import system are noise in a diff
+SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def surface_bytes(surface):
+    """Bytes of pixel memory held by a surface"""
+    return surface.get_pitch() * surface.get_height()
+
+
+def get_rss_bytes():
+    """Resident memory of this process, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def format_bytes(count):
+    """Human-readable size (signed, so it also works for differences)"""
+    if abs(count) >= 1024 * 1024:
+        return f"{count / (1024 * 1024):.2f} MB"
+    return f"{count / 1024:.1f} KB"
+
+
+class MemoryReport:
+    """Surface memory by type and a tracemalloc top-N diff for each level load"""
+
+    def __init__(self, top_n=10, verbose=True):
+        self.top_n = top_n
+        self.verbose = verbose
+        self.snapshot = None
+        # (label, surface bytes, traced bytes) for every recorded load
+        self.history = []
+
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+
+    def record(self, label, surfaces, array_bytes=0):
+        """Record a level load; surfaces maps each category to the surfaces it holds"""
+        gc.collect()
+        previous_snapshot = self.snapshot
+        self.snapshot = tracemalloc.take_snapshot().filter_traces(SNAPSHOT_FILTERS)
+        traced, _ = tracemalloc.get_traced_memory()
+
+        totals = {category: (len(group), sum(surface_bytes(s) for s in group)) for category, group in surfaces.items()}
+        surface_total = sum(size for _, size in totals.values())
+        self.history.append((label, surface_total, traced))
+        if not self.verbose:
+            return
+
+        print(f"Memory after loading {label}:")
+        for category, (count, size) in totals.items():
+            print(f"  {category:<16}{count:>5} surfaces {format_bytes(size):>11}")
+        print(f"  {'surfaces total':<16}{sum(count for count, _ in totals.values()):>5} surfaces {format_bytes(surface_total):>11}")
+        print(f"  {'geometry arrays':<31}{format_bytes(array_bytes):>11}")
+        print(f"  {'Python heap':<31}{format_bytes(traced):>11}")
+        rss = get_rss_bytes()
+        if rss is not None:
+            print(f"  {'process RSS':<31}{format_bytes(rss):>11}")
+
+        if previous_snapshot is not None:
+            print(f"  Top {self.top_n} Python allocation changes since the previous load:")
+            self.print_diff(previous_snapshot)
+
+    def print_diff(self, since):
+        """Print the top_n allocation sites that grew or shrank most since the snapshot `since`"""
+        for stat in self.snapshot.compare_to(since, "lineno")[:self.top_n]:
+            print(f"    {stat}")
+
+    def stop(self):
+        """Stop tracing if this report started it (tracing slows every allocation)"""
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+
+def check_for_leaks(level_files, cycles=1, tolerance=256 * 1024, top_n=10, verbose=False):
+    """Cycle through every level (loading it, then resetting it with R) and check for leaks
+
+    A first pass warms up caches (fonts, unicorn frames); memory after it is the
+    baseline. After `cycles` more passes, surface memory must be back to exactly
+    the baseline and the Python heap within `tolerance` bytes of it. Needs the
+    display to be initialized. Returns True if no leak was found.
+    """
+    import main as game
+
+    def cycle():
+        for level_file in level_files:
+            game.level_data = game.reset_level(level_file)
+            game.restore_level_snapshot()
+
+    previous_report = game.memory_report
+    game.memory_report = None
+    # Warm up without tracing: tracemalloc makes every allocation several times slower
+    cycle()
+
+    report = MemoryReport(top_n, verbose)
+    game.memory_report = report
+    try:
+        report.record("baseline", game.get_level_surfaces(), game.get_level_array_bytes())
+        _, baseline_surfaces, baseline_traced = report.history[-1]
+        baseline_snapshot = report.snapshot
+        baseline_rss = get_rss_bytes()
+
+        for _ in range(cycles):
+            cycle()
+        # Measured like the baseline, after reset_level has returned (while it runs,
+        # the previous level's data is still referenced)
+        report.record(f"after {cycles} cycle(s)", game.get_level_surfaces(), game.get_level_array_bytes())
+        _, surfaces, traced = report.history[-1]
+        rss = get_rss_bytes()
+    finally:
+        game.memory_report = previous_report
+        report.stop()
+
+    print(f"Leak check: {len(level_files)} levels, {cycles} cycle(s) after warm-up")
+    print(f"  surfaces:    {format_bytes(surfaces)} (baseline {format_bytes(baseline_surfaces)})")
+    print(f"  Python heap: {format_bytes(traced - baseline_traced)} since baseline")
+    if rss is not None and baseline_rss is not None:
+        print(f"  process RSS: {format_bytes(rss)} ({format_bytes(rss - baseline_rss)} since baseline)")
+
+    leaked = surfaces != baseline_surfaces or traced - baseline_traced > tolerance
+    if leaked:
+        print(f"LEAK: memory did not return to its baseline. Top {top_n} allocation changes:")
+        report.print_diff(baseline_snapshot)
+    else:
+        print("  no leaks found")
+    return not leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that cycling through every level doesn't leak memory")
+    parser.add_argument("levels", nargs="*", help="level files to cycle through (default: every file in levels/)")
+    parser.add_argument("--cycles", type=int, default=1, help="passes over the levels after the warm-up (default: 1)")
+    parser.add_argument("--tolerance-kb", type=float, default=256, help="allowed Python heap growth (default: 256 KB)")
+    parser.add_argument("--top", type=int, default=10, help="allocation sites shown in diffs (default: 10)")
+    parser.add_argument("--verbose", action="store_true", help="print the full report after every level load")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    import main as game
+
+    level_files = args.levels or sorted(
+        str(path) for pattern in ("level*.yml", "level*.json") for path in Path("levels").glob(pattern)
+    )
+    pygame.init()
+    game.init_display()
+    ok = check_for_leaks(level_files, args.cycles, int(args.tolerance_kb * 1024), args.top, args.verbose)
+    pygame.quit()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
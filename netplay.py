@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+"""
+Online co-op with rollback netcode
+Two players on separate machines each control one unicorn. Only inputs cross the
+network: every frame both peers send their input (one byte of held keys) over UDP
+and run the same deterministic simulation (step_netplay_frame in main.py).
+
+Inputs of the remote player that haven't arrived yet are predicted (the keys they
+held last), so the game never waits for the network. When the real input arrives
+and differs from the prediction, the game state is rolled back to that frame and
+the frames since are simulated again, before the next frame is drawn. Local
+inputs are applied a couple of frames late (the input delay), which hides most of
+the latency without rollbacks.
+
+Every packet carries all the inputs the other peer hasn't acknowledged yet, run-
+length encoded (held keys repeat for many frames), so a lost packet is covered by
+the next one without resend timers.
+
+LinkSimulator adds latency, jitter and loss to outgoing packets, so all of this
+can be tried over loopback. Running this file starts two headless peers on
+localhost with scripted inputs and checks that both end in exactly the state an
+offline run with the same inputs reaches:
+
+    python netplay.py --latency 60 --jitter 15 --loss 0.05    # ~120 ms RTT
+"""
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from netplay_inputs import DEFAULT_INPUT_DELAY, DEFAULT_PORT, HELD_INPUTS, INPUT_RESET
+
+PROTOCOL_VERSION = 1
+
+FRAME_MS = 1000.0 / 60.0
+MAX_PREDICTION_FRAMES = 15  # further ahead of the remote inputs than this, the game waits
+MAX_PACKET_INPUTS = 240
+HANDSHAKE_INTERVAL = 0.2  # seconds between HELLOs while joining
+DISCONNECT_TIMEOUT = 5.0  # seconds without a packet before the connection counts as lost
+
+# Packets start with a magic and a type; handshake payloads are JSON
+PACKET_HEADER = struct.Struct("!2sB")
+PACKET_MAGIC = b"LU"
+HELLO, WELCOME, REJECT, INPUTS, BYE = range(5)
+
+# ack (last remote frame received), sender's frame, first input's frame, send time,
+# echoed remote send time and how long ago it arrived (ms), then (run, input) pairs
+INPUTS_HEADER = struct.Struct("!iiiIIH")
+NO_ECHO = 0xFFFF
+
+InputPacket = namedtuple("InputPacket", "ack frame first inputs")
+
+
+def encode_inputs(inputs):
+    """Run-length encode input bytes as (run length, input) pairs"""
+    encoded = bytearray()
+    run_start = 0
+    for index in range(1, len(inputs) + 1):
+        if index == len(inputs) or inputs[index] != inputs[run_start] or index - run_start == 255:
+            encoded += bytes((index - run_start, inputs[run_start]))
+            run_start = index
+    return bytes(encoded)
+
+
+def decode_inputs(encoded):
+    """Input bytes from (run length, input) pairs"""
+    inputs = bytearray()
+    for index in range(0, len(encoded) - 1, 2):
+        inputs += bytes((encoded[index + 1],)) * encoded[index]
+    return bytes(inputs)
+
+
+def get_time_ms():
+    """Milliseconds on a monotonic clock, wrapped to 32 bits like the packet field"""
+    return int(time.monotonic() * 1000) & 0xFFFFFFFF
+
+
+class LinkSimulator:
+    """Delays, jitters and drops outgoing packets, to play over a bad connection on purpose
+
+    Latency and jitter are one-way, so the round trip grows by twice the latency
+    when both peers use the same settings. Jitter can reorder packets, like on
+    real networks.
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, loss=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+        self.rng = random.Random(seed)
+        # (delivery time, sequence, data, address), soonest first
+        self.queue = []
+        self.sequence = 0
+        self.dropped = 0
+
+    def send(self, sock, data, address):
+        """Queue a packet for delivery after the simulated delay (or drop it)"""
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        delay_ms = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms))
+        self.sequence += 1
+        heapq.heappush(self.queue, (time.monotonic() + delay_ms / 1000.0, self.sequence, data, address))
+        self.flush(sock)
+
+    def flush(self, sock):
+        """Send the queued packets whose delay has passed"""
+        now = time.monotonic()
+        while self.queue and self.queue[0][0] <= now:
+            _, _, data, address = heapq.heappop(self.queue)
+            try:
+                sock.sendto(data, address)
+            except OSError:
+                pass
+
+
+class Peer:
+    """One end of a netplay connection: a non-blocking UDP socket and the packets on it
+
+    Create it with Peer.host() or Peer.join() and call handshake() every frame
+    until it returns True. `settings` are exchanged in the handshake: values
+    under keys both peers send (like the protocol version) must match, and the
+    host's settings (like the level) end up in remote_settings of the joiner.
+    """
+
+    def __init__(self, sock, remote_address=None, settings=None, simulator=None):
+        self.sock = sock
+        self.remote_address = remote_address
+        self.settings = dict(settings or {}, version=PROTOCOL_VERSION)
+        self.remote_settings = None
+        self.simulator = simulator
+        self.is_host = remote_address is None
+        self.connected = False
+        self.rejected = None  # Reason the handshake failed
+        self.closed = False  # The other peer quit
+
+        self.last_hello = 0.0
+        self.last_receive = time.monotonic()
+        # Latest send time of the remote and when it arrived, echoed back for the RTT
+        self.remote_time_ms = None
+        self.remote_time_received = 0.0
+        self.rtt_ms = None
+
+        self.packets_sent = self.bytes_sent = 0
+        self.packets_received = self.bytes_received = 0
+
+    @classmethod
+    def host(cls, port=DEFAULT_PORT, settings=None, simulator=None):
+        """Wait for a player to join on the given UDP port"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("", port))
+        sock.setblocking(False)
+        return cls(sock, None, settings, simulator)
+
+    @classmethod
+    def join(cls, address, settings=None, simulator=None):
+        """Connect to a host at (host name, port)"""
+        address = (socket.gethostbyname(address[0]), address[1])
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("", 0))
+        sock.setblocking(False)
+        return cls(sock, address, settings, simulator)
+
+    @property
+    def timed_out(self):
+        """True if nothing arrived from the connected peer for DISCONNECT_TIMEOUT seconds"""
+        return self.connected and time.monotonic() - self.last_receive > DISCONNECT_TIMEOUT
+
+    def _send(self, packet_type, payload=b"", address=None):
+        data = PACKET_HEADER.pack(PACKET_MAGIC, packet_type) + payload
+        address = address or self.remote_address
+        self.packets_sent += 1
+        self.bytes_sent += len(data)
+        if self.simulator is not None:
+            self.simulator.send(self.sock, data, address)
+            return
+        try:
+            self.sock.sendto(data, address)
+        except OSError:
+            pass
+
+    def _mismatched_settings(self, remote_settings):
+        """Keys both peers sent with different values"""
+        return sorted(
+            key for key in self.settings.keys() & remote_settings.keys() if self.settings[key] != remote_settings[key]
+        )
+
+    def handshake(self):
+        """Send HELLOs (when joining) and handle replies; return True once connected"""
+        if not self.connected and not self.is_host and time.monotonic() - self.last_hello >= HANDSHAKE_INTERVAL:
+            self.last_hello = time.monotonic()
+            self._send(HELLO, json.dumps(self.settings).encode())
+        # Inputs sent before our WELCOME arrived are sent again in later packets
+        self.receive()
+        return self.connected
+
+    def receive(self):
+        """Read every waiting packet; return the InputPackets among them"""
+        packets = []
+        while True:
+            try:
+                data, address = self.sock.recvfrom(4096)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # Windows reports an unreachable peer on the next read
+                continue
+            if len(data) < PACKET_HEADER.size:
+                continue
+            magic, packet_type = PACKET_HEADER.unpack_from(data)
+            if magic != PACKET_MAGIC or (self.connected and address != self.remote_address):
+                continue
+            try:
+                message = self._parse(packet_type, data[PACKET_HEADER.size:])
+            except (ValueError, struct.error):
+                # Cut short or garbled, or not from this game: dropped like a lost packet
+                continue
+            self.packets_received += 1
+            self.bytes_received += len(data)
+
+            if packet_type == INPUTS and self.connected:
+                packets.append(self._read_inputs(*message))
+            elif packet_type == HELLO and self.is_host:
+                self._answer_hello(message, address)
+            elif packet_type == WELCOME and not self.is_host and not self.connected:
+                mismatched = self._mismatched_settings(message)
+                if mismatched:
+                    self.rejected = f"the host has different {', '.join(mismatched)}"
+                else:
+                    self.remote_settings = message
+                    self.connected = True
+            elif packet_type == REJECT and not self.connected:
+                self.rejected = str(message.get("reason", "rejected by the host"))
+            elif packet_type == BYE:
+                self.closed = True
+            else:
+                continue
+            self.last_receive = time.monotonic()
+        if self.simulator is not None:
+            self.simulator.flush(self.sock)
+        return packets
+
+    @staticmethod
+    def _parse(packet_type, payload):
+        """Input header fields and encoded inputs, handshake settings (a dict) or None
+
+        Raises ValueError or struct.error if the payload doesn't fit its type.
+        """
+        if packet_type == INPUTS:
+            if len(payload) < INPUTS_HEADER.size:
+                raise struct.error(f"input packet of {len(payload)} bytes")
+            return INPUTS_HEADER.unpack_from(payload), payload[INPUTS_HEADER.size:]
+        if packet_type in (HELLO, WELCOME, REJECT):
+            message = json.loads(payload)
+            if not isinstance(message, dict):
+                raise ValueError("handshake payload is not a JSON object")
+            return message
+        return None
+
+    def _answer_hello(self, remote_settings, address):
+        """Accept a joining player (again, if our WELCOME got lost) or tell them why not"""
+        mismatched = self._mismatched_settings(remote_settings)
+        if mismatched:
+            self._send(REJECT, json.dumps({"reason": f"the host has different {', '.join(mismatched)}"}).encode(), address)
+            return
+        self.remote_address = address
+        self.remote_settings = remote_settings
+        self.connected = True
+        self._send(WELCOME, json.dumps(self.settings).encode())
+
+    def _read_inputs(self, header, encoded):
+        ack, frame, first, remote_time_ms, echo_ms, echo_delay_ms = header
+        now = time.monotonic()
+        self.remote_time_ms = remote_time_ms
+        self.remote_time_received = now
+        if echo_delay_ms != NO_ECHO:
+            sample = (get_time_ms() - echo_ms - echo_delay_ms) & 0xFFFFFFFF
+            if sample < 60000:
+                self.rtt_ms = sample if self.rtt_ms is None else 0.9 * self.rtt_ms + 0.1 * sample
+        return InputPacket(ack, frame, first, decode_inputs(encoded))
+
+    def send_inputs(self, ack, frame, first, inputs):
+        """Send inputs (bytes) starting at frame `first`, acknowledging remote inputs up to `ack`"""
+        if self.remote_time_ms is None:
+            echo_ms, echo_delay_ms = 0, NO_ECHO
+        else:
+            echo_ms = self.remote_time_ms
+            echo_delay_ms = min(NO_ECHO - 1, int((time.monotonic() - self.remote_time_received) * 1000))
+        header = INPUTS_HEADER.pack(ack, frame, first, get_time_ms(), echo_ms, echo_delay_ms)
+        self._send(INPUTS, header + encode_inputs(inputs))
+
+    def close(self):
+        """Tell the other peer we are leaving and close the socket"""
+        if self.connected:
+            # Sent directly and a few times: nobody resends it
+            data = PACKET_HEADER.pack(PACKET_MAGIC, BYE)
+            for _ in range(3):
+                try:
+                    self.sock.sendto(data, self.remote_address)
+                except OSError:
+                    pass
+        self.sock.close()
+
+
+class RollbackSession:
+    """Runs the game for two players over a Peer, predicting and rolling back remote inputs
+
+    `save_state()` returns a copy of the game state, `load_state(state)` restores
+    one and `simulate(frame, inputs, resimulating)` advances the game by one frame
+    given both players' input bits (player 1 first). resimulating is True for the
+    frames simulated again after a rollback, which shouldn't play sounds.
+    """
+
+    def __init__(self, peer, local_player, save_state, load_state, simulate,
+                 input_delay=DEFAULT_INPUT_DELAY, max_prediction=MAX_PREDICTION_FRAMES):
+        self.peer = peer
+        self.local_player = local_player
+        self.save_state = save_state
+        self.load_state = load_state
+        self.simulate = simulate
+        self.input_delay = input_delay
+        self.max_prediction = max_prediction
+
+        self.frame = 0  # Next frame to simulate
+        # Local inputs are known input_delay frames ahead; the first ones are empty
+        self.local_inputs = {frame: 0 for frame in range(input_delay)}
+        self.last_local_frame = input_delay - 1
+        self.remote_inputs = {}
+        self.remote_confirmed = -1  # Every remote input up to this frame has arrived
+        self.remote_acked = -1  # The remote has every local input up to this frame
+        self.remote_frame = 0  # The remote's frame when it last sent
+        self.predictions = {}  # Frame -> remote input guessed for it
+        self.states = {}  # Frame -> game state before that frame, for unconfirmed frames
+        self.rollback_frame = None
+        self.waited = False
+
+        self.rollbacks = 0
+        self.resimulated_frames = 0
+        self.longest_rollback = 0
+        self.predicted_frames = 0
+        self.waits = 0
+
+    @property
+    def confirmed_frame(self):
+        """Last frame simulated with both players' real inputs (it can't be rolled back any more)"""
+        return min(self.remote_confirmed, self.frame - 1)
+
+    def advance(self, local_input):
+        """Simulate the next frame with the local player's input bits
+
+        Returns False (and simulates nothing) when the game has to wait for the
+        remote player: it is too far ahead of their inputs, or ahead of them in time.
+        """
+        self.poll()
+        if self._should_wait():
+            self.waits += 1
+            self._send_inputs()
+            return False
+
+        self.last_local_frame = self.frame + self.input_delay
+        self.local_inputs[self.last_local_frame] = local_input
+        self._send_inputs()
+
+        self.states[self.frame] = self.save_state()
+        if self.frame > self.remote_confirmed:
+            self.predicted_frames += 1
+        self.simulate(self.frame, self._frame_inputs(self.frame), False)
+        self.frame += 1
+        self._prune()
+        return True
+
+    def settle(self):
+        """Exchange inputs without simulating new frames
+
+        Returns True once every simulated frame is confirmed and the remote has
+        all the local inputs it needs for the same frames.
+        """
+        self.poll()
+        self._send_inputs()
+        self._prune()
+        return self.remote_confirmed >= self.frame - 1 and self.remote_acked >= self.frame - 1
+
+    def poll(self):
+        """Take in the remote inputs that arrived and roll back if one was mispredicted"""
+        for packet in self.peer.receive():
+            self.remote_acked = max(self.remote_acked, packet.ack)
+            self.remote_frame = max(self.remote_frame, packet.frame)
+            # Packets start at the first input we didn't acknowledge, unless reordered
+            if packet.first > self.remote_confirmed + 1:
+                continue
+            for frame in range(self.remote_confirmed + 1, packet.first + len(packet.inputs)):
+                remote_input = packet.inputs[frame - packet.first]
+                self.remote_inputs[frame] = remote_input
+                predicted = self.predictions.pop(frame, None)
+                if predicted is not None and predicted != remote_input:
+                    if self.rollback_frame is None or frame < self.rollback_frame:
+                        self.rollback_frame = frame
+                self.remote_confirmed = frame
+        self._roll_back()
+
+    def restart(self, frame):
+        """Continue from a game state that was replaced at the start of `frame` (e.g. a new level)
+
+        The frames simulated since are simulated again from the new state. Both
+        peers must restart at the same frame, so only restart at confirmed frames.
+        """
+        self.states = {frame: self.save_state()}
+        self.predictions = {f: predicted for f, predicted in self.predictions.items() if f >= frame}
+        if frame < self.frame:
+            self.rollback_frame = frame
+            self._roll_back()
+
+    def describe(self):
+        """One-line connection status for the HUD"""
+        ping = "?" if self.peer.rtt_ms is None else f"{self.peer.rtt_ms:.0f} ms"
+        return f"Player {self.local_player + 1} online | ping {ping} | rollbacks {self.rollbacks}"
+
+    def _should_wait(self):
+        if self.frame - self.remote_confirmed > self.max_prediction:
+            return True
+        # The remote has moved on since it sent its frame; when we're still ahead
+        # of it, skip every other frame until it catches up
+        one_way_frames = (self.peer.rtt_ms or 0.0) / 2.0 / FRAME_MS
+        ahead = self.frame - self.remote_frame - one_way_frames
+        self.waited = ahead > 2 and not self.waited
+        return self.waited
+
+    def _frame_inputs(self, frame):
+        """Both players' inputs for a frame, predicting the remote one if it hasn't arrived"""
+        remote_input = self.remote_inputs.get(frame)
+        if remote_input is None:
+            # Keys are usually held for many frames; presses (R, N) aren't repeated
+            remote_input = self.remote_inputs.get(self.remote_confirmed, 0) & HELD_INPUTS
+            self.predictions[frame] = remote_input
+        local_input = self.local_inputs[frame]
+        return (local_input, remote_input) if self.local_player == 0 else (remote_input, local_input)
+
+    def _roll_back(self):
+        """Restore the state before the first mispredicted frame and simulate up to now again"""
+        if self.rollback_frame is None:
+            return
+        first_frame, self.rollback_frame = self.rollback_frame, None
+        self.load_state(self.states[first_frame])
+        for frame in range(first_frame, self.frame):
+            if frame > first_frame:
+                self.states[frame] = self.save_state()
+            self.simulate(frame, self._frame_inputs(frame), True)
+        self.rollbacks += 1
+        self.resimulated_frames += self.frame - first_frame
+        self.longest_rollback = max(self.longest_rollback, self.frame - first_frame)
+
+    def _send_inputs(self):
+        first = self.remote_acked + 1
+        last = min(self.last_local_frame, first + MAX_PACKET_INPUTS - 1)
+        inputs = bytes(self.local_inputs[frame] for frame in range(first, last + 1))
+        self.peer.send_inputs(self.remote_confirmed, self.frame, first, inputs)
+
+    def _prune(self):
+        """Forget states and inputs that no rollback or resend can need any more"""
+        self.states = {frame: state for frame, state in self.states.items() if frame > self.remote_confirmed}
+        # The last confirmed remote input is the prediction for the frames after it
+        oldest_remote = min(self.remote_confirmed, self.frame)
+        self.remote_inputs = {
+            frame: remote_input for frame, remote_input in self.remote_inputs.items() if frame >= oldest_remote
+        }
+        oldest_local = min(self.remote_acked, self.remote_confirmed, self.frame - 1)
+        self.local_inputs = {
+            frame: local_input for frame, local_input in self.local_inputs.items() if frame > oldest_local
+        }
+
+
+def get_scripted_inputs(player, frames, seed=0):
+    """Random held keys for the self-check: runs of 5-40 frames, with an occasional R press"""
+    rng = random.Random(seed * 2 + player)
+    inputs = bytearray()
+    while len(inputs) < frames:
+        inputs += bytes((rng.randrange(16),)) * rng.randrange(5, 41)
+    inputs = inputs[:frames]
+    for frame in range(0, frames, 397 + 60 * player):
+        if frame:
+            inputs[frame] |= INPUT_RESET
+    return bytes(inputs)
+
+
+def get_state_digest(state):
+    """SHA-256 of a game state from main.save_game_state, to compare runs"""
+    digest = hashlib.sha256()
+    for key in sorted(state):
+        value = state[key]
+        if isinstance(value, dict):
+            value = sorted((name, item.tobytes() if hasattr(item, "tobytes") else repr(item)) for name, item in value.items())
+        elif hasattr(value, "tobytes"):
+            value = value.tobytes()
+        digest.update(f"{key}={value!r};".encode())
+    return digest.hexdigest()
+
+
+def start_check_game(level):
+    """Open the dummy display and load the level for a headless run"""
+    import main as game
+
+    game.init_display(1.0, mode="blit")
+    # Never started, so sounds are skipped
+    game.audio = game.AudioSystem()
+    game.current_level = level
+    game.level_data = game.reset_level()
+    return game
+
+
+def run_offline(level, frames, input_delay, seed):
+    """Digest after simulating the scripted inputs without a network (the reference)"""
+    game = start_check_game(level)
+    scripts = [get_scripted_inputs(player, frames, seed) for player in (0, 1)]
+    for frame in range(frames):
+        inputs = tuple(script[frame - input_delay] if frame >= input_delay else 0 for script in scripts)
+        game.step_netplay_frame(frame, inputs, False)
+    return get_state_digest(game.save_game_state())
+
+
+def run_peer(args):
+    """One headless peer of the self-check, printing its result as JSON"""
+    game = start_check_game(args.level)
+    simulator = LinkSimulator(args.latency, args.jitter, args.loss, seed=args.seed * 2 + args.player)
+    settings = {"level": args.level}
+    if args.player == 0:
+        peer = Peer.host(args.port, settings, simulator)
+    else:
+        peer = Peer.join(("127.0.0.1", args.port), settings, simulator)
+
+    deadline = time.monotonic() + 10.0
+    while not peer.handshake():
+        if peer.rejected or time.monotonic() > deadline:
+            print(json.dumps({"error": peer.rejected or "handshake timed out"}))
+            return 1
+        time.sleep(0.005)
+
+    session = RollbackSession(peer, args.player, game.save_game_state, game.load_game_state,
+                              game.step_netplay_frame, args.delay)
+    script = get_scripted_inputs(args.player, args.frames, args.seed)
+    frame_times = []
+    next_frame = time.perf_counter()
+    while session.frame < args.frames:
+        start = time.perf_counter()
+        if session.advance(script[session.frame]):
+            frame_times.append(time.perf_counter() - start)
+        if peer.timed_out:
+            print(json.dumps({"error": "connection lost"}))
+            return 1
+        next_frame += FRAME_MS / 1000.0
+        time.sleep(max(0.0, next_frame - time.perf_counter()))
+
+    # Wait for the last inputs both ways, then give the remote time to do the same
+    deadline = time.monotonic() + 10.0
+    while not session.settle():
+        if time.monotonic() > deadline:
+            print(json.dumps({"error": "inputs of the last frames never arrived"}))
+            return 1
+        time.sleep(0.005)
+    linger = time.monotonic() + 1.0
+    while time.monotonic() < linger and not peer.closed:
+        session.settle()
+        time.sleep(0.005)
+
+    frame_times.sort()
+    print(json.dumps({
+        "digest": get_state_digest(game.save_game_state()),
+        "rtt_ms": peer.rtt_ms,
+        "rollbacks": session.rollbacks,
+        "resimulated_frames": session.resimulated_frames,
+        "longest_rollback": session.longest_rollback,
+        "predicted_frames": session.predicted_frames,
+        "waits": session.waits,
+        "packets_sent": peer.packets_sent,
+        "bytes_sent": peer.bytes_sent,
+        "dropped": simulator.dropped,
+        "frame_ms_p99": 1000.0 * frame_times[int(len(frame_times) * 0.99)] if frame_times else 0.0,
+    }))
+    peer.close()
+    return 0
+
+
+def run_check(args):
+    """Start a host and a joining peer on loopback and compare them with an offline run"""
+    reference = run_offline(args.level, args.frames, args.delay, args.seed)
+    print(f"Netplay check: level {args.level}, {args.frames} frames, input delay {args.delay}, "
+          f"latency {args.latency:g} ms +-{args.jitter:g} ms, loss {args.loss:.0%} (each way)")
+
+    command = [
+        sys.executable, os.path.abspath(__file__), "--port", str(args.port), "--level", str(args.level),
+        "--frames", str(args.frames), "--delay", str(args.delay), "--latency", str(args.latency),
+        "--jitter", str(args.jitter), "--loss", str(args.loss), "--seed", str(args.seed),
+    ]
+    processes = [
+        subprocess.Popen(command + ["--player", str(player)], stdout=subprocess.PIPE, text=True)
+        for player in (0, 1)
+    ]
+    results = []
+    for process in processes:
+        output, _ = process.communicate(timeout=args.frames / 30 + 60)
+        lines = output.strip().splitlines()
+        results.append(json.loads(lines[-1]) if lines else {"error": f"exited with {process.returncode}"})
+
+    ok = True
+    for player, result in enumerate(results):
+        name = "host" if player == 0 else "join"
+        if "error" in result:
+            print(f"  {name}: {result['error']}")
+            ok = False
+            continue
+        matches = result["digest"] == reference
+        ok = ok and matches
+        rtt = "?" if result["rtt_ms"] is None else f"{result['rtt_ms']:.0f} ms"
+        print(f"  {name}: RTT {rtt}, {result['predicted_frames']} predicted frames, "
+              f"{result['rollbacks']} rollbacks ({result['resimulated_frames']} frames re-simulated, "
+              f"longest {result['longest_rollback']}), {result['waits']} waits, "
+              f"p99 frame {result['frame_ms_p99']:.2f} ms")
+        print(f"        {result['packets_sent']} packets, {result['bytes_sent'] / result['packets_sent']:.1f} "
+              f"bytes each, {result['dropped']} dropped; "
+              f"final state {'matches' if matches else 'DIFFERS from'} the offline run")
+    print("  OK" if ok else "  FAILED")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check rollback netplay between two headless peers over loopback")
+    parser.add_argument("--level", type=int, default=1, help="level to play (default: 1)")
+    parser.add_argument("--frames", type=int, default=900, help="frames to play (default: 900, 15 s)")
+    parser.add_argument("--delay", type=int, default=DEFAULT_INPUT_DELAY,
+                        help=f"input delay in frames (default: {DEFAULT_INPUT_DELAY})")
+    parser.add_argument("--latency", type=float, default=60.0, help="one-way latency in ms (default: 60)")
+    parser.add_argument("--jitter", type=float, default=15.0, help="latency jitter in ms, +- (default: 15)")
+    parser.add_argument("--loss", type=float, default=0.05, help="fraction of packets dropped (default: 0.05)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the scripted inputs and the simulator")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT + 1, help="loopback UDP port (default: 7778)")
+    parser.add_argument("--player", type=int, choices=(0, 1), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    # The game loads levels and assets by relative path
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.player is not None:
+        return run_peer(args)
+    return run_check(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
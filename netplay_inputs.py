@@ -0,0 +1,32 @@
+"""
+Input bits of online play, and its defaults
+Split from netplay.py so main.py can read the keys and parse its flags without
+importing the networking code, which only --host and --join need.
+"""
+import pygame
+
+DEFAULT_PORT = 7777
+DEFAULT_INPUT_DELAY = 2  # frames
+
+# Input bits of one player for one frame (the held keys match vector_env's actions)
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_UP = 4
+INPUT_DOWN = 8
+INPUT_RESET = 16  # R was pressed: restart the level
+INPUT_NEXT = 32  # N was pressed: go to the next level once this one is complete
+HELD_INPUTS = INPUT_LEFT | INPUT_RIGHT | INPUT_UP | INPUT_DOWN
+
+# Either set of keys controls the local player's unicorn
+DIRECTION_INPUTS = (INPUT_LEFT, INPUT_RIGHT, INPUT_UP, INPUT_DOWN)
+ARROW_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN)
+WASD_KEYS = (pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_s)
+
+
+def read_input(keys):
+    """Input bits of the local player: arrows or WASD, whichever is held"""
+    bits = 0
+    for arrow_key, wasd_key, bit in zip(ARROW_KEYS, WASD_KEYS, DIRECTION_INPUTS):
+        if keys[arrow_key] or keys[wasd_key]:
+            bits |= bit
+    return bits
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Physics fuzzer for Lily Unicorns
+Plays random levels with random input through the game's own step_game (both
+unicorns, Unicorn.handle_input, update and check_collisions) under SDL's dummy
+video driver, as fast as the CPU allows, and checks after every frame that:
+
+- neither unicorn's velocity is NaN or infinite
+- no unicorn overlaps a platform once collisions are resolved (stuck inside it)
+- no unicorn passed through a platform between two frames (tunnelling)
+- no unicorn left the screen or sank below the ground
+
+Cases are spread over a process pool. A failing case is shrunk (input runs and
+level entries removed, inputs simplified, numbers rounded) while it still fails
+the same way, and saved as JSON that --replay plays again frame by frame.
+
+Usage:
+    python physics_fuzzer.py                          # 1000 cases on every CPU
+    python physics_fuzzer.py --cases 20000 --frames 900 --seed 7
+    python physics_fuzzer.py --time 600               # as many cases as fit in 10 minutes
+    python physics_fuzzer.py --replay fuzz_failures/inside_platform-seed42.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent
+DEFAULT_OUTPUT_DIR = "fuzz_failures"
+
+# Cases per pool task, so workers aren't waiting on the parent between short cases
+CASES_PER_TASK = 20
+# Re-runs a shrink may use before it settles for what it has
+MAX_SHRINK_RUNS = 500
+# Frames of state printed before the violation by --replay
+REPLAY_CONTEXT_FRAMES = 8
+
+# Percentages are of the screen; values outside 0-100 would be read as pixels
+GROUND_PERCENT = 14
+PLATFORM_COLOR = [200, 100, 50]
+# Half a unicorn (64x64 pixels at 1280x720) in percent, plus a pixel or so of rounding
+UNICORN_HALF_WIDTH = 2.5 + 0.2
+UNICORN_HALF_HEIGHT = 4.45 + 0.3
+
+Violation = namedtuple("Violation", "kind frame player detail")
+
+
+def generate_case(seed, frames):
+    """A random level (platforms and trees, in level file format) and input runs for both unicorns
+
+    Input runs are [frames, unicorn 1 bits, unicorn 2 bits], with the netplay
+    input bits (left, right, up, down) held for that many frames.
+    """
+    rng = random.Random(seed)
+
+    platforms = []
+    for _ in range(rng.randint(1, 25)):
+        # Thin platforms (a few pixels) are the ones fast falls could pass through
+        height = rng.uniform(0.15, 1.0) if rng.random() < 0.4 else rng.uniform(1.0, 10.0)
+        platforms.append({
+            "x": round(rng.uniform(0, 95), 2),
+            "y": round(rng.uniform(GROUND_PERCENT - 4, 95), 2),
+            "width": round(rng.uniform(0.5, 30), 2),
+            "height": round(height, 2),
+            "color": PLATFORM_COLOR,
+        })
+
+    trees = [
+        {
+            "x": round(rng.uniform(0, 90), 2),
+            "y": round(rng.uniform(30, 70), 2),
+            "width": round(rng.uniform(4, 10), 2),
+            "height": round(rng.uniform(15, 40), 2),
+        }
+        for _ in range(rng.randint(0, 4))
+    ]
+
+    def overlaps_start(entry, x, y):
+        # Platforms reach down from their y by their height
+        return (
+            x + UNICORN_HALF_WIDTH > entry["x"] and x - UNICORN_HALF_WIDTH < entry["x"] + entry["width"]
+            and y + UNICORN_HALF_HEIGHT > entry["y"] - entry["height"] and y - UNICORN_HALF_HEIGHT < entry["y"]
+        )
+
+    def get_start():
+        # Somewhere free; failing that, drop the platforms in the way
+        for _ in range(50):
+            x, y = round(rng.uniform(5, 95), 2), round(rng.uniform(20, 95), 2)
+            if not any(overlaps_start(entry, x, y) for entry in platforms):
+                break
+        platforms[:] = [entry for entry in platforms if not overlaps_start(entry, x, y)]
+        return {"x": x, "y": y}
+
+    level = {
+        "level": {"name": f"Fuzz {seed}"},
+        "unicorns": {"unicorn1": get_start(), "unicorn2": get_start()},
+        "platforms": platforms,
+        "trees": trees,
+    }
+
+    runs = []
+    remaining = frames
+    while remaining > 0:
+        count = min(remaining, rng.randint(1, 45))
+        runs.append([count, rng.getrandbits(4), rng.getrandbits(4)])
+        remaining -= count
+    return {"seed": seed, "level": level, "inputs": runs}
+
+
+def init_worker():
+    """Open the (dummy) display once per worker process, at 1280x720 so physics run unscaled"""
+    import main as game
+
+    game.init_display(1.0, mode="blit")
+
+
+def get_keys():
+    """ScriptedKeys for every combination of input bits, for arrows and WASD"""
+    import main as game
+
+    return [game.get_input_keys(bits) for bits in range(16)], [game.get_input_keys(bits, True) for bits in range(16)]
+
+
+def is_invalid_level(game):
+    """True for level problems rather than physics ones: empty platforms, or a unicorn starting inside one"""
+    if (game.platforms.width == 0).any() or (game.platforms.height == 0).any():
+        return True
+    return any(game.platforms.get_rects(unicorn.rect) for unicorn in (game.unicorn1, game.unicorn2))
+
+
+def check_invariants(game, frame, previous_rects):
+    """The first invariant broken after a frame, as a Violation, or None"""
+    for player, (unicorn, previous) in enumerate(zip((game.unicorn1, game.unicorn2), previous_rects), 1):
+        rect = unicorn.rect
+        state = f"at {tuple(rect)} velocity ({unicorn.vel_x}, {unicorn.vel_y})"
+        if not (math.isfinite(unicorn.vel_x) and math.isfinite(unicorn.vel_y)):
+            return Violation("nan_velocity", frame, player, state)
+        if rect.left < 0 or rect.right > game.world_width or rect.top < 0:
+            return Violation("off_screen", frame, player, state)
+        if rect.bottom > unicorn.ground_y:
+            return Violation("below_ground", frame, player, f"ground at {unicorn.ground_y}, {state}")
+
+        for platform in game.platforms.get_rects(previous.union(rect)):
+            if rect.colliderect(platform):
+                return Violation("inside_platform", frame, player, f"platform {tuple(platform)}, {state}")
+
+            # A platform between where the unicorn was and where it is now
+            across_x = (previous.right <= platform.left and rect.left >= platform.right) or (
+                previous.left >= platform.right and rect.right <= platform.left)
+            across_y = (previous.bottom <= platform.top and rect.top >= platform.bottom) or (
+                previous.top >= platform.bottom and rect.bottom <= platform.top)
+            spans_x = min(previous.left, rect.left) < platform.right and platform.left < max(previous.right, rect.right)
+            spans_y = min(previous.top, rect.top) < platform.bottom and platform.top < max(previous.bottom, rect.bottom)
+            if (across_y and spans_x) or (across_x and spans_y):
+                return Violation("tunnelled", frame, player, f"platform {tuple(platform)}, from {tuple(previous)} {state}")
+    return None
+
+
+def run_case(case, keys, trace=None):
+    """Play a case; return the first Violation, None if it passed, or "invalid" (see is_invalid_level)
+
+    With trace (a list), the unicorns' rects and velocities are appended every frame.
+    """
+    import main as game
+
+    game.reset_level(level_data=case["level"])
+    if is_invalid_level(game):
+        return "invalid"
+
+    arrow_keys, wasd_keys = keys
+    unicorns = (game.unicorn1, game.unicorn2)
+    frame = 0
+    for count, bits1, bits2 in case["inputs"]:
+        for _ in range(count):
+            previous_rects = [unicorn.rect.copy() for unicorn in unicorns]
+            game.step_game(arrow_keys[bits1], wasd_keys[bits2], effects=False)
+            if trace is not None:
+                trace.append((frame, bits1, bits2, [(tuple(u.rect), u.vel_x, u.vel_y, u.on_ground, u.can_climb)
+                                                    for u in unicorns]))
+            violation = check_invariants(game, frame, previous_rects)
+            if violation is not None:
+                return violation
+            frame += 1
+    return None
+
+
+def get_frame_count(case):
+    return sum(count for count, _, _ in case["inputs"])
+
+
+def get_shrink_candidates(case):
+    """Simpler versions of a case, roughly from the biggest simplification to the smallest"""
+    runs = case["inputs"]
+    level = case["level"]
+
+    def with_runs(new_runs):
+        return dict(case, inputs=[run for run in new_runs if run[0] > 0])
+
+    def with_entries(key, entries):
+        return dict(case, level=dict(level, **{key: entries}))
+
+    # Drop halves, quarters, ... of the input runs
+    size = len(runs) // 2
+    while size >= 1:
+        for start in range(0, len(runs), size):
+            yield with_runs(runs[:start] + runs[start + size:])
+        size //= 2
+
+    # Drop level entries, one at a time
+    for key in ("platforms", "trees"):
+        entries = level.get(key) or []
+        for index in range(len(entries)):
+            yield with_entries(key, entries[:index] + entries[index + 1:])
+
+    # Shorter runs, then fewer keys held (unicorn 2 idle first)
+    if any(bits2 for _, _, bits2 in runs):
+        yield with_runs([[count, bits1, 0] for count, bits1, _ in runs])
+    for index, (count, bits1, bits2) in enumerate(runs):
+        if count > 1:
+            yield with_runs(runs[:index] + [[count // 2, bits1, bits2]] + runs[index + 1:])
+        for player, bits in ((1, bits1), (2, bits2)):
+            for bit in (8, 4, 2, 1):
+                if bits & bit:
+                    simpler = [count, bits1 & ~bit, bits2] if player == 1 else [count, bits1, bits2 & ~bit]
+                    yield with_runs(runs[:index] + [simpler] + runs[index + 1:])
+
+    # Rounder numbers in the level
+    for key in ("platforms", "trees"):
+        entries = level.get(key) or []
+        for index, entry in enumerate(entries):
+            for field in ("x", "y", "width", "height"):
+                value = entry[field]
+                for rounded in (round(value), round(value, 1)):
+                    if rounded != value and 0 <= rounded <= 100:
+                        yield with_entries(key, entries[:index] + [dict(entry, **{field: rounded})] + entries[index + 1:])
+                        break
+    for name, start in level["unicorns"].items():
+        for field in ("x", "y"):
+            if start[field] != round(start[field]):
+                unicorns = dict(level["unicorns"], **{name: dict(start, **{field: round(start[field])})})
+                yield dict(case, level=dict(level, unicorns=unicorns))
+
+
+def truncate_case(case, frame):
+    """The case with its inputs cut off after frame"""
+    runs = []
+    remaining = frame + 1
+    for count, bits1, bits2 in case["inputs"]:
+        if remaining <= 0:
+            break
+        runs.append([min(count, remaining), bits1, bits2])
+        remaining -= count
+    return dict(case, inputs=runs)
+
+
+def shrink_case(case, violation, keys, max_runs=MAX_SHRINK_RUNS, deadline=None):
+    """The smallest case found that still breaks the same invariant, its Violation and the runs used
+
+    Stops after max_runs re-runs, or at the deadline (a time.time() value).
+    """
+    case = truncate_case(case, violation.frame)
+    # After each success the candidates start over; the ones that passed before are skipped
+    tried = set()
+    runs_used = 0
+    progress = True
+    while progress:
+        progress = False
+        for candidate in get_shrink_candidates(case):
+            if runs_used >= max_runs or (deadline is not None and time.time() >= deadline):
+                return case, violation, runs_used
+            key = json.dumps(candidate, sort_keys=True)
+            if key in tried:
+                continue
+            tried.add(key)
+            runs_used += 1
+            result = run_case(candidate, keys)
+            if isinstance(result, Violation) and result.kind == violation.kind:
+                case, violation = truncate_case(candidate, result.frame), result
+                progress = True
+                break
+    return case, violation, runs_used
+
+
+def fuzz_cases(seeds, frames, shrink, deadline=None):
+    """Run the cases for seeds (in a worker); return their results and a Counter of work done
+
+    Results are (seed, violation, case) for failures and (seed, "invalid", None)
+    for cases whose level was unusable. The Counter has the cases run and their
+    frames and seconds, and the runs and seconds spent shrinking. No case is
+    started after the deadline (a time.time() value), and shrinking stops there.
+    """
+    keys = get_keys()
+    results = []
+    stats = Counter()
+    for seed in seeds:
+        if deadline is not None and time.time() >= deadline:
+            break
+        stats["cases"] += 1
+        start = time.perf_counter()
+        case = generate_case(seed, frames)
+        violation = run_case(case, keys)
+        stats["frames"] += frames if violation is None or violation == "invalid" else violation.frame + 1
+        stats["seconds"] += time.perf_counter() - start
+        if violation is None:
+            continue
+        if violation == "invalid":
+            results.append((seed, "invalid", None))
+            continue
+        if shrink:
+            start = time.perf_counter()
+            case, violation, runs_used = shrink_case(case, violation, keys, deadline=deadline)
+            stats["shrink_runs"] += runs_used
+            stats["shrink_seconds"] += time.perf_counter() - start
+        results.append((seed, violation, case))
+    return results, stats
+
+
+def run_fuzzer(first_seed, cases, frames, jobs, deadline, shrink):
+    """Run cases on a process pool (or in this process for one job), yielding results as they finish
+
+    Without a number of cases, cases run until the deadline (a time.time() value).
+    """
+    def batches():
+        seed = first_seed
+        while (cases is None or seed < first_seed + cases) and (deadline is None or time.time() < deadline):
+            count = CASES_PER_TASK if cases is None else min(CASES_PER_TASK, first_seed + cases - seed)
+            yield list(range(seed, seed + count))
+            seed += count
+
+    if jobs == 1:
+        init_worker()
+        for seeds in batches():
+            yield fuzz_cases(seeds, frames, shrink, deadline)
+        return
+
+    with ProcessPoolExecutor(jobs, initializer=init_worker) as pool:
+        pending = set()
+        batch_iterator = batches()
+        while True:
+            # Keep every worker busy, with a little queued up
+            while len(pending) < jobs * 2:
+                seeds = next(batch_iterator, None)
+                if seeds is None:
+                    break
+                pending.add(pool.submit(fuzz_cases, seeds, frames, shrink, deadline))
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield future.result()
+
+
+def save_failure(output_dir, seed, violation, case):
+    """Write a (shrunk) failing case as JSON; return its path"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / f"{violation.kind}-seed{seed}.json"
+    with open(path, "w") as f:
+        json.dump(dict(case, violation=violation._asdict(), frames=get_frame_count(case)), f, indent=2)
+        f.write("\n")
+    return path
+
+
+def replay(path):
+    """Play a saved case again and print the frames leading up to its violation"""
+    with open(path) as f:
+        case = json.load(f)
+    init_worker()
+    trace = []
+    violation = run_case(case, get_keys(), trace)
+    if violation == "invalid":
+        print("A unicorn starts inside a platform")
+        return 1
+
+    print(f"{path}: {len(case['level'].get('platforms') or [])} platform(s), "
+          f"{len(case['level'].get('trees') or [])} tree(s), {get_frame_count(case)} frame(s)")
+    for frame, bits1, bits2, unicorns in trace[-REPLAY_CONTEXT_FRAMES:]:
+        print(f"  frame {frame:5d}  input {bits1:04b} {bits2:04b}")
+        for player, (rect, vel_x, vel_y, on_ground, can_climb) in enumerate(unicorns, 1):
+            print(f"    unicorn {player}: rect {rect} velocity ({vel_x}, {vel_y})"
+                  f"{' on ground' if on_ground else ''}{' can climb' if can_climb else ''}")
+    if violation is None:
+        print("No violation: the case passes now")
+        return 0
+    print(f"{violation.kind} at frame {violation.frame}, unicorn {violation.player}: {violation.detail}")
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the unicorn physics with random levels and input")
+    parser.add_argument("--cases", type=int, default=1000, help="cases to run (default: 1000; ignored with --time)")
+    parser.add_argument("--time", type=float, help="run cases for this many seconds instead")
+    parser.add_argument("--frames", type=int, default=600, help="frames per case (default: 600, 10 s of play)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first case (default: 0)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="worker processes (default: one per CPU)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_DIR,
+                        help=f"folder for failing cases (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--no-shrink", action="store_true", help="save failing cases as generated")
+    parser.add_argument("--replay", metavar="FILE", help="play a saved failing case and print its last frames")
+    args = parser.parse_args()
+
+    # Inherited by the worker processes
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    if args.replay:
+        args.replay = os.path.abspath(args.replay)
+    # The game loads its assets by relative path
+    os.chdir(REPO_ROOT)
+
+    if args.replay:
+        return replay(args.replay)
+
+    output_dir = Path(args.output) if os.path.isabs(args.output) else REPO_ROOT / args.output
+    start = time.monotonic()
+    deadline = time.time() + args.time if args.time else None
+    cases = None if args.time else args.cases
+    print(f"Fuzzing {'for ' + format(args.time, 'g') + ' s' if args.time else f'{cases} cases'} "
+          f"of {args.frames} frames on {max(1, args.jobs)} process(es)")
+
+    invalid = 0
+    failures = Counter()
+    stats = Counter()
+    for results, batch_stats in run_fuzzer(args.seed, cases, args.frames, max(1, args.jobs), deadline,
+                                           not args.no_shrink):
+        stats += batch_stats
+        for seed, violation, case in results:
+            if violation == "invalid":
+                invalid += 1
+                continue
+            failures[violation.kind] += 1
+            path = save_failure(output_dir, seed, violation, case)
+            print(f"  seed {seed}: {violation.kind} at frame {violation.frame} (unicorn {violation.player}); "
+                  f"{get_frame_count(case)} frame(s), {len(case['level']['platforms'])} platform(s) and "
+                  f"{len(case['level']['trees'])} tree(s) -> "
+                  f"{path.relative_to(REPO_ROOT) if path.is_relative_to(REPO_ROOT) else path}")
+
+    elapsed = time.monotonic() - start
+    print(f"{stats['cases']} cases ({invalid} skipped with an unusable level), {stats['frames']} frames in {elapsed:.1f} s; "
+          f"{stats['frames'] / max(stats['seconds'], 1e-9):.0f} frames/s per process")
+    if stats["shrink_runs"]:
+        print(f"Shrinking took {stats['shrink_runs']} runs and {stats['shrink_seconds']:.1f} s of process time")
+    if failures:
+        print("Failures: " + ", ".join(f"{kind} x{count}" for kind, count in failures.most_common()))
+        return 1
+    print("No invariant violations")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
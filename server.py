@@ -2,11 +2,37 @@
 """
 Simple HTTP server for Lily Unicorns game
 Run this to serve the game files locally and avoid CORS issues
+
+Usage:
+    python server.py                              # port 8000, opens a browser
+    python server.py --port 8080 --no-browser
+    python server.py --access-log access.jsonl    # log requests to a file instead of stderr
+
+Open pages are told when files change: /events is a Server-Sent Events stream
+that sends a `change` event with the path of every file saved in the served
+folder (see live-reload.js). One thread watches the folder and writes to every
+stream, so an idle page costs an open socket rather than a thread.
+
+Requests are logged as JSON lines by a background writer, and counted per path
+(requests, bytes sent and a latency histogram). /metrics returns the counts in
+Prometheus text format to clients on this machine.
 """
+import argparse
+import bisect
+import sys
 import http.server
-import socketserver
+import json
+import math
 import os
+import queue
+import selectors
+import socket
+import socketserver
+import threading
+import time
 import webbrowser
+from collections import Counter
+from datetime import datetime, timezone
 from pathlib import Path
 
 # Set the directory to serve files from
@@ -14,7 +40,451 @@ os.chdir(Path(__file__).parent)
 
 PORT = 8000
 
+EVENTS_PATH = "/events"
+# How often the served folder is checked for changed files
+POLL_INTERVAL = 0.5
+# Comments sent to idle streams, so proxies and browsers keep them open
+HEARTBEAT_INTERVAL = 15.0
+# Browsers wait this long before reconnecting to a stream that closed
+RECONNECT_MS = 2000
+
+METRICS_PATH = "/metrics"
+LOCAL_ADDRESSES = {"127.0.0.1", "::1", "::ffff:127.0.0.1"}
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0,
+)
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+# Paths beyond this many (and paths that weren't found) are counted as "other"
+MAX_METRIC_PATHS = 500
+
+# Log records waiting for the writer; more are dropped (and counted) instead
+ACCESS_LOG_QUEUE_SIZE = 10000
+ACCESS_LOG_BATCH = 256
+
+# Folders that aren't part of the web build
+IGNORED_DIRS = {"__pycache__", "captures", "benchmarks", "node_modules", "venv"}
+
+
+def scan_files(root):
+    """Modification time and size of every served file under root, by path relative to root"""
+    files = {}
+    pending = [root]
+    while pending:
+        folder = pending.pop()
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in IGNORED_DIRS:
+                            pending.append(entry.path)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                        files[path] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue
+    return files
+
+
+def format_event(event, data):
+    """A Server-Sent Events message with JSON data"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class ChangeBroadcaster:
+    """Sends file change events to every open /events stream from one thread
+
+    The request handler passes over each stream's socket once the headers are
+    sent; a selector notices when a page closes it, and the served folder is
+    scanned for changes between selects. Events are small, so a stream whose
+    send buffer is full belongs to a page that stopped reading and is closed
+    (the browser reconnects if the page is still open).
+    """
+
+    def __init__(self, root, poll_interval=POLL_INTERVAL, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.selector = selectors.DefaultSelector()
+        self.clients = set()
+
+        # New streams are queued, and the selector woken through a socket pair
+        self.new_clients = queue.SimpleQueue()
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self.selector.register(self._wake_reader, selectors.EVENT_READ)
+
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="ChangeBroadcaster", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+        self._wake()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def add(self, connection):
+        """Take over a stream's socket (call after its headers were sent)"""
+        self.new_clients.put(connection)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_writer.send(b"\0")
+        except BlockingIOError:
+            pass  # Already woken
+
+    def _run(self):
+        files = scan_files(self.root)
+        next_scan = time.monotonic() + self.poll_interval
+        next_heartbeat = time.monotonic() + self.heartbeat_interval
+        while not self._stopped:
+            for key, _ in self.selector.select(max(0.0, next_scan - time.monotonic())):
+                if key.fileobj is self._wake_reader:
+                    self._accept_new_clients()
+                else:
+                    self._check_client(key.fileobj)
+
+            now = time.monotonic()
+            if now >= next_scan:
+                new_files = scan_files(self.root)
+                for path in sorted(files.keys() | new_files.keys()):
+                    if files.get(path) != new_files.get(path):
+                        self.broadcast(format_event("change", {"path": path, "deleted": path not in new_files}))
+                files = new_files
+                next_scan = time.monotonic() + self.poll_interval
+            if now >= next_heartbeat:
+                self.broadcast(b": ping\n\n")
+                next_heartbeat = now + self.heartbeat_interval
+
+        for client in list(self.clients):
+            self._drop(client)
+        self.selector.close()
+        self._wake_reader.close()
+        self._wake_writer.close()
+
+    def _accept_new_clients(self):
+        try:
+            while self._wake_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            try:
+                client = self.new_clients.get_nowait()
+            except queue.Empty:
+                break
+            client.setblocking(False)
+            self.selector.register(client, selectors.EVENT_READ)
+            self.clients.add(client)
+            self._send(client, f"retry: {RECONNECT_MS}\n\n".encode())
+
+    def _check_client(self, client):
+        """Pages never send on a stream, so a readable one was closed"""
+        try:
+            data = client.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(client)
+
+    def broadcast(self, message):
+        for client in list(self.clients):
+            self._send(client, message)
+
+    def _send(self, client, message):
+        try:
+            sent = client.send(message)
+        except OSError:
+            sent = 0
+        if sent < len(message):
+            self._drop(client)
+
+    def _drop(self, client):
+        if client in self.clients:
+            self.clients.discard(client)
+            self.selector.unregister(client)
+        try:
+            client.close()
+        except OSError:
+            pass
+
+
+class AccessLog:
+    """Writes access log records as JSON lines from a background thread
+
+    Requests only queue a dict; the writer formats whatever has queued up and
+    writes it at once, so a slow terminal or disk doesn't hold up serving.
+    """
+
+    def __init__(self, stream, max_pending=ACCESS_LOG_QUEUE_SIZE):
+        self.stream = stream
+        self.records = queue.Queue(max_pending)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="AccessLog", daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write the queued records and stop the writer"""
+        if self._thread is not None:
+            self.records.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        stopped = False
+        while not stopped:
+            batch = [self.records.get()]
+            while len(batch) < ACCESS_LOG_BATCH:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stopped = True
+                batch.pop()
+            try:
+                self.stream.write("".join(json.dumps(record) + "\n" for record in batch))
+                self.stream.flush()
+            except (OSError, ValueError):
+                self.dropped += len(batch)
+
+
+class LatencyHistogram:
+    """Request durations counted in LATENCY_BUCKETS, like a Prometheus histogram"""
+
+    def __init__(self):
+        # One count per bucket, and the last for durations above every bound
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Estimated quantile, interpolated within its bucket as histogram_quantile() does"""
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                return lower + (LATENCY_BUCKETS[index] - lower) * (rank - seen) / count
+            seen += count
+        return LATENCY_BUCKETS[-1]
+
+
+def format_labels(**labels):
+    """Prometheus label set, with values escaped"""
+    pairs = []
+    for name, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class RequestMetrics:
+    """Requests, bytes sent and latency per path, for /metrics
+
+    Only the request handler updates and reads these, and the server handles
+    one request at a time, so no locking is needed.
+    """
+
+    def __init__(self):
+        self.requests = Counter()  # (path, method, status) -> requests
+        self.bytes_sent = Counter()  # path -> bytes
+        self.latency = {}  # path -> LatencyHistogram
+        self.started = time.time()
+
+    def observe(self, path, method, status, bytes_sent, seconds):
+        if path not in self.latency and (status == 404 or len(self.latency) >= MAX_METRIC_PATHS):
+            path = "other"
+        self.requests[(path, method, status)] += 1
+        self.bytes_sent[path] += bytes_sent
+        histogram = self.latency.get(path)
+        if histogram is None:
+            histogram = self.latency[path] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def format(self, extra=()):
+        """The metrics in Prometheus text format; extra adds (name, type, help, value) metrics"""
+        lines = [
+            "# HELP lily_http_requests_total Requests handled, by path, method and status.",
+            "# TYPE lily_http_requests_total counter",
+        ]
+        for (path, method, status), count in sorted(self.requests.items()):
+            lines.append(f"lily_http_requests_total{format_labels(path=path, method=method, status=status)} {count}")
+
+        lines += [
+            "# HELP lily_http_response_bytes_total Bytes sent (headers and body), by path.",
+            "# TYPE lily_http_response_bytes_total counter",
+        ]
+        for path, count in sorted(self.bytes_sent.items()):
+            lines.append(f"lily_http_response_bytes_total{format_labels(path=path)} {count}")
+
+        lines += [
+            "# HELP lily_http_request_duration_seconds Time from accepting a request to sending the response.",
+            "# TYPE lily_http_request_duration_seconds histogram",
+        ]
+        for path, histogram in sorted(self.latency.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"lily_http_request_duration_seconds_bucket{format_labels(path=path, le=bound)} {cumulative}")
+            lines.append(f"lily_http_request_duration_seconds_sum{format_labels(path=path)} {histogram.sum:.6f}")
+            lines.append(f"lily_http_request_duration_seconds_count{format_labels(path=path)} {histogram.count}")
+
+        lines += [
+            "# HELP lily_http_request_duration_quantile_seconds Latency quantiles estimated from the histogram.",
+            "# TYPE lily_http_request_duration_quantile_seconds gauge",
+        ]
+        for path, histogram in sorted(self.latency.items()):
+            for q in LATENCY_QUANTILES:
+                value = histogram.quantile(q)
+                lines.append(f"lily_http_request_duration_quantile_seconds{format_labels(path=path, quantile=q)} {value:.6f}")
+
+        extra = [
+            ("lily_http_uptime_seconds", "gauge", "Seconds since the server started.", time.time() - self.started),
+            ("process_cpu_seconds_total", "counter", "CPU time used by the server process.", time.process_time()),
+            *extra,
+        ]
+        for name, kind, help_text, value in extra:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value:g}"]
+        return "\n".join(lines) + "\n"
+
+
+class CountingWriter:
+    """Wraps a handler's wfile to count the bytes written to the client"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.bytes_written = 0
+
+    def write(self, data):
+        written = self.wfile.write(data)
+        self.bytes_written += len(data)
+        return written
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        self.wfile.close()
+
+    @property
+    def closed(self):
+        return self.wfile.closed
+
+
 class NoCacheHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    def setup(self):
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+
+    def handle_one_request(self):
+        start = time.perf_counter()
+        self.status = None
+        super().handle_one_request()
+        if self.status is not None:
+            self.log_finished_request(time.perf_counter() - start)
+
+    def log_request(self, code='-', size='-'):
+        # Logged with the duration and size once the response is sent
+        self.status = int(code) if isinstance(code, int) else code
+
+    def log_message(self, format, *args):
+        access_log = getattr(self.server, "access_log", None)
+        if access_log is None:
+            super().log_message(format, *args)
+        else:
+            access_log.write({
+                "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "client": self.client_address[0],
+                "message": format % args,
+            })
+
+    def log_finished_request(self, seconds):
+        bytes_sent = self.wfile.bytes_written
+        path = self.path.split("?", 1)[0]
+        metrics = getattr(self.server, "metrics", None)
+        if metrics is not None:
+            metrics.observe(path, self.command or "-", self.status, bytes_sent, seconds)
+
+        access_log = getattr(self.server, "access_log", None)
+        if access_log is None:
+            super().log_request(self.status, bytes_sent)
+        else:
+            access_log.write({
+                "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "client": self.client_address[0],
+                "method": self.command,
+                "path": self.path,
+                "status": self.status,
+                "bytes": bytes_sent,
+                "ms": round(seconds * 1000.0, 3),
+                "agent": self.headers.get("User-Agent", "") if self.headers else "",
+            })
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == EVENTS_PATH and getattr(self.server, "broadcaster", None):
+            self.start_event_stream()
+        elif path == METRICS_PATH and getattr(self.server, "metrics", None):
+            self.send_metrics()
+        else:
+            super().do_GET()
+
+    def send_metrics(self):
+        """The request counts in Prometheus text format, for this machine only"""
+        if self.client_address[0] not in LOCAL_ADDRESSES:
+            self.send_error(404, "File not found")
+            return
+        body = self.server.format_metrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def start_event_stream(self):
+        """Send the stream's headers and pass its socket to the broadcaster"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.flush()
+        self.server.keep_open(self.connection)
+        self.server.broadcaster.add(self.connection)
+        self.close_connection = True
+
     def end_headers(self):
         # Add no-cache headers for JSON files
         if self.path.endswith('.json'):
@@ -23,29 +493,88 @@ class NoCacheHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
             self.send_header('Expires', '0')
         super().end_headers()
 
+
+class GameServer(socketserver.TCPServer):
+    """The game server, with /events streams handled by a ChangeBroadcaster
+
+    Requests are counted in `metrics` and logged to `access_log` (when given an
+    AccessLog; otherwise to stderr as usual).
+    """
+
+    allow_reuse_address = True
+    # Every open page holds a stream and reconnects at once when the server restarts
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, root=".", access_log=None):
+        super().__init__(server_address, handler_class)
+        self.broadcaster = ChangeBroadcaster(root)
+        self.metrics = RequestMetrics()
+        self.access_log = access_log
+        self._kept_open = set()
+
+    def format_metrics(self):
+        extra = [("lily_live_reload_streams", "gauge", "Open /events streams.", len(self.broadcaster.clients))]
+        if self.access_log is not None:
+            extra.append(("lily_access_log_dropped_total", "counter",
+                          "Access log records dropped while the writer was behind.", self.access_log.dropped))
+        return self.metrics.format(extra)
+
+    def keep_open(self, request):
+        """Leave the request's socket open once its handler returns"""
+        self._kept_open.add(request)
+
+    def shutdown_request(self, request):
+        if request in self._kept_open:
+            self._kept_open.discard(request)
+            return
+        super().shutdown_request(request)
+
+    def serve_forever(self, poll_interval=0.5):
+        self.broadcaster.start()
+        super().serve_forever(poll_interval)
+
+    def server_close(self):
+        self.broadcaster.stop()
+        super().server_close()
+        if self.access_log is not None:
+            self.access_log.close()
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the web version of Lily Unicorns")
+    parser.add_argument("--port", type=int, default=PORT, help=f"port to listen on (default: {PORT})")
+    parser.add_argument("--access-log", metavar="FILE",
+                        help="append the access log (JSON lines) to FILE instead of stderr")
+    parser.add_argument("--no-browser", action="store_true", help="don't open a browser")
+    args = parser.parse_args()
+    port = args.port
+
     try:
-        with socketserver.TCPServer(("", PORT), NoCacheHTTPRequestHandler) as httpd:
+        log_stream = open(args.access_log, "a", buffering=1 << 16) if args.access_log else sys.stderr
+        with GameServer(("", port), NoCacheHTTPRequestHandler, access_log=AccessLog(log_stream)) as httpd:
             print(f"✨ Lily Unicorns Server Starting...")
-            print(f"🦄 Open your browser to: http://localhost:{PORT}")
+            print(f"🦄 Open your browser to: http://localhost:{port}")
             print(f"📁 Serving files from: {os.getcwd()}")
+            print(f"♻️  Open pages update when files here change")
+            print(f"📊 Request metrics: http://localhost:{port}{METRICS_PATH}")
             print(f"🔄 Press Ctrl+C to stop the server")
             print()
-            
+
             # Try to open browser automatically
-            try:
-                webbrowser.open(f'http://localhost:{PORT}')
-                print("🌐 Browser opened automatically")
-            except:
-                print("💡 Please open the URL manually in your browser")
-            
+            if not args.no_browser:
+                try:
+                    webbrowser.open(f'http://localhost:{port}')
+                    print("🌐 Browser opened automatically")
+                except:
+                    print("💡 Please open the URL manually in your browser")
+
             print()
             httpd.serve_forever()
-            
+
     except KeyboardInterrupt:
         print("\n👋 Server stopped. Thanks for playing!")
     except OSError as e:
         if e.errno == 98:  # Address already in use
-            print(f"❌ Port {PORT} is already in use. Try a different port or stop the other server.")
+            print(f"❌ Port {port} is already in use. Try a different port or stop the other server.")
         else:
             print(f"❌ Error starting server: {e}")
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Gameplay telemetry for Lily Unicorns
+The game records level starts, resets (R), items collected per player, deaths
+(a unicorn touching a triangle or swamp) and level completions with the time
+of the attempt: since the level started, or since the last reset or restart.
+Recording a stat is one deque append on the main loop: appends and pops on a
+deque are atomic, so the game and the writer thread share it without a lock.
+Every second the writer thread takes what has queued up and appends it as one
+gzip member of JSON lines to the session's file. A session starts a new file
+(part) once its file passes MAX_FILE_BYTES, and a crash loses at most the last
+second, since every member is complete on its own.
+
+Every line is a JSON object with the seconds since the session started (t), the
+event and the level; the first line of each file describes the session. Run this
+file to summarize any number of session files per level:
+
+Usage:
+    python telemetry.py                          # every session in telemetry/
+    python telemetry.py ~/old-telemetry telemetry/session-20261019-101500-4242-000.jsonl.gz
+    python telemetry.py --jobs 8                 # read the files on 8 processes
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+TELEMETRY_DIR = "telemetry"
+FILE_PATTERN = "session-*.jsonl.gz"
+
+# Seconds between writes, and the compressed size after which a session starts a new file
+FLUSH_INTERVAL = 1.0
+MAX_FILE_BYTES = 1024 * 1024
+COMPRESS_LEVEL = 6
+# Events held while the writer catches up; more are dropped (and counted)
+MAX_PENDING_EVENTS = 100000
+
+# Files per pool task when summarizing, and how much of a file is parsed at once
+FILES_PER_TASK = 64
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class Telemetry:
+    """Queues gameplay events for a background thread that writes them to compressed JSON lines"""
+
+    def __init__(self, output_dir=TELEMETRY_DIR):
+        self.output_dir = output_dir
+        self.session = f"session-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.started = time.perf_counter()
+        self.started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        self.level = None
+        self.attempt_started_at = None
+
+        # (time, event, level, fields), appended by the game and popped by the writer
+        self.events = deque()
+        self.dropped = 0
+        self.written = 0
+        self.part = 0
+        self.file_bytes = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._write_loop, name="Telemetry", daemon=True)
+        self._thread.start()
+
+    def record(self, event, **fields):
+        """Queue an event for the current level (cheap enough for the main loop)"""
+        if len(self.events) >= MAX_PENDING_EVENTS:
+            self.dropped += 1
+            return
+        self.events.append((time.perf_counter(), event, self.level, fields))
+
+    def level_started(self, level, level_file):
+        """A level was loaded: later events belong to it, and its first attempt starts now"""
+        self.level = level
+        self.record("level_start", file=level_file)
+        self.attempt_started()
+
+    def attempt_started(self):
+        """The level started over (R, a hazard or a hot reload): completion time counts from now"""
+        self.attempt_started_at = time.perf_counter()
+
+    def level_completed(self):
+        """Both unicorns reached the rainbow"""
+        self.record("complete", seconds=round(time.perf_counter() - self.attempt_started_at, 3))
+
+    def stop(self):
+        """Write what is queued and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self.written:
+            print(f"Telemetry: {self.written} events written to {self.output_dir}/{self.session}-*"
+                  f" ({self.dropped} dropped while the writer was busy)")
+
+    def get_path(self, part):
+        return os.path.join(self.output_dir, f"{self.session}-{part:03d}.jsonl.gz")
+
+    def _write_loop(self):
+        """Write the queued events every FLUSH_INTERVAL until stop() (runs on the writer thread)"""
+        while not self._stop.wait(FLUSH_INTERVAL):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        lines = []
+        while True:
+            try:
+                when, event, level, fields = self.events.popleft()
+            except IndexError:
+                break
+            record = {"t": round(when - self.started, 3), "event": event, "level": level}
+            record.update(fields)
+            lines.append(json.dumps(record, separators=(",", ":")))
+        if not lines:
+            return
+        count = len(lines)
+
+        if self.file_bytes >= MAX_FILE_BYTES:
+            self.part += 1
+            self.file_bytes = 0
+        if self.file_bytes == 0:
+            header = {"event": "session", "session": self.session, "part": self.part, "started": self.started_at}
+            lines.insert(0, json.dumps(header, separators=(",", ":")))
+        data = gzip.compress(("\n".join(lines) + "\n").encode(), COMPRESS_LEVEL)
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(self.get_path(self.part), "ab") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Could not write telemetry: {e}")
+            return
+        self.file_bytes += len(data)
+        self.written += count
+
+
+def summarize_file(path):
+    """Per-level counts and completion times of one session file
+
+    The file is read READ_CHUNK_BYTES of lines at a time, each chunk parsed with
+    one json.loads call (several times faster than a call per line).
+    """
+    levels = {}
+    times = {}
+    events = 0
+    sessions = 0
+    damaged = False
+    try:
+        with gzip.open(path, "rb") as f:
+            while not damaged:
+                lines = f.readlines(READ_CHUNK_BYTES)
+                if not lines:
+                    break
+                try:
+                    records = json.loads(b"[" + b",".join(lines) + b"]")
+                except ValueError:
+                    # A line cut short or garbled: keep the lines before it
+                    records = []
+                    for line in lines:
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            damaged = True
+                            break
+
+                for record in records:
+                    event = record["event"]
+                    if event == "session":
+                        sessions += record["part"] == 0
+                        continue
+                    events += 1
+                    level = record["level"]
+                    counts = levels.get(level)
+                    if counts is None:
+                        counts = levels[level] = Counter()
+                    if event == "item":
+                        counts[f"items{record['player']}"] += record["count"]
+                    elif event == "level_start":
+                        counts["plays"] += 1
+                    elif event == "reset":
+                        counts["resets"] += 1
+                    elif event == "death":
+                        counts[f"deaths{record['player']}"] += 1
+                    elif event == "complete":
+                        counts["completions"] += 1
+                        times.setdefault(level, []).append(record["seconds"])
+    except (OSError, EOFError, zlib.error, KeyError, TypeError):
+        # Cut short by a crash, or not a telemetry file at all
+        damaged = True
+    return levels, times, events, sessions, damaged
+
+
+def summarize_files(paths):
+    """summarize_file for a group of files, merged (one pool task)"""
+    return merge_summaries(summarize_file(path) for path in paths)
+
+
+def merge_summaries(summaries):
+    levels = {}
+    times = {}
+    totals = Counter()
+    for file_levels, file_times, events, sessions, damaged in summaries:
+        for level, counts in file_levels.items():
+            levels.setdefault(level, Counter()).update(counts)
+        for level, seconds in file_times.items():
+            times.setdefault(level, []).extend(seconds)
+        totals["events"] += events
+        totals["sessions"] += sessions
+        totals["damaged"] += damaged
+    return levels, times, totals["events"], totals["sessions"], totals["damaged"]
+
+
+def find_session_files(paths):
+    """Session files in the given folders, plus the given files"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(path.glob(FILE_PATTERN)))
+        elif path.exists():
+            files.append(path)
+        else:
+            print(f"Not found: {path}")
+    return files
+
+
+def print_summary(levels, times):
+    """Print one row of stats per level"""
+    print(f"{'Level':>5}  {'Plays':>6}  {'Done':>6}  {'Time p50/p90 (s)':>17}  {'Resets':>7}  "
+          f"{'Items P1/P2':>12}  {'Deaths P1/P2':>12}")
+    for level in sorted(levels, key=lambda level: (level is None, level)):
+        counts = levels[level]
+        plays = counts["plays"] or 1
+        seconds = sorted(times.get(level, ()))
+        if len(seconds) > 1:
+            deciles = statistics.quantiles(seconds, n=10, method="inclusive")
+            time_text = f"{statistics.median(seconds):.1f}/{deciles[8]:.1f}"
+        elif seconds:
+            time_text = f"{seconds[0]:.1f}/{seconds[0]:.1f}"
+        else:
+            time_text = "-"
+        # Resets, items and deaths are averaged per play of the level
+        print(f"{'?' if level is None else level:>5}  {counts['plays']:>6}  {counts['completions']:>6}  {time_text:>17}  "
+              f"{counts['resets'] / plays:>7.2f}  "
+              f"{counts['items1'] / plays:>5.1f}/{counts['items2'] / plays:<6.1f}  "
+              f"{counts['deaths1'] / plays:>5.2f}/{counts['deaths2'] / plays:<6.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize gameplay telemetry per level")
+    parser.add_argument("paths", nargs="*", default=[TELEMETRY_DIR],
+                        help=f"session files or folders of them (default: {TELEMETRY_DIR})")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    files = find_session_files(args.paths)
+    if not files:
+        print("No telemetry files found; play with python main.py --telemetry to record some")
+        return 1
+
+    start = time.perf_counter()
+    groups = [files[i:i + FILES_PER_TASK] for i in range(0, len(files), FILES_PER_TASK)]
+    if args.jobs <= 1 or len(groups) == 1:
+        summaries = map(summarize_files, groups)
+        levels, times, events, sessions, damaged = merge_summaries(summaries)
+    else:
+        with ProcessPoolExecutor(args.jobs) as pool:
+            levels, times, events, sessions, damaged = merge_summaries(pool.map(summarize_files, groups))
+
+    print(f"{sessions} sessions, {events} events in {len(files)} files read in {time.perf_counter() - start:.2f} s"
+          + (f" ({damaged} damaged files only partly read)" if damaged else ""))
+    print_summary(levels, times)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+pytest configuration for the game's regression tests
+Runs headless under SDL's dummy drivers, with main.py's relative asset and level
+paths working.
+
+Usage:
+    pytest tests
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+sys.path.insert(0, str(REPO_ROOT))
+os.chdir(REPO_ROOT)
+
+
+@pytest.fixture(scope="session")
+def game():
+    """main.py with the (dummy) display and silent audio set up once for all tests"""
+    import pygame
+    import main
+
+    pygame.init()
+    main.init_display(1.0, mode="blit")
+    main.audio = main.AudioSystem()
+    yield main
+    pygame.quit()
@@ -0,0 +1,25 @@
+"""Shrunk physics fuzzer failures (physics_fuzzer.py), played again as regression tests
+
+The cases in fuzz_cases/ were unicorns walking under a platform into a tree's
+crown and being lifted onto the tree top, inside the platform or through it.
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+import physics_fuzzer
+
+CASES = sorted((Path(__file__).parent / "fuzz_cases").glob("*.json"))
+
+
+@pytest.fixture(scope="module")
+def keys(game):
+    return physics_fuzzer.get_keys()
+
+
+@pytest.mark.parametrize("path", CASES, ids=[path.stem for path in CASES])
+def test_fuzz_case(keys, path):
+    with open(path) as f:
+        case = json.load(f)
+    assert physics_fuzzer.run_case(case, keys) is None
@@ -0,0 +1,40 @@
+"""Hot reloads must free the looks of edited objects and leave the clouds drifting where they were"""
+import copy
+
+
+def test_hot_reload_frees_replaced_textures(game, monkeypatch):
+    game.current_level = 1
+    game.level_data = game.reset_level()
+    textures = game.level_objects["textures"]
+    loaded = sum(texture is not None for texture in textures.textures)
+
+    edited = copy.deepcopy(game.level_data)
+    for reload in range(10):
+        for platform in edited["platforms"]:
+            platform["width"] += 1
+        monkeypatch.setattr(game, "load_level", lambda path, data=copy.deepcopy(edited): data)
+        game.level_data = game.hot_reload_level()
+
+    assert len(game.platforms.x) == len(edited["platforms"])
+    assert sum(texture is not None for texture in textures.textures) == loaded
+    assert all(textures[int(index)] is not None for index in game.platforms.texture)
+
+
+def test_hot_reload_keeps_clouds_drifting(game, monkeypatch):
+    game.current_level = 1
+    game.level_data = game.reset_level()
+    for _ in range(100):
+        for cloud_layer in game.cloud_layers:
+            cloud_layer.update()
+    offsets = [cloud_layer.offset for cloud_layer in game.cloud_layers]
+    assert any(offsets)
+
+    edited = copy.deepcopy(game.level_data)
+    edited["platforms"][0]["width"] += 1
+    monkeypatch.setattr(game, "load_level", lambda path: copy.deepcopy(edited))
+    game.level_data = game.hot_reload_level()
+    assert [cloud_layer.offset for cloud_layer in game.cloud_layers] == offsets
+
+    edited["clouds"][0]["width"] += 1
+    game.level_data = game.hot_reload_level()
+    assert [cloud_layer.offset for cloud_layer in game.cloud_layers] == offsets
@@ -0,0 +1,66 @@
+"""Malformed or stray datagrams must not crash a netplay peer"""
+import socket
+import time
+
+import pytest
+
+import netplay
+
+
+def deliver(peer, sender, packets):
+    """Send raw datagrams to the peer and let it read them"""
+    address = ("127.0.0.1", peer.sock.getsockname()[1])
+    for data in packets:
+        sender.sendto(data, address)
+    time.sleep(0.05)
+    return peer.receive()
+
+
+@pytest.fixture
+def host():
+    peer = netplay.Peer.host(port=0, settings={"level": 1})
+    yield peer
+    peer.close()
+
+
+@pytest.fixture
+def sender():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    yield sock
+    sock.close()
+
+
+def header(packet_type):
+    return netplay.PACKET_HEADER.pack(netplay.PACKET_MAGIC, packet_type)
+
+
+def test_host_drops_garbage(host, sender):
+    last_receive = host.last_receive
+    packets = deliver(host, sender, [
+        header(netplay.HELLO) + b"not json",
+        header(netplay.HELLO) + b"[1,2]",
+        header(netplay.HELLO) + b"\xff\xfe",
+        header(netplay.REJECT) + b"null",
+        b"L",
+        b"XX\x00{}",
+    ])
+    assert packets == []
+    assert not host.connected
+    assert host.packets_received == 0
+    assert host.last_receive == last_receive
+
+
+def test_connected_host_drops_short_inputs(host, sender):
+    hello = header(netplay.HELLO) + b'{"version": %d}' % netplay.PROTOCOL_VERSION
+    deliver(host, sender, [hello])
+    assert host.connected
+    received = host.packets_received
+
+    inputs = netplay.INPUTS_HEADER.pack(0, 5, 0, 0, 0, netplay.NO_ECHO) + netplay.encode_inputs(b"\x01" * 6)
+    packets = deliver(host, sender, [
+        header(netplay.INPUTS),
+        header(netplay.INPUTS) + inputs[:netplay.INPUTS_HEADER.size - 1],
+        header(netplay.INPUTS) + inputs,
+    ])
+    assert packets == [netplay.InputPacket(0, 5, 0, b"\x01" * 6)]
+    assert host.packets_received == received + 1
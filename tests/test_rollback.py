@@ -0,0 +1,32 @@
+"""Rolling back collected items (online play) must put them back on screen"""
+import pygame
+import pytest
+
+
+def draw_items(game):
+    surface = pygame.Surface((game.world_width, game.world_height))
+    textures = game.level_objects["textures"]
+    game.white_items.draw(surface, textures)
+    game.black_items.draw(surface, textures)
+    return pygame.image.tobytes(surface, "RGB")
+
+
+def collect_everything(game):
+    world = pygame.Rect(0, 0, game.world_width, game.world_height)
+    return game.white_items.collect(world) + game.black_items.collect(world)
+
+
+@pytest.mark.parametrize("world_width", [1, 2], ids=["one-screen", "streamed"])
+def test_rollback_redraws_collected_items(game, world_width):
+    level_data = dict(game.load_level("levels/level1.yml"), world={"width": world_width, "height": 1})
+    game.reset_level(level_data=level_data)
+    assert (game.level_streamer is not None) == (world_width > 1)
+
+    before = draw_items(game)
+    state = game.save_game_state()
+    assert collect_everything(game) > 0
+    assert draw_items(game) != before
+
+    game.load_game_state(state)
+    assert draw_items(game) == before
+    assert collect_everything(game) > 0
@@ -0,0 +1,741 @@
+#!/usr/bin/env python3
+"""
+Vectorized simulator for Lily Unicorns
+Runs many copies of one level at once, for training and evaluating bot players.
+Every game (both unicorns, collected items, score) is stored in NumPy arrays and
+each step advances all of them together with the same rules as Unicorn.update,
+Unicorn.check_collisions, item pickup and the rainbow check in main.py. Nothing is
+drawn, so no display is needed.
+
+The API is gym-like:
+
+    env = VectorUnicornEnv(load_level("levels/level1.yml"), num_envs=1024)
+    observations = env.reset(seed=0)
+    observations, rewards, terminated, truncated, info = env.step(env.sample_actions())
+
+ShardedVectorEnv has the same API and splits the games across worker processes.
+Run this file to measure env-steps per second:
+
+    python vector_env.py --envs 4096 --steps 500 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+import pygame
+
+from main import (
+    GROUND_HEIGHT_PERCENT,
+    ITEM_SIZE,
+    UNICORN_GRAVITY,
+    UNICORN_JUMP_STRENGTH,
+    UNICORN_SIZE,
+    UNICORN_SPEED,
+    WINDOW_HEIGHT,
+    WINDOW_WIDTH,
+    Tree,
+    create_text,
+    get_unicorn_start,
+    load_level,
+    percentage_to_pixels,
+)
+from level_geometry import TextureTable
+
+# Actions are a bit mask of held keys per unicorn (arrows for unicorn 1, WASD for unicorn 2)
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_UP = 4
+ACTION_DOWN = 8
+NUM_ACTIONS = 16
+
+# Per game: 8 values per unicorn (see get_observations) plus the fraction of each item color left
+OBSERVATION_SIZE = 18
+
+# Reward: 1 per collected item, plus this when both unicorns reach the rainbow
+COMPLETION_REWARD = 10.0
+
+
+def create_level_arrays(level_data, screen_width=WINDOW_WIDTH, screen_height=WINDOW_HEIGHT):
+    """Convert level data to the box arrays the simulator collides against
+
+    Boxes are (left, top, right, bottom) rows in pixels, laid out exactly as
+    create_level_objects in main.py places them. Tree boxes are just the crown
+    top that can be stood on; texts with canStandOn are added after them.
+    Triangles and swamps (hazards) are not simulated.
+    """
+
+    world = level_data.get("world") or {}
+    if world.get("width", 1) != 1 or world.get("height", 1) != 1:
+        raise ValueError("levels larger than one screen (with a `world` size) can't be simulated")
+
+    def position(entry):
+        x_pos = percentage_to_pixels(entry["x"], screen_width)
+        y_pos = screen_height - percentage_to_pixels(entry["y"], screen_height)  # Bottom-relative to top-relative
+        return x_pos, y_pos
+
+    def size(entry):
+        return percentage_to_pixels(entry["width"], screen_width), percentage_to_pixels(entry["height"], screen_height)
+
+    def platform_box(entry):
+        (x_pos, y_pos), (width, height) = position(entry), size(entry)
+        return x_pos, y_pos, x_pos + width, y_pos + height
+
+    def tree_top_box(entry):
+        (x_pos, y_pos), (width, height) = position(entry), size(entry)
+        top_offset, top_height = Tree.get_top_geometry(width, height)
+        return x_pos, y_pos + top_offset, x_pos + width, y_pos + top_offset + top_height
+
+    def text_top_box(entry):
+        # A text's width depends on the font, so render it like create_level_objects does
+        x_pos, _, width, _, _, _, _, top, top_height = create_text(entry, screen_width, screen_height, TextureTable())
+        return x_pos, top, x_pos + width, top + top_height
+
+    def item_box(entry):
+        x_pos, y_pos = position(entry)
+        return x_pos, y_pos, x_pos + ITEM_SIZE, y_pos + ITEM_SIZE
+
+    def boxes(key, box, keep=lambda entry: True):
+        entries = [entry for entry in level_data.get(key) or [] if keep(entry)]
+        return np.array([box(entry) for entry in entries], dtype=np.int64).reshape(-1, 4)
+
+    pygame.font.init()  # Texts are measured by rendering them; fonts work without a display
+    arrays = {
+        "platforms": boxes("platforms", platform_box),
+        "tree_tops": np.concatenate([
+            boxes("trees", tree_top_box),
+            boxes("texts", text_top_box, lambda entry: entry.get("canStandOn")),
+        ]),
+        "white_items": boxes("white_items", item_box),
+        "black_items": boxes("black_items", item_box),
+        "rainbow": None,
+    }
+
+    if "rainbow" in level_data:
+        rainbow = level_data["rainbow"]
+        x_pos = screen_width - percentage_to_pixels(rainbow["x"], screen_width)  # Right-relative to left-relative
+        y_pos = screen_height - percentage_to_pixels(rainbow["y"], screen_height)
+        width, height = size(rainbow)
+        arrays["rainbow"] = np.array([x_pos, y_pos, x_pos + width, y_pos + height], dtype=np.int64)
+
+    # Unicorn start centers (same defaults as reset_level), stored as top-left corners
+    starts = [(screen_width // 4, screen_height // 2), (3 * screen_width // 4, screen_height // 2)]
+    unicorns_data = level_data.get("unicorns") or {}
+    for i, name in enumerate(("unicorn1", "unicorn2")):
+        if name in unicorns_data:
+            starts[i] = get_unicorn_start(unicorns_data[name], screen_width, screen_height)
+    arrays["starts"] = np.array(starts, dtype=np.int64) - UNICORN_SIZE // 2
+
+    return arrays
+
+
+def round_half_away(values):
+    """Round like assigning a float to a pygame Rect coordinate (0.5 -> 1, -0.5 -> -1)"""
+    truncated = np.trunc(values)
+    return (truncated + (np.abs(values - truncated) >= 0.5) * np.sign(values)).astype(np.int64)
+
+
+class VectorUnicornEnv:
+    """num_envs copies of one level, stepped together
+
+    Unicorn state is kept in flat arrays of 2 * num_envs entries: game i owns
+    entries 2i (unicorn 1, collects white items) and 2i + 1 (unicorn 2, collects
+    black items). A game ends when both unicorns are fully inside the rainbow
+    (terminated) or after max_steps (truncated); finished games restart on the
+    same step.
+    """
+
+    def __init__(self, level_data, num_envs, max_steps=3600,
+                 screen_width=WINDOW_WIDTH, screen_height=WINDOW_HEIGHT):
+        self.num_envs = num_envs
+        self.max_steps = max_steps
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.level = create_level_arrays(level_data, screen_width, screen_height)
+
+        self.size = UNICORN_SIZE
+        self.speed = float(UNICORN_SPEED)
+        self.gravity = float(UNICORN_GRAVITY)
+        self.jump_strength = float(UNICORN_JUMP_STRENGTH)
+        self.ground_y = screen_height - percentage_to_pixels(GROUND_HEIGHT_PERCENT, screen_height)
+
+        count = num_envs * 2
+        self.x = np.zeros(count, dtype=np.int64)
+        self.y = np.zeros(count, dtype=np.int64)
+        self.vel_x = np.zeros(count)
+        self.vel_y = np.zeros(count)
+        self.on_ground = np.zeros(count, dtype=bool)
+        self.can_climb = np.zeros(count, dtype=bool)
+
+        self.score = np.zeros((num_envs, 2), dtype=np.int64)
+        self.white_alive = np.ones((num_envs, len(self.level["white_items"])), dtype=bool)
+        self.black_alive = np.ones((num_envs, len(self.level["black_items"])), dtype=bool)
+        self.steps = np.zeros(num_envs, dtype=np.int64)
+
+        self.rng = np.random.default_rng()
+
+    def reset(self, seed=None):
+        """Restart every game; return the observations"""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        self._reset_games(np.ones(self.num_envs, dtype=bool))
+        return self.get_observations()
+
+    def sample_actions(self):
+        """Random actions for every unicorn, shape (num_envs, 2)"""
+        return self.rng.integers(0, NUM_ACTIONS, size=(self.num_envs, 2), dtype=np.int64)
+
+    def step(self, actions):
+        """Advance every game by one frame
+
+        actions is an int array of shape (num_envs, 2) with ACTION_* bits per unicorn.
+        Returns (observations, rewards, terminated, truncated, info); info["score"]
+        holds the scores at the end of this step, before finished games restart.
+        """
+        actions = np.asarray(actions).reshape(-1)
+        if actions.shape != self.x.shape:
+            raise ValueError(f"Expected actions of shape ({self.num_envs}, 2), got {np.shape(actions)}")
+
+        # Same order as the game loop: input, move, collide, pick up, rainbow
+        self._handle_input(actions)
+        previous_x, previous_y = self._update()
+        self._check_collisions(previous_x, previous_y)
+        collected = self._collect_items()
+        completed = self._check_rainbow()
+
+        self.steps += 1
+        rewards = (collected + completed * COMPLETION_REWARD).astype(np.float32)
+        terminated = completed
+        truncated = (self.steps >= self.max_steps) & ~completed
+        info = {"score": self.score.copy()}
+
+        finished = terminated | truncated
+        if finished.any():
+            self._reset_games(finished)
+        return self.get_observations(), rewards, terminated, truncated, info
+
+    def get_observations(self):
+        """Return a (num_envs, OBSERVATION_SIZE) float32 array
+
+        Per unicorn: x, y (as fractions of the screen), velocity x, y (in units of
+        speed and jump strength), on ground, can climb, and the offset from the
+        unicorn's center to the rainbow's center. Then the fraction of white and
+        black items still to collect.
+        """
+        observations = np.zeros((self.num_envs, OBSERVATION_SIZE), dtype=np.float32)
+        per_unicorn = observations[:, :16].reshape(self.num_envs * 2, 8)
+        per_unicorn[:, 0] = self.x / self.screen_width
+        per_unicorn[:, 1] = self.y / self.screen_height
+        per_unicorn[:, 2] = self.vel_x / self.speed
+        per_unicorn[:, 3] = self.vel_y / abs(self.jump_strength)
+        per_unicorn[:, 4] = self.on_ground
+        per_unicorn[:, 5] = self.can_climb
+        rainbow = self.level["rainbow"]
+        if rainbow is not None:
+            per_unicorn[:, 6] = ((rainbow[0] + rainbow[2]) / 2 - (self.x + self.size / 2)) / self.screen_width
+            per_unicorn[:, 7] = ((rainbow[1] + rainbow[3]) / 2 - (self.y + self.size / 2)) / self.screen_height
+        if self.white_alive.shape[1]:
+            observations[:, 16] = self.white_alive.mean(axis=1)
+        if self.black_alive.shape[1]:
+            observations[:, 17] = self.black_alive.mean(axis=1)
+        return observations
+
+    def _reset_games(self, games):
+        """Put the unicorns of the selected games back at the start and restore their items"""
+        unicorns = np.repeat(games, 2)
+        starts = np.tile(self.level["starts"], (self.num_envs, 1))
+        self.x[unicorns] = starts[unicorns, 0]
+        self.y[unicorns] = starts[unicorns, 1]
+        self.vel_x[unicorns] = 0
+        self.vel_y[unicorns] = 0
+        self.on_ground[unicorns] = False
+        self.can_climb[unicorns] = False
+        self.score[games] = 0
+        self.white_alive[games] = True
+        self.black_alive[games] = True
+        self.steps[games] = 0
+
+    def _handle_input(self, actions):
+        """Unicorn.handle_input for every unicorn"""
+        left = (actions & ACTION_LEFT) != 0
+        right = (actions & ACTION_RIGHT) != 0
+        up = (actions & ACTION_UP) != 0
+        down = (actions & ACTION_DOWN) != 0
+
+        self.vel_x[:] = 0
+        self.vel_x[left] = -self.speed
+        self.vel_x[right] = self.speed
+
+        jump = up & self.on_ground
+        climb_up = up & ~self.on_ground & self.can_climb
+        self.vel_y[jump] = self.jump_strength
+        self.on_ground[jump] = False
+        self.vel_y[climb_up] = -self.speed
+        self.vel_y[down & self.can_climb] = self.speed
+
+    def _update(self):
+        """Unicorn.update (without animation); return the positions before the move"""
+        self.vel_y[~self.on_ground] += self.gravity
+
+        previous_x, previous_y = self.x, self.y
+        self.x = round_half_away(self.x + self.vel_x)
+        self.y = round_half_away(self.y + self.vel_y)
+
+        # Keep on screen horizontally, and below the top edge
+        np.clip(self.x, 0, self.screen_width - self.size, out=self.x)
+        np.maximum(self.y, 0, out=self.y)
+        return previous_x, previous_y
+
+    def _check_collisions(self, previous_x, previous_y):
+        """Unicorn.check_collisions for every unicorn"""
+        self.on_ground[:] = False
+        self.can_climb[:] = False
+
+        self._sweep(previous_x, previous_y)
+        self._resolve_overlaps()
+        self._land_on_tree_tops(previous_y)
+        self._check_resting()
+
+        # Ground
+        grounded = self.y + self.size >= self.ground_y
+        self.y[grounded] = self.ground_y - self.size
+        self.vel_y[grounded] = 0
+        self.on_ground[grounded] = True
+
+    def _sweep(self, previous_x, previous_y):
+        """Unicorn.sweep_collisions: move from the previous position, stopping at the first hit"""
+        size = self.size
+        target_x, target_y = self.x.copy(), self.y.copy()
+        moving_x, moving_y = previous_x.copy(), previous_y.copy()
+
+        # Broad-phase area of each move (tree tops outside it are never tested, as in the game)
+        area_left = np.minimum(previous_x, target_x) - 1
+        area_top = np.minimum(previous_y, target_y) - 1
+        area_right = np.maximum(previous_x, target_x) + size + 1
+        area_bottom = np.maximum(previous_y, target_y) + size + 1
+
+        active = np.flatnonzero((moving_x != target_x) | (moving_y != target_y))
+
+        # Two hits (e.g. a wall, then a floor) plus the final free move
+        for _ in range(3):
+            if not len(active):
+                break
+            mx, my = moving_x[active], moving_y[active]
+            dx, dy = target_x[active] - mx, target_y[active] - my
+            moved = (dx != 0) | (dy != 0)
+            active, mx, my, dx, dy = active[moved], mx[moved], my[moved], dx[moved], dy[moved]
+            if not len(active):
+                break
+
+            hit_time, hit_y, landing_y, obstacle = self._first_hits(
+                mx, my, dx, dy,
+                (area_left[active], area_top[active], area_right[active], area_bottom[active]),
+            )
+
+            # No hit: the move completes
+            free = np.isinf(hit_time)
+            moving_x[active[free]] = target_x[active[free]]
+            moving_y[active[free]] = target_y[active[free]]
+
+            # Vertical hit: advance sideways to the moment of impact, then stop vertically
+            vertical = ~free & hit_y
+            bodies = active[vertical]
+            moving_x[bodies] = np.round(mx[vertical] + dx[vertical] * hit_time[vertical])
+            falling = dy[vertical] > 0
+            moving_y[bodies] = np.where(falling, landing_y[vertical] - size, obstacle[vertical, 3])
+            self.on_ground[bodies[falling]] = True
+            self.vel_y[bodies] = 0
+            target_y[bodies] = moving_y[bodies]
+
+            # Side hit: stop at the platform and allow climbing
+            side = ~free & ~hit_y
+            bodies = active[side]
+            moving_y[bodies] = np.round(my[side] + dy[side] * hit_time[side])
+            moving_x[bodies] = np.where(dx[side] > 0, obstacle[side, 0] - size, obstacle[side, 2])
+            self.can_climb[bodies] = True
+            target_x[bodies] = moving_x[bodies]
+
+            active = active[~free]
+
+        self.x, self.y = moving_x, moving_y
+
+    def _first_hits(self, mx, my, dx, dy, area):
+        """Earliest platform or tree-top hit of each move
+
+        Returns (time, vertical, landing_y, obstacle box); time is inf where
+        nothing is hit. Ties keep the first platform in level order, and a tree
+        top only wins if it is hit strictly earlier, like the game's loops.
+        """
+        size = self.size
+        count = len(mx)
+        left, top = mx[:, None], my[:, None]
+        right, bottom = left + size, top + size
+        move_x, move_y = dx[:, None], dy[:, None]
+
+        platforms = self.level["platforms"]
+        hit_time = np.full(count, np.inf)
+        hit_y = np.ones(count, dtype=bool)
+        landing_y = np.zeros(count, dtype=np.int64)
+        obstacle = np.zeros((count, 4), dtype=np.int64)
+
+        if len(platforms):
+            p_left, p_top, p_right, p_bottom = (platforms[:, i] for i in range(4))
+
+            # Broad phase: only platforms overlapping the swept area (touching doesn't count)
+            candidate = (
+                (np.minimum(left, left + move_x) < p_right)
+                & (p_left < np.maximum(right, right + move_x))
+                & (np.minimum(top, top + move_y) < p_bottom)
+                & (p_top < np.maximum(bottom, bottom + move_y))
+            )
+            rows, columns = np.nonzero(candidate)
+
+            # Vectorized sweep_rect over the candidate (move, platform) pairs
+            pair_dx, pair_dy = dx[rows], dy[rows]
+            pair_left, pair_top = mx[rows], my[rows]
+            pair_right, pair_bottom = pair_left + size, pair_top + size
+            c_left, c_top, c_right, c_bottom = p_left[columns], p_top[columns], p_right[columns], p_bottom[columns]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                x_entry = np.where(pair_dx > 0, (c_left - pair_right) / pair_dx,
+                                   np.where(pair_dx < 0, (c_right - pair_left) / pair_dx, -np.inf))
+                x_exit = np.where(pair_dx > 0, (c_right - pair_left) / pair_dx,
+                                  np.where(pair_dx < 0, (c_left - pair_right) / pair_dx, np.inf))
+                y_entry = np.where(pair_dy > 0, (c_top - pair_bottom) / pair_dy,
+                                   np.where(pair_dy < 0, (c_bottom - pair_top) / pair_dy, -np.inf))
+                y_exit = np.where(pair_dy > 0, (c_bottom - pair_top) / pair_dy,
+                                  np.where(pair_dy < 0, (c_top - pair_bottom) / pair_dy, np.inf))
+            x_apart = (pair_dx == 0) & ((pair_right <= c_left) | (pair_left >= c_right))
+            y_apart = (pair_dy == 0) & ((pair_bottom <= c_top) | (pair_top >= c_bottom))
+            entry = np.maximum(x_entry, y_entry)
+            hits = (
+                ~x_apart & ~y_apart
+                & (entry < np.minimum(x_exit, y_exit)) & (entry >= 0) & (entry <= 1)
+            )
+
+            times = np.full(candidate.shape, np.inf)
+            times[rows[hits], columns[hits]] = entry[hits]
+            # On a tie (hitting a corner exactly) prefer the vertical face
+            vertical = np.ones(candidate.shape, dtype=bool)
+            vertical[rows, columns] = ~(x_entry > y_entry)
+
+            first = np.argmin(times, axis=1)
+            row_index = np.arange(count)
+            hit_time = times[row_index, first]
+            hit_y = vertical[row_index, first]
+            obstacle = platforms[first]
+            landing_y = obstacle[:, 1].copy()
+
+        tree_tops = self.level["tree_tops"]
+        falling = np.flatnonzero(dy > 0)
+        if len(tree_tops) and len(falling):
+            t_left, t_top, t_right, t_bottom = (tree_tops[:, i] for i in range(4))
+            falling_bottom = (my[falling] + size)[:, None]
+            area_left, area_top, area_right, area_bottom = (value[falling, None] for value in area)
+
+            # Tree tops are one-way: only a downward move crossing the top can land
+            crossing = (
+                (falling_bottom <= t_top) & (t_top < falling_bottom + dy[falling, None])
+                & (t_left < area_right) & (t_right > area_left) & (t_top < area_bottom) & (t_bottom > area_top)
+            )
+            rows, columns = np.nonzero(crossing)
+            moves = falling[rows]
+            times = (t_top[columns] - (my[moves] + size)) / dy[moves]
+            tree_left = mx[moves] + dx[moves] * times
+            hits = (tree_left < t_right[columns]) & (t_left[columns] < tree_left + size)
+
+            tree_times = np.full(crossing.shape, np.inf)
+            tree_times[rows[hits], columns[hits]] = times[hits]
+            first = np.argmin(tree_times, axis=1)
+            tree_time = tree_times[np.arange(len(falling)), first]
+            earlier = tree_time < hit_time[falling]
+            winners = falling[earlier]
+            hit_time[winners] = tree_time[earlier]
+            hit_y[winners] = True
+            landing_y[winners] = t_top[first[earlier]]
+
+        return hit_time, hit_y, landing_y, obstacle
+
+    def _resolve_overlaps(self):
+        """The overlap pass of check_collisions, for unicorns still inside a platform"""
+        platforms = self.level["platforms"]
+        if not len(platforms):
+            return
+        size = self.size
+        overlapping = (
+            (self.x[:, None] < platforms[:, 2]) & (self.x[:, None] + size > platforms[:, 0])
+            & (self.y[:, None] < platforms[:, 3]) & (self.y[:, None] + size > platforms[:, 1])
+        )
+        bodies = np.flatnonzero(overlapping.any(axis=1))
+        if not len(bodies):
+            return
+
+        # Platforms are resolved one after another, as each push moves the unicorn
+        x, y = self.x[bodies], self.y[bodies]
+        vel_x, vel_y = self.vel_x[bodies], self.vel_y[bodies]
+        on_ground, can_climb = self.on_ground[bodies], self.can_climb[bodies]
+        for p_left, p_top, p_right, p_bottom in platforms.tolist():
+            colliding = (x < p_right) & (x + size > p_left) & (y < p_bottom) & (y + size > p_top)
+            if not colliding.any():
+                continue
+            overlap_left = x + size - p_left
+            overlap_right = p_right - x
+            overlap_top = y + size - p_top
+            overlap_bottom = p_bottom - y
+            min_overlap = np.minimum(np.minimum(overlap_left, overlap_right), np.minimum(overlap_top, overlap_bottom))
+
+            land = colliding & (min_overlap == overlap_top) & (vel_y > 0)
+            ceiling = colliding & ~land & (min_overlap == overlap_bottom) & (vel_y < 0)
+            push_left = colliding & ~land & ~ceiling & (min_overlap == overlap_left) & (vel_x > 0)
+            push_right = colliding & ~land & ~ceiling & ~push_left & (min_overlap == overlap_right) & (vel_x < 0)
+
+            y[land] = p_top - size
+            on_ground |= land
+            y[ceiling] = p_bottom
+            vel_y[land | ceiling] = 0
+            x[push_left] = p_left - size
+            x[push_right] = p_right
+            can_climb |= push_left | push_right
+
+        self.x[bodies], self.y[bodies] = x, y
+        self.vel_y[bodies] = vel_y
+        self.on_ground[bodies], self.can_climb[bodies] = on_ground, can_climb
+
+    def _land_on_tree_tops(self, previous_y):
+        """Tree tops catch falling unicorns that overlap them (the first tree in level order wins)
+
+        Like the game, a unicorn that was below the top before the move, or whose
+        spot on the top is inside a platform, isn't lifted onto it.
+        """
+        tree_tops = self.level["tree_tops"]
+        if not len(tree_tops):
+            return
+        size = self.size
+        bodies = np.flatnonzero(self.vel_y > 0)
+        x, y = self.x[bodies, None], self.y[bodies, None]
+        colliding = (
+            (x < tree_tops[:, 2]) & (x + size > tree_tops[:, 0])
+            & (y < tree_tops[:, 3]) & (y + size > tree_tops[:, 1])
+            & (previous_y[bodies, None] + size <= tree_tops[:, 1])
+        )
+        platforms = self.level["platforms"]
+        if len(platforms) and colliding.any():
+            # Landing spots (bodies x tree tops) against every platform
+            landing_top = (tree_tops[:, 1] - size)[None, :, None]
+            blocked = (
+                (x[:, :, None] < platforms[:, 2]) & (x[:, :, None] + size > platforms[:, 0])
+                & (landing_top < platforms[:, 3]) & (landing_top + size > platforms[:, 1])
+            ).any(axis=2)
+            colliding &= ~blocked
+        landing = colliding.any(axis=1)
+        first = np.argmax(colliding[landing], axis=1)
+        bodies = bodies[landing]
+        self.y[bodies] = tree_tops[first, 1] - size
+        self.vel_y[bodies] = 0
+        self.on_ground[bodies] = True
+
+    def _check_resting(self):
+        """Standing exactly on a platform or tree top counts as being on the ground"""
+        bodies = np.flatnonzero(~self.on_ground & (self.vel_y >= 0))
+        bottom = (self.y[bodies] + self.size)[:, None]
+        left = self.x[bodies, None]
+        right = left + self.size
+        for boxes in (self.level["platforms"], self.level["tree_tops"]):
+            if len(boxes):
+                on_top = (bottom == boxes[:, 1]) & (left < boxes[:, 2]) & (boxes[:, 0] < right)
+                self.on_ground[bodies[on_top.any(axis=1)]] = True
+
+    def _collect_items(self):
+        """Unicorn 1 picks up white items, unicorn 2 black items; return items collected per game"""
+        collected = np.zeros(self.num_envs, dtype=np.int64)
+        x, y = self.x.reshape(-1, 2), self.y.reshape(-1, 2)
+        for unicorn, items, alive in ((0, self.level["white_items"], self.white_alive),
+                                      (1, self.level["black_items"], self.black_alive)):
+            if not len(items):
+                continue
+            left, top = x[:, unicorn, None], y[:, unicorn, None]
+            touching = (
+                alive
+                & (items[:, 0] < left + self.size) & (items[:, 2] > left)
+                & (items[:, 1] < top + self.size) & (items[:, 3] > top)
+            )
+            count = touching.sum(axis=1)
+            alive &= ~touching
+            self.score[:, unicorn] += count
+            collected += count
+        return collected
+
+    def _check_rainbow(self):
+        """Games where both unicorns are fully inside the rainbow"""
+        rainbow = self.level["rainbow"]
+        if rainbow is None:
+            return np.zeros(self.num_envs, dtype=bool)
+        inside = (
+            (self.x >= rainbow[0]) & (self.x + self.size <= rainbow[2])
+            & (self.y >= rainbow[1]) & (self.y + self.size <= rainbow[3])
+        )
+        return inside.reshape(-1, 2).all(axis=1)
+
+
+def shared_array(shape, dtype):
+    """A NumPy array backed by shared memory, so worker processes can write into it"""
+    dtype = np.dtype(dtype)
+    buffer = multiprocessing.RawArray("b", max(1, int(np.prod(shape)) * dtype.itemsize))
+    return buffer, np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+# Step results shared between ShardedVectorEnv and its workers: name -> (columns, dtype)
+SHARED_ARRAYS = {
+    "actions": ((2,), np.int64),
+    "observations": ((OBSERVATION_SIZE,), np.float32),
+    "rewards": ((), np.float32),
+    "terminated": ((), bool),
+    "truncated": ((), bool),
+    "score": ((2,), np.int64),
+}
+
+
+def shard_worker(pipe, level_data, start, stop, max_steps, buffers):
+    """Worker process: run games start..stop and write their results into the shared arrays"""
+    arrays = {
+        name: np.frombuffer(buffers[name], dtype=dtype).reshape((-1,) + columns)[start:stop]
+        for name, (columns, dtype) in SHARED_ARRAYS.items()
+    }
+    env = VectorUnicornEnv(level_data, stop - start, max_steps)
+
+    while True:
+        command, value = pipe.recv()
+        if command == "reset":
+            arrays["observations"][:] = env.reset(seed=value)
+            arrays["score"][:] = env.score
+        elif command == "step":
+            observations, rewards, terminated, truncated, info = env.step(arrays["actions"])
+            arrays["observations"][:] = observations
+            arrays["rewards"][:] = rewards
+            arrays["terminated"][:] = terminated
+            arrays["truncated"][:] = truncated
+            arrays["score"][:] = info["score"]
+        elif command == "close":
+            break
+        pipe.send(None)
+    pipe.close()
+
+
+class ShardedVectorEnv:
+    """VectorUnicornEnv split across worker processes
+
+    Each worker steps its own slice of the games. Actions and results go through
+    shared memory, so only a short command is sent over each pipe per step.
+    """
+
+    def __init__(self, level_data, num_envs, num_workers=None, max_steps=3600):
+        self.num_envs = num_envs
+        num_workers = max(1, min(num_workers or os.cpu_count() or 1, num_envs))
+        self.rng = np.random.default_rng()
+
+        buffers = {}
+        self.arrays = {}
+        for name, (columns, dtype) in SHARED_ARRAYS.items():
+            buffers[name], self.arrays[name] = shared_array((num_envs,) + columns, dtype)
+
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self.pipes = []
+        self.workers = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent_pipe, worker_pipe = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=shard_worker,
+                args=(worker_pipe, level_data, int(start), int(stop), max_steps, buffers),
+                daemon=True,
+            )
+            worker.start()
+            worker_pipe.close()
+            self.pipes.append(parent_pipe)
+            self.workers.append(worker)
+
+    def _run(self, command, values):
+        """Send a command to every worker and wait until all of them are done"""
+        for pipe, value in zip(self.pipes, values):
+            pipe.send((command, value))
+        for pipe in self.pipes:
+            pipe.recv()
+
+    def reset(self, seed=None):
+        """Restart every game; return the observations"""
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+        # Give each shard its own seed so they don't all play the same random games
+        seeds = [None if seed is None else seed + i for i in range(len(self.pipes))]
+        self._run("reset", seeds)
+        return self.arrays["observations"].copy()
+
+    def sample_actions(self):
+        """Random actions for every unicorn, shape (num_envs, 2)"""
+        return self.rng.integers(0, NUM_ACTIONS, size=(self.num_envs, 2), dtype=np.int64)
+
+    def step(self, actions):
+        """Advance every game by one frame (same results as VectorUnicornEnv.step)"""
+        self.arrays["actions"][:] = np.asarray(actions).reshape(self.num_envs, 2)
+        self._run("step", [None] * len(self.pipes))
+        return (
+            self.arrays["observations"].copy(),
+            self.arrays["rewards"].copy(),
+            self.arrays["terminated"].copy(),
+            self.arrays["truncated"].copy(),
+            {"score": self.arrays["score"].copy()},
+        )
+
+    def close(self):
+        """Stop the worker processes"""
+        for pipe in self.pipes:
+            try:
+                pipe.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self.workers:
+            worker.join(timeout=2.0)
+        self.pipes = []
+        self.workers = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the vectorized simulator's env-steps per second")
+    parser.add_argument("--level", default="levels/level1.yml", help="level file to play (YAML or JSON)")
+    parser.add_argument("--envs", type=int, default=4096, help="number of games stepped together")
+    parser.add_argument("--steps", type=int, default=500, help="number of steps to run")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes (1: step in this process)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random actions")
+    args = parser.parse_args()
+
+    level_data = load_level(args.level)
+    if level_data is None:
+        return 1
+
+    if args.workers > 1:
+        env = ShardedVectorEnv(level_data, args.envs, args.workers)
+    else:
+        env = VectorUnicornEnv(level_data, args.envs)
+
+    env.reset(seed=args.seed)
+    finished = 0
+    collected = 0.0
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        _, rewards, terminated, truncated, _ = env.step(env.sample_actions())
+        collected += float(rewards.sum())
+        finished += int(terminated.sum() + truncated.sum())
+    elapsed = time.perf_counter() - start
+
+    if isinstance(env, ShardedVectorEnv):
+        env.close()
+
+    env_steps = args.envs * args.steps
+    print(f"{args.level}: {args.envs} games x {args.steps} steps, {args.workers} worker(s)")
+    print(f"  {env_steps / elapsed:,.0f} env-steps/s ({elapsed:.2f} s)")
+    print(f"  reward collected: {collected:.0f}, games finished: {finished}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())